@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Alert spool enqueue benchmark - SQLite WAL with batched commits
+Measures how long AlertSpool.add() holds up the detector per alert: in a
+burst, at a steady few thousand alerts per minute with delivered marks
+coming back from a notifier thread, and with a commit for every alert
+(what a naive synchronous spool would do) for comparison.
+
+Usage: python bench_alert_spool.py [alerts] [alerts_per_minute]
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# Add python_whatsapp to path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'python_whatsapp'))
+
+from alert_spool import AlertSpool
+from events import EmergencyEvent, AnomalyEvent
+
+def make_alert(index):
+    if index % 4:
+        return 'anomaly', AnomalyEvent(alert_id=index, level=2400, baseline=210, difference=2190,
+                                       severity='HIGH', location='Ward 3', uptime='01:22:10')
+    return 'emergency', EmergencyEvent(emergency_id=index, emergency_type='VOICE_HELP', level=2875,
+                                       location='Ward 3', uptime='01:22:10')
+
+def run_case(directory, name, alerts, per_minute=None, batch_size=64, synchronous='NORMAL', deliver=False):
+    """Per-add latencies in microseconds"""
+    spool = AlertSpool(os.path.join(directory, f'{name}.db'), batch_size, synchronous=synchronous)
+    done = []
+    stop = threading.Event()
+
+    def notifier():
+        # Commits each alert before "sending" it and marks it delivered, like the outbox
+        while not stop.is_set() or done:
+            if done:
+                spool_id = done.pop(0)
+                spool.commit(spool_id)
+                spool.delivered(spool_id)
+            else:
+                time.sleep(0.001)
+
+    thread = threading.Thread(target=notifier)
+    if deliver:
+        thread.start()
+    alerts_list = [make_alert(index) for index in range(alerts)]
+    interval = 60.0 / per_minute if per_minute else 0
+    samples = []
+    next_at = time.perf_counter()
+    for kind, event in alerts_list:
+        if interval:
+            next_at += interval
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        started = time.perf_counter()
+        spool_id = spool.add(kind, event)
+        samples.append((time.perf_counter() - started) * 1e6)
+        if deliver:
+            done.append(spool_id)
+    stop.set()
+    if deliver:
+        thread.join()
+    spool.close()
+    return samples
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def report(label, samples):
+    print(f"{label:<34} {len(samples):>6} {percentile(samples, 0.5):>9.1f} "
+          f"{percentile(samples, 0.99):>9.1f} {max(samples):>9.1f}")
+
+def main():
+    alerts = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    per_minute = int(sys.argv[2]) if len(sys.argv) > 2 else 6000
+
+    print("=" * 70)
+    print("ALERT SPOOL ENQUEUE BENCHMARK (SQLite WAL)")
+    print("=" * 70)
+    print(f"{alerts} alerts per case, paced case at {per_minute} alerts/minute")
+    print()
+    print(f"{'Case':<34} {'Alerts':>6} {'p50 us':>9} {'p99 us':>9} {'max us':>9}")
+    print("-" * 70)
+    with tempfile.TemporaryDirectory() as directory:
+        report("burst, batch 64", run_case(directory, 'burst', alerts))
+        paced = min(alerts, per_minute // 6)  # at most 10 seconds of alerts
+        report(f"{per_minute}/min + delivered marks", run_case(directory, 'paced', paced,
+                                                               per_minute, deliver=True))
+        report("burst, commit per alert (FULL)", run_case(directory, 'naive', alerts // 4,
+                                                          batch_size=1, synchronous='FULL'))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Consumer drain benchmark
+Old loop: get_message(timeout) + time.sleep(0.05) per line (main.py before batching)
+New loop: get_messages(max_n, timeout) - one lock acquisition per batch
+"""
+
+import os
+import sys
+import threading
+import time
+
+# Add python_whatsapp to path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'python_whatsapp'))
+
+from arduino_reader import ArduinoReader
+
+LINES = [b"STATUS:CURRENT_LEVEL:412", b"ALERT:START", b"ALERT:LEVEL:1873", b"ALERT:END",
+         b"CALIBRATION:PROGRESS:40"]
+
+def run(consume, rate, duration):
+    """Feed lines at `rate`/s for `duration` seconds; returns lines consumed per second"""
+    reader = ArduinoReader('SIM', 115200, echo=False, queue_size=1000000, raw_lines=True)
+    stop = threading.Event()
+
+    def producer():
+        sent = 0
+        started = time.perf_counter()
+        while not stop.is_set():
+            due = int((time.perf_counter() - started) * rate)
+            while sent < due:
+                reader._dispatch_line(LINES[sent % len(LINES)])
+                sent += 1
+            time.sleep(0.001)
+
+    thread = threading.Thread(target=producer, daemon=True)
+    thread.start()
+    consumed = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < duration:
+        consumed += consume(reader)
+    stop.set()
+    thread.join()
+    return consumed / (time.perf_counter() - started)
+
+def per_line_with_sleep(reader):
+    message = reader.get_message(timeout=1.0)
+    time.sleep(0.05)
+    return 1 if message else 0
+
+def per_line(reader):
+    return 1 if reader.get_message(timeout=1.0) else 0
+
+def batched(reader):
+    return len(reader.get_messages(256, timeout=1.0))
+
+def main():
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 2.0
+
+    print("=" * 70)
+    print("CONSUMER DRAIN BENCHMARK")
+    print("=" * 70)
+    print(f"{'Device lines/s':>15} {'get+sleep':>12} {'get_message':>12} {'get_messages':>12}")
+    print("-" * 55)
+    for rate in (100, 1000, 20000, 200000):
+        results = [run(consume, rate, duration) for consume in (per_line_with_sleep, per_line, batched)]
+        print(f"{rate:>15,} " + " ".join(f"{value:>12,.0f}" for value in results))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Columnar parser benchmark - NumPy batch parse vs ArduinoMessageParser line by line
+Both read the same corpus as a text capture and as a session recording
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+# Add python_whatsapp to path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'python_whatsapp'))
+
+from bench_parser import protocol_corpus
+from columnar_parser import parse_buffer, parse_recording
+from message_parser import ArduinoMessageParser
+from session_recorder import SessionRecorder
+
+def best_rate(function, line_count, repeats=3):
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return line_count / best, result
+
+def line_by_line(lines):
+    parse = ArduinoMessageParser().parse_bytes
+    return [parse(line) for line in lines]
+
+def main():
+    line_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    lines = protocol_corpus(line_count)
+    capture = b'\r\n'.join(lines) + b'\r\n'
+
+    stdout = sys.stdout
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'session.rec')
+        sys.stdout = open(os.devnull, 'w')
+        try:
+            recorder = SessionRecorder(path).open()
+            for line in lines:
+                recorder.record(line)
+            recorder.close()
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+
+        parser_rate, _ = best_rate(lambda: line_by_line(lines), line_count, 1)
+        buffer_rate, columns = best_rate(lambda: parse_buffer(capture), line_count)
+        recording_rate, _ = best_rate(lambda: parse_recording(path), line_count)
+
+    print("=" * 70)
+    print("COLUMNAR PARSER BENCHMARK")
+    print("=" * 70)
+    print(f"Corpus: {line_count:,} lines, {len(columns['level']):,} level rows")
+    print(f"ArduinoMessageParser, line by line: {parser_rate:>12,.0f} lines/s")
+    print(f"parse_buffer (text capture):        {buffer_rate:>12,.0f} lines/s")
+    print(f"parse_recording (session file):     {recording_rate:>12,.0f} lines/s")
+    print(f"Target 1M lines/s: {'✓' if min(buffer_rate, recording_rate) >= 1e6 else '✗'}")
+
+if __name__ == "__main__":
+    main()
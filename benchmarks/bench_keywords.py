@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Keyword matcher benchmark - per-keyword substring loop vs KeywordMatcher
+Grows the HELP list with made-up translations to show how each scales
+"""
+
+import os
+import sys
+import time
+
+# Add python_whatsapp to path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'python_whatsapp'))
+
+from config import HELP_KEYWORDS, ANOMALY_KEYWORDS
+from keyword_matcher import KeywordMatcher
+from bench_parser import protocol_corpus
+
+def extra_keywords(count):
+    """Stand-ins for HELP keywords in other languages"""
+    words = ['HILFE', 'AYUDA', 'SOCORRO', 'AU SECOURS', 'AIUTO', 'POMOCY', 'BACHAO', 'TASUKETE']
+    return [f'{words[i % len(words)]}_{i}' for i in range(count)]
+
+def loop_scan(lines, help_keywords, anomaly_keywords):
+    hits = 0
+    for line in lines:
+        upper = line.upper()
+        hits += sum(keyword in upper for keyword in help_keywords)
+        hits += sum(keyword in upper for keyword in anomaly_keywords)
+    return hits
+
+def matcher_scan(lines, matcher):
+    hits = 0
+    for line in lines:
+        for keywords in matcher.scan(line).values():
+            hits += len(keywords)
+    return hits
+
+def rate(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return len(args[0]) / (time.perf_counter() - start)
+
+def main():
+    line_count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    lines = [raw.decode() for raw in protocol_corpus(line_count)]
+
+    print("=" * 70)
+    print("KEYWORD MATCHER BENCHMARK")
+    print("=" * 70)
+    print(f"Corpus: {line_count:,} protocol lines, every keyword hit counted")
+    print()
+    print(f"{'Keywords':>9} {'Loop lines/s':>14} {'Matcher lines/s':>16} {'Same hits':>10}")
+    print("-" * 52)
+    for extra in (0, 50, 200, 1000):
+        help_keywords = HELP_KEYWORDS + extra_keywords(extra)
+        matcher = KeywordMatcher({'help': help_keywords, 'anomaly': ANOMALY_KEYWORDS})
+        same = loop_scan(lines, help_keywords, ANOMALY_KEYWORDS) == matcher_scan(lines, matcher)
+        loop_rate = rate(loop_scan, lines, help_keywords, ANOMALY_KEYWORDS)
+        matcher_rate = rate(matcher_scan, lines, matcher)
+        print(f"{len(help_keywords) + len(ANOMALY_KEYWORDS):>9} {loop_rate:>14,.0f} "
+              f"{matcher_rate:>16,.0f} {'✓' if same else '✗':>10}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Parser microbenchmark - legacy if/elif parser vs the table-driven parser
+Parser only: legacy parse_message vs parse_line on pre-decoded lines
+Old path: decode + strip in the reader, legacy parse_message and pattern scan
+New path: raw line handed to _process_message-style decode-once parse_line
+
+Usage:
+  python bench_parser.py [line_count | session.rec]
+A session file recorded with SESSION_RECORD_FILE benchmarks real traffic
+"""
+
+import os
+import random
+import sys
+import time
+
+# Add python_whatsapp to path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'python_whatsapp'))
+
+from message_parser import ArduinoMessageParser
+from main import ESP32EmailIntegration
+from legacy_parser import LegacyMessageParser, legacy_detect_patterns
+from session_recorder import iter_records
+
+def protocol_corpus(line_count, seed=7):
+    """Raw lines in the proportions a running sound_detector.ino produces"""
+    rng = random.Random(seed)
+    lines = []
+    alert_id = emergency_id = 0
+    while len(lines) < line_count:
+        roll = rng.random()
+        if roll < 0.55:
+            lines.append(b"STATUS:CURRENT_LEVEL:%d" % rng.randint(150, 600))
+        elif roll < 0.75:
+            lines.extend([b"STATUS:UPDATE", b"STATUS:UPTIME:1h:%dm:%ds" % (rng.randint(0, 59), rng.randint(0, 59)),
+                          b"STATUS:BASELINE:%d" % rng.randint(180, 240), b"STATUS:THRESHOLD:360",
+                          b"STATUS:ALERTS:%d" % alert_id, b"STATUS:HELP_CALLS:%d" % emergency_id,
+                          b"STATUS:FREE_MEMORY:182344"])
+        elif roll < 0.85:
+            lines.extend([b"CALIBRATION:PROGRESS:%d" % rng.randint(0, 99), b"ESP32_BASELINE:%d" % rng.randint(180, 240)])
+        elif roll < 0.97:
+            alert_id += 1
+            level = rng.randint(400, 3500)
+            lines.extend([b"ALERT:START", b"ALERT:ID:%d" % alert_id, b"ALERT:TIMESTAMP:%d" % rng.randint(0, 10**7),
+                          b"ALERT:LEVEL:%d" % level, b"ALERT:BASELINE:210", b"ALERT:DIFFERENCE:%d" % (level - 210),
+                          b"ALERT:SEVERITY:HIGH", b"ALERT:LOCATION:Home Office", b"ALERT:UPTIME:1h:2m:3s",
+                          b"ALERT:END"])
+        else:
+            emergency_id += 1
+            lines.extend([b"EMERGENCY:HELP_DETECTED", b"EMERGENCY:START", b"EMERGENCY:ID:%d" % emergency_id,
+                          b"EMERGENCY:TIMESTAMP:%d" % rng.randint(0, 10**7),
+                          b"EMERGENCY:TYPE:VOICE_HELPEMERGENCY:SOUND_LEVEL:2875",
+                          b"EMERGENCY:LOCATION:Home Office", b"EMERGENCY:UPTIME:1h:2m:3s",
+                          b"EMERGENCY:MESSAGE:Person needs help at location",
+                          b"EMERGENCY:ACTION_REQUIRED:SEND_WHATSAPP", b"EMERGENCY:CONTACT:+91 0000000000",
+                          b"EMERGENCY:END", b"HELP command detected - Emergency alert sent!"])
+    return lines[:line_count]
+
+def make_integration():
+    """Detection helpers only need the stats dict - skip serial/email setup"""
+    integration = ESP32EmailIntegration.__new__(ESP32EmailIntegration)
+    integration.stats = {'baseline': 200}
+    return integration
+
+def run_legacy_parser(lines):
+    parse = LegacyMessageParser().parse_message
+    return [parse(line) for line in lines]
+
+def run_table_parser(lines):
+    parse = ArduinoMessageParser().parse_line
+    return [parse(line) for line in lines]
+
+def run_str_path(raw_lines):
+    parser = LegacyMessageParser()
+    stats = {'baseline': 200}
+    results = []
+    for raw in raw_lines:
+        message = raw.decode('utf-8', errors='ignore').strip()
+        parsed = parser.parse_message(message)
+        if not parsed:
+            parsed = legacy_detect_patterns(message, stats)
+        results.append(parsed)
+    return results
+
+def run_bytes_path(raw_lines):
+    parser = ArduinoMessageParser()
+    integration = make_integration()
+    results = []
+    for raw in raw_lines:
+        message = raw.decode('utf-8', errors='ignore')
+        parsed = parser.parse_line(message)
+        if not parsed:
+            parsed = integration._detect_esp32_patterns(message)
+        results.append(parsed)
+    return results
+
+def comparable(results):
+    """Drop wall-clock timestamps and the new trigger lists so both paths can be compared"""
+    return [{k: v for k, v in r.items() if k not in ('timestamp', 'triggers')} if r else r for r in results]
+
+def timed(function, lines, repeats):
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function(lines)
+        best = min(best, time.perf_counter() - start)
+    return len(lines) / best
+
+def main():
+    source = sys.argv[1] if len(sys.argv) > 1 else '200000'
+    if source.isdigit():
+        lines = protocol_corpus(int(source))
+        description = f"{len(lines):,} lines in sound_detector.ino proportions"
+    else:
+        lines = [line for _, line in iter_records(source)]
+        description = f"{len(lines):,} recorded lines from {source}"
+    text_lines = [raw.decode('utf-8', errors='ignore').strip() for raw in lines]
+
+    # Baseline updates print a line each - keep the console out of the timing
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        parser_same = comparable(run_legacy_parser(text_lines)) == comparable(run_table_parser(text_lines))
+        legacy_rate = timed(run_legacy_parser, text_lines, 3)
+        table_rate = timed(run_table_parser, text_lines, 3)
+        same = comparable(run_str_path(lines)) == comparable(run_bytes_path(lines))
+        str_rate = timed(run_str_path, lines, 3)
+        bytes_rate = timed(run_bytes_path, lines, 3)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+    print("=" * 70)
+    print("PARSER MICROBENCHMARK")
+    print("=" * 70)
+    print(f"Corpus: {description}")
+    print()
+    print(f"Parser only - results identical: {'✓' if parser_same else '✗'}")
+    print(f"legacy parse_message (if/elif):            {legacy_rate:>12,.0f} lines/s")
+    print(f"table parse_line (protocol_spec):          {table_rate:>12,.0f} lines/s")
+    print(f"Speedup: {table_rate / legacy_rate:.2f}x")
+    print()
+    print(f"Full line handling - results identical: {'✓' if same else '✗'}")
+    print(f"legacy path (decode+strip, parse_message): {str_rate:>12,.0f} lines/s")
+    print(f"raw path    (decode once, parse_line):     {bytes_rate:>12,.0f} lines/s")
+    print(f"Speedup: {bytes_rate / str_rate:.2f}x")
+
+if __name__ == "__main__":
+    main()
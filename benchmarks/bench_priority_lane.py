@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Emergency priority lane benchmark
+Measures time from serial receipt of EMERGENCY:HELP_DETECTED to the consumer
+handling it while the normal lane already holds thousands of lines
+"""
+
+import os
+import sys
+import threading
+import time
+
+# Add python_whatsapp to path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'python_whatsapp'))
+
+from arduino_reader import ArduinoReader
+from message_parser import ArduinoMessageParser
+
+BACKLOG_LINES = [b"STATUS:CURRENT_LEVEL:412", b"CALIBRATION:PROGRESS:40", b"ESP32_BASELINE:205",
+                 b"STATUS:UPDATE", b"STATUS:UPTIME:0h:12m:5s"]
+HELP_LINE = b"EMERGENCY:HELP_DETECTED"
+
+def run_trial(priority_prefixes, backlog, handler_cost):
+    """Returns receipt-to-handler latency in milliseconds for one HELP line"""
+    reader = ArduinoReader('SIM', 115200, queue_size=backlog * 2, echo=False,
+                           priority_prefixes=priority_prefixes)
+    parser = ArduinoMessageParser()
+    handled = {}
+    done = threading.Event()
+
+    for index in range(backlog):
+        reader._dispatch_line(BACKLOG_LINES[index % len(BACKLOG_LINES)])
+
+    def consumer():
+        while not done.is_set():
+            message = reader.get_message(timeout=1.0)
+            if message is None:
+                continue
+            parser.parse_message(message)
+            if message == "EMERGENCY:HELP_DETECTED":
+                handled['at'] = time.perf_counter()
+                done.set()
+                return
+            # Stand-in for per-line handling work in the main loop
+            end = time.perf_counter() + handler_cost
+            while time.perf_counter() < end:
+                pass
+
+    thread = threading.Thread(target=consumer, daemon=True)
+    thread.start()
+    time.sleep(0.002)  # consumer is busy working through the backlog
+
+    received = time.perf_counter()
+    reader._dispatch_line(HELP_LINE)
+    done.wait(timeout=60)
+    thread.join()
+    return (handled['at'] - received) * 1000
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def main():
+    trials = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    handler_cost = 20e-6  # 20 us of work per normal line
+
+    print("=" * 70)
+    print("EMERGENCY PRIORITY LANE BENCHMARK")
+    print("=" * 70)
+    print(f"{trials} trials per case, {handler_cost * 1e6:.0f} us handler cost per normal line")
+    print()
+    print(f"{'Backlog':>8} {'Lane':>10} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    print("-" * 50)
+    for backlog in (1000, 5000, 20000):
+        for label, prefixes in (("fifo", ()), ("priority", (b'EMERGENCY:',))):
+            samples = [run_trial(prefixes, backlog, handler_cost) for _ in range(trials)]
+            print(f"{backlog:>8} {label:>10} {percentile(samples, 0.5):>9.3f} "
+                  f"{percentile(samples, 0.99):>9.3f} {max(samples):>9.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Serial hub scaling benchmark - N pseudo-terminal devices, one selector loop
+Linux/Mac only (uses pty pairs as stand-in serial ports)
+"""
+
+import os
+import sys
+import threading
+import time
+import tty
+
+# Add python_whatsapp to path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'python_whatsapp'))
+
+import serial
+from serial_hub import SerialHub, SerialDevice
+
+BLOCK = (
+    b"ALERT:START\r\nALERT:ID:4\r\nALERT:TIMESTAMP:99120\r\nALERT:LEVEL:1840\r\n"
+    b"ALERT:BASELINE:210\r\nALERT:DIFFERENCE:1630\r\nALERT:SEVERITY:HIGH\r\n"
+    b"ALERT:LOCATION:Ward 3\r\nALERT:UPTIME:01:22:10\r\nALERT:END\r\n"
+)
+LINES_PER_BLOCK = BLOCK.count(b"\n")
+
+def writer(masters, blocks_per_device, stop):
+    """Round-robin every device, one ALERT block at a time"""
+    for _ in range(blocks_per_device):
+        for fd in masters:
+            if stop.is_set():
+                return
+            os.write(fd, BLOCK)
+
+def run_case(device_count, blocks_per_device):
+    hub = SerialHub()
+    masters = []
+    for index in range(device_count):
+        master, slave = os.openpty()
+        tty.setraw(slave)
+        name = os.ttyname(slave)
+        connection = serial.Serial(name, 115200, timeout=0)
+        hub.attach_device(SerialDevice(name, f"ESP32_{index:03d}"), connection)
+        masters.append(master)
+
+    expected = device_count * blocks_per_device * LINES_PER_BLOCK
+    stop = threading.Event()
+    thread = threading.Thread(target=writer, args=(masters, blocks_per_device, stop), daemon=True)
+
+    received = 0
+    events = 0
+    start_wall = time.perf_counter()
+    start_cpu = time.thread_time()
+    thread.start()
+    while received < expected:
+        lines = hub.poll(timeout=1.0)
+        if not lines:
+            break
+        for device, line in lines:
+            if hub.parser.parse_message(line, device):
+                events += 1
+        received += len(lines)
+    elapsed = time.perf_counter() - start_wall
+    cpu = time.thread_time() - start_cpu
+
+    stop.set()
+    thread.join()
+    hub.close()
+    for fd in masters:
+        os.close(fd)
+    return received, expected, events, elapsed, cpu
+
+def main():
+    blocks = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+
+    print("=" * 70)
+    print("SERIAL HUB BENCHMARK (single selector loop, pty devices)")
+    print("=" * 70)
+    print(f"{'Devices':>8} {'Lines':>9} {'Events':>8} {'Lines/s':>11} {'Hub CPU':>9}")
+    print("-" * 50)
+    for device_count in (1, 10, 50, 100):
+        received, expected, events, elapsed, cpu = run_case(device_count, blocks)
+        status = "" if received == expected else f"  (lost {expected - received})"
+        print(f"{device_count:>8} {received:>9} {events:>8} {received / elapsed:>11,.0f} "
+              f"{cpu / elapsed:>8.0%}{status}")
+
+if __name__ == "__main__":
+    main()
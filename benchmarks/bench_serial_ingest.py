@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Serial ingestion benchmark - legacy readline polling vs chunked reads
+Feeds ArduinoReader from a simulated UART that produces bytes at the
+real line rate (baudrate / 10 bytes per second, 8N1 framing)
+"""
+
+import os
+import sys
+import time
+
+# Add python_whatsapp to path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'python_whatsapp'))
+
+from arduino_reader import ArduinoReader, READ_MODE_CHUNKED, READ_MODE_LINE
+
+EMERGENCY_BLOCK = [
+    "EMERGENCY:HELP_DETECTED",
+    "EMERGENCY:START",
+    "EMERGENCY:ID:7",
+    "EMERGENCY:TIMESTAMP:1234567",
+    "EMERGENCY:TYPE:VOICE_HELPEMERGENCY:SOUND_LEVEL:2875",
+    "EMERGENCY:LOCATION:Home Office",
+    "EMERGENCY:UPTIME:00:20:34",
+    "EMERGENCY:MESSAGE:Person needs help at location",
+    "EMERGENCY:ACTION_REQUIRED:SEND_WHATSAPP",
+    "EMERGENCY:CONTACT:+91 0000000000",
+    "EMERGENCY:END",
+    "HELP command detected - Emergency alert sent!",
+    "ESP32_BASELINE:212",
+    "ESP32_THRESHOLD:362",
+]
+
+class SimulatedUART:
+    """Minimal pyserial stand-in that releases bytes at the configured baudrate"""
+
+    def __init__(self, payload, baudrate, timeout=1):
+        self.payload = payload
+        self.bytes_per_second = baudrate / 10.0
+        self.timeout = timeout
+        self.position = 0
+        self.start_time = None
+        self.is_open = True
+
+    def _available(self):
+        produced = int((time.perf_counter() - self.start_time) * self.bytes_per_second)
+        return min(produced, len(self.payload)) - self.position
+
+    @property
+    def in_waiting(self):
+        return max(0, self._available())
+
+    def read(self, size=1):
+        deadline = time.perf_counter() + self.timeout
+        while self._available() < size and self.position + size <= len(self.payload):
+            if time.perf_counter() >= deadline:
+                break
+            time.sleep(0.0001)
+        size = min(size, max(0, self._available()))
+        data = self.payload[self.position:self.position + size]
+        self.position += size
+        return data
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def readline(self):
+        end = self.payload.find(b'\n', self.position)
+        size = (end + 1 if end >= 0 else len(self.payload)) - self.position
+        return self.read(size)
+
+    def close(self):
+        self.is_open = False
+
+def run_case(read_mode, baudrate, payload, total_lines, duration):
+    """Run one reader mode against the UART and return (lines/s, drained fraction)"""
+    # Room for the whole workload: this measures ingest, not the queue's drop policy
+    reader = ArduinoReader('SIM', baudrate, timeout=0.05, read_mode=read_mode, echo=False,
+                           queue_size=total_lines)
+    uart = SimulatedUART(payload, baudrate, timeout=0.05)
+    reader.serial_connection = uart
+    reader.is_connected = True
+
+    # Silence the thread start/stop banners
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        uart.start_time = time.perf_counter()
+        reader.start_reading()
+        time.sleep(duration)
+        reader.is_reading = False
+        reader.read_thread.join(timeout=2)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+    received = reader.message_queue.qsize()
+    offered = min(total_lines, int(duration * uart.bytes_per_second / (len(payload) / total_lines)))
+    return received / duration, received / max(1, offered)
+
+def main():
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 2.0
+
+    lines = EMERGENCY_BLOCK * 2000
+    payload = ("\r\n".join(lines) + "\r\n").encode('utf-8')
+
+    print("=" * 70)
+    print("SERIAL INGESTION BENCHMARK")
+    print("=" * 70)
+    print(f"Workload: repeated {len(EMERGENCY_BLOCK)}-line EMERGENCY block, {duration:.1f}s per case")
+    print()
+    print(f"{'Baudrate':>10} {'Mode':>8} {'Lines/s':>12} {'Kept up':>9}")
+    print("-" * 44)
+
+    for baudrate in (115200, 921600):
+        for read_mode in (READ_MODE_LINE, READ_MODE_CHUNKED):
+            rate, drained = run_case(read_mode, baudrate, payload, len(lines), duration)
+            print(f"{baudrate:>10} {read_mode:>8} {rate:>12,.0f} {drained:>8.0%}")
+
+    print()
+    print("'Kept up' is the share of lines the UART delivered that reached the queue.")
+
+if __name__ == "__main__":
+    main()
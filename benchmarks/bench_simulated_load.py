@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+End-to-end load benchmark on simulated ESP32 boards (Linux/Mac)
+A pty simulator drives the real ArduinoReader and ESP32EmailIntegration
+message handling (emails in dry-run mode) at increasing alert rates
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+# Add python_whatsapp to path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'python_whatsapp'))
+
+import serial
+from arduino_reader import ArduinoReader
+from esp32_simulator import ESP32Simulator
+from main import ESP32EmailIntegration
+
+def run_load(alert_rate, duration, raw_lines):
+    simulator = ESP32Simulator(devices=1, alert_rate=alert_rate, help_rate=alert_rate / 100,
+                               status_interval=1, seed=11).start()
+    integration = ESP32EmailIntegration()
+    integration.email_sender.dry_run = True
+    reader = ArduinoReader(simulator.ports[0], 115200, echo=False, raw_lines=raw_lines)
+    reader.attach(serial.Serial(simulator.ports[0], 115200, timeout=0.1))
+    integration.esp32 = reader
+    reader.start_reading()
+
+    processed = 0
+    started = time.perf_counter()
+    try:
+        while time.perf_counter() - started < duration:
+            message = reader.get_message(timeout=0.1)
+            if message:
+                integration._process_message(message)
+                processed += 1
+        elapsed = time.perf_counter() - started
+    finally:
+        reader.disconnect()
+        simulator.stop()
+
+    generated = sum(device['lines_written'] for device in simulator.stats().values())
+    return generated / elapsed, processed / elapsed, reader.get_queue_stats()
+
+def main():
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 3.0
+    results = []
+
+    # Handlers print every alert and dry-run emails write the detection log
+    stdout = sys.stdout
+    workdir = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        for alert_rate in (10, 100, 500, 2000):
+            results.append((alert_rate,) + run_load(alert_rate, duration, True))
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+        os.chdir(cwd)
+
+    print("=" * 70)
+    print("SIMULATED ESP32 LOAD BENCHMARK")
+    print("=" * 70)
+    print(f"{duration:.0f}s per rate, one board, full _process_message handling")
+    print()
+    print(f"{'Alerts/s':>9} {'Sent lines/s':>13} {'Handled/s':>11} {'Dropped':>9} {'High water':>11}")
+    print("-" * 58)
+    for alert_rate, sent, handled, stats in results:
+        print(f"{alert_rate:>9} {sent:>13,.0f} {handled:>11,.0f} {stats['dropped']:>9,} {stats['high_water']:>11,}")
+
+if __name__ == "__main__":
+    main()
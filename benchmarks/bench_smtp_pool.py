@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+SMTP send latency benchmark - a handshake per email vs pooled warm sessions
+Runs against the local fake SMTP server with simulated round trips, so the
+numbers show what reuse saves per alert rather than any real server's speed.
+
+Usage: python bench_smtp_pool.py [sends] [rtt_ms] [handshake_ms]
+"""
+
+import os
+import smtplib
+import sys
+import threading
+import time
+
+# Add python_whatsapp to path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'python_whatsapp'))
+
+from fake_smtp import FakeSMTPServer
+from smtp_pool import SMTPPool
+
+MESSAGE = "Subject: EMERGENCY ALERT - HELP DETECTED\r\n\r\nSomeone is calling for help.\r\n"
+
+def send_per_message(server, sends):
+    """What EmailSender used to do: connect, log in, send and quit for every email"""
+    samples = []
+    for _ in range(sends):
+        started = time.perf_counter()
+        smtp = smtplib.SMTP('127.0.0.1', server.port, timeout=10)
+        smtp.login('user', 'password')
+        smtp.sendmail('esp32@example.com', ['help@example.com'], MESSAGE)
+        samples.append(time.perf_counter() - started)
+        smtp.quit()
+    return samples
+
+def send_pooled(server, sends, workers):
+    pool = SMTPPool('127.0.0.1', server.port, 'user', 'password', size=workers, starttls=False, timeout=10)
+    samples = []
+    lock = threading.Lock()
+
+    def worker(count):
+        for _ in range(count):
+            started = time.perf_counter()
+            with pool.session() as session:
+                session.sendmail('esp32@example.com', ['help@example.com'], MESSAGE)
+            elapsed = time.perf_counter() - started
+            with lock:
+                samples.append(elapsed)
+
+    threads = [threading.Thread(target=worker, args=(sends // workers,)) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    pool.close()
+    return samples, pool.connects
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def report(label, samples, connects):
+    print(f"{label:<22} {len(samples):>6} {connects:>9} {percentile(samples, 0.5) * 1000:>9.1f} "
+          f"{percentile(samples, 0.99) * 1000:>9.1f} {max(samples) * 1000:>9.1f}")
+
+def main():
+    sends = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    rtt = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.02
+    handshake = float(sys.argv[3]) / 1000 if len(sys.argv) > 3 else 0.1
+
+    print("=" * 70)
+    print("SMTP SESSION POOL BENCHMARK")
+    print("=" * 70)
+    print(f"{sends} emails per case, {rtt * 1000:.0f} ms per reply, "
+          f"{handshake * 1000:.0f} ms connection setup")
+    print()
+    print(f"{'Case':<22} {'Sends':>6} {'Connects':>9} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    print("-" * 70)
+
+    server = FakeSMTPServer(rtt, handshake).start()
+    try:
+        report("handshake per email", send_per_message(server, sends), sends)
+        report("pooled, 1 session", *send_pooled(server, sends, 1))
+        report("pooled, 2 in parallel", *send_pooled(server, sends, 2))
+    finally:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Parsing hot-path benchmark suite with a tracked results file
+Runs ArduinoMessageParser.parse_line, _detect_esp32_patterns and the full
+per-line path on the firmware corpus and on its malformed copy, measuring
+lines/s, memory blocks and bytes left allocated per line (the events and
+their values), and per-line latency percentiles including the worst line.
+
+Usage:
+  python bench_suite.py                 # print the table
+  python bench_suite.py --write         # store results/parser_suite.json
+  python bench_suite.py --check         # exit 1 on a regression against it
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+from corpus import firmware_corpus, malformed_corpus
+from bench_parser import make_integration
+from message_parser import ArduinoMessageParser
+
+RESULTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results', 'parser_suite.json')
+
+# A check fails when throughput drops or retained allocations grow by more than this
+TOLERANCE = 0.25
+
+def parse_line_case(lines):
+    parse = ArduinoMessageParser().parse_line
+    decoded = [line.decode('utf-8', errors='ignore') for line in lines]
+    return parse, decoded
+
+def detect_case(lines):
+    """_detect_esp32_patterns on the lines the parser leaves to it"""
+    parser = ArduinoMessageParser()
+    decoded = [line.decode('utf-8', errors='ignore') for line in lines]
+    misses = [message for message in decoded if not parser.parse_line(message)]
+    return make_integration()._detect_esp32_patterns, misses
+
+def process_case(lines):
+    """What _process_message does for a raw line before dispatching"""
+    parse = ArduinoMessageParser().parse_line
+    detect = make_integration()._detect_esp32_patterns
+
+    def process(raw):
+        message = raw.decode('utf-8', errors='ignore')
+        return parse(message) or detect(message)
+    return process, lines
+
+CASES = {'parse_line': parse_line_case, 'detect_patterns': detect_case, 'process_line': process_case}
+
+def throughput(case, lines, repeats):
+    best = float('inf')
+    for _ in range(repeats):
+        step, inputs = case(lines)
+        start = time.perf_counter()
+        for item in inputs:
+            step(item)
+        best = min(best, time.perf_counter() - start)
+    return len(inputs) / best
+
+def allocations(case, lines):
+    """Blocks and bytes still allocated per line with every result kept"""
+    step, inputs = case(lines)
+    gc.collect()
+    gc.disable()
+    try:
+        blocks_before = sys.getallocatedblocks()
+        results = [step(item) for item in inputs]
+        blocks = sys.getallocatedblocks() - blocks_before - 1  # minus the results list
+
+        step, inputs = case(lines)
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        results = [step(item) for item in inputs]
+        retained = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+    finally:
+        gc.enable()
+    del results
+    return blocks / len(inputs), retained / len(inputs)
+
+def latency(case, lines):
+    """Per-line latency percentiles in ns (timer overhead included, GC left on)"""
+    step, inputs = case(lines)
+    clock = time.perf_counter_ns
+    samples = []
+    for item in inputs:
+        start = clock()
+        step(item)
+        samples.append(clock() - start)
+    worst = max(range(len(samples)), key=samples.__getitem__)
+    ordered = sorted(samples)
+
+    def percentile(fraction):
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+    return {
+        'p50_ns': percentile(0.50),
+        'p99_ns': percentile(0.99),
+        'p999_ns': percentile(0.999),
+        'max_ns': ordered[-1],
+        'worst_line': repr(inputs[worst])[:80],
+    }
+
+def run_suite(line_count, repeats):
+    lines = firmware_corpus(line_count)
+    corpora = {'firmware': lines, 'malformed': malformed_corpus(lines)}
+    results = {}
+    for corpus_name, corpus_lines in corpora.items():
+        for case_name, case in CASES.items():
+            blocks, retained = allocations(case, corpus_lines)
+            results[f"{case_name}/{corpus_name}"] = dict(
+                lines_per_s=round(throughput(case, corpus_lines, repeats)),
+                alloc_blocks_per_line=round(blocks, 3),
+                alloc_bytes_per_line=round(retained, 1),
+                **latency(case, corpus_lines),
+            )
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'lines': line_count,
+        'results': results,
+    }
+
+def regressions(current, baseline, tolerance):
+    """Human-readable list of metrics that got worse than the tolerance allows"""
+    problems = []
+    for name, metrics in current['results'].items():
+        previous = baseline['results'].get(name)
+        if previous is None:
+            continue
+        if metrics['lines_per_s'] < previous['lines_per_s'] * (1 - tolerance):
+            problems.append(f"{name}: {metrics['lines_per_s']:,} lines/s, was {previous['lines_per_s']:,}")
+        for key in ('alloc_blocks_per_line', 'alloc_bytes_per_line'):
+            if metrics[key] > previous[key] * (1 + tolerance) + 0.5:
+                problems.append(f"{name}: {key} {metrics[key]}, was {previous[key]}")
+    return problems
+
+def print_table(report):
+    print("=" * 100)
+    print("PARSER BENCHMARK SUITE")
+    print("=" * 100)
+    print(f"{report['implementation']} {report['python']} on {report['machine']}, "
+          f"{report['lines']:,} firmware lines (+ malformed copy)")
+    print()
+    print(f"{'Case':<28} {'Lines/s':>11} {'Blocks/line':>12} {'Bytes/line':>11} "
+          f"{'p50 ns':>8} {'p99 ns':>8} {'p99.9 ns':>9} {'max ns':>9}")
+    print("-" * 100)
+    for name, metrics in report['results'].items():
+        print(f"{name:<28} {metrics['lines_per_s']:>11,} {metrics['alloc_blocks_per_line']:>12} "
+              f"{metrics['alloc_bytes_per_line']:>11} {metrics['p50_ns']:>8,} {metrics['p99_ns']:>8,} "
+              f"{metrics['p999_ns']:>9,} {metrics['max_ns']:>9,}")
+    print()
+    for name, metrics in report['results'].items():
+        print(f"worst {name:<28} {metrics['worst_line']}")
+
+def main():
+    arguments = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    arguments.add_argument('--lines', type=int, default=100000)
+    arguments.add_argument('--repeats', type=int, default=3)
+    arguments.add_argument('--results', default=RESULTS_FILE)
+    arguments.add_argument('--write', action='store_true', help="store the results as the new baseline")
+    arguments.add_argument('--check', action='store_true', help="compare against the stored baseline")
+    arguments.add_argument('--tolerance', type=float, default=TOLERANCE)
+    options = arguments.parse_args()
+
+    # Baseline updates print a line each - keep the console out of the timing
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        report = run_suite(options.lines, options.repeats)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+    print_table(report)
+
+    if options.check:
+        with open(options.results) as results_file:
+            problems = regressions(report, json.load(results_file), options.tolerance)
+        print()
+        for problem in problems:
+            print(f"✗ {problem}")
+        if problems:
+            sys.exit(1)
+        print(f"✓ No regressions against {options.results}")
+
+    if options.write:
+        os.makedirs(os.path.dirname(options.results), exist_ok=True)
+        with open(options.results, 'w') as results_file:
+            json.dump(report, results_file, indent=2)
+            results_file.write('\n')
+        print(f"\n✓ Results written to {options.results}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark and fuzz corpora built from the sound_detector.ino output formats
+firmware_corpus() runs the SimulatedESP32 firmware routines, so every line
+(and every missing newline) is exactly what a board prints. malformed_corpus()
+damages a share of those lines the way a noisy serial link does.
+"""
+
+import os
+import random
+import sys
+
+# Add python_whatsapp to path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'python_whatsapp'))
+
+from esp32_simulator import SimulatedESP32
+
+COMMANDS = ('STATUS', 'RESET', 'BASELINE', 'SENSITIVITY:90', 'SENSITIVITY:abc', 'TEST', 'TESTHELP', 'HELLO')
+
+def firmware_corpus(line_count, seed=7):
+    """Raw lines (bytes, no terminators) in the mix a monitoring board produces"""
+    rng = random.Random(seed)
+    firmware = SimulatedESP32(rng=random.Random(seed))
+    output = [data for _, data in firmware.setup()]
+    size = 0
+    while size < line_count:
+        roll = rng.random()
+        if roll < 0.60:
+            steps = firmware.send_status_update()
+        elif roll < 0.90:
+            steps = firmware.handle_anomaly_detection()
+        elif roll < 0.94:
+            steps = firmware.handle_help_command()
+        elif roll < 0.99:
+            steps = firmware.handle_serial_command(rng.choice(COMMANDS))
+        else:
+            steps = firmware.setup()  # reboot
+        chunk = b''.join(data for _, data in steps)
+        output.append(chunk)
+        size += chunk.count(b'\r\n')
+    return b''.join(output).split(b'\r\n')[:line_count]
+
+def _truncate(rng, line):
+    return line[:rng.randint(0, max(len(line) - 1, 0))]
+
+def _drop_value(rng, line):
+    return line[:line.rfind(b':') + 1] if b':' in line else line + b':'
+
+def _garble_value(rng, line):
+    return line + rng.choice((b'x', b'.5', b'-', b' ', b'\x00'))
+
+def _extra_colons(rng, line):
+    return line.replace(b':', b'::', 1)
+
+def _lowercase(rng, line):
+    return line.lower()
+
+def _binary(rng, line):
+    position = rng.randint(0, len(line))
+    return line[:position] + bytes(rng.randint(128, 255) for _ in range(rng.randint(1, 4))) + line[position:]
+
+def _overlong(rng, line):
+    return line + b'9' * rng.choice((64, 1024, 4096))
+
+def _blank(rng, line):
+    return rng.choice((b'', b' ', b':', b'::', b'\t'))
+
+MUTATIONS = (_truncate, _drop_value, _garble_value, _extra_colons, _lowercase, _binary, _overlong, _blank)
+
+def malformed_corpus(lines, share=0.3, seed=11):
+    """Copy of lines with a share damaged, dropped (START without END) or glued together"""
+    rng = random.Random(seed)
+    damaged = []
+    for line in lines:
+        if rng.random() >= share:
+            damaged.append(line)
+            continue
+        roll = rng.random()
+        if roll < 0.15:
+            continue                                   # lost line
+        if roll < 0.25 and damaged:
+            damaged[-1] += line                        # lost newline
+            continue
+        damaged.append(rng.choice(MUTATIONS)(rng, line))
+    return damaged
@@ -0,0 +1,112 @@
+"""
+Fake SMTP server for the SMTP pool benchmark and tests
+Speaks enough ESMTP for smtplib (EHLO, AUTH PLAIN, MAIL, RCPT, DATA, NOOP,
+RSET, QUIT) on a local port. `rtt` seconds are slept before every reply and
+`handshake` seconds before the greeting, standing in for network round
+trips and the TLS setup a real server costs. drop_all() closes every open
+connection, like a server-side idle timeout.
+"""
+
+import socket
+import socketserver
+import threading
+import time
+
+class FakeSMTPHandler(socketserver.StreamRequestHandler):
+
+    def reply(self, text):
+        time.sleep(self.server.rtt)
+        self.wfile.write(text.encode() + b"\r\n")
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+            server.open.add(self.connection)
+        try:
+            time.sleep(server.handshake)
+            self.reply("220 fake.smtp ESMTP ready")
+            self.session()
+        except OSError:
+            pass
+        finally:
+            with server.lock:
+                server.open.discard(self.connection)
+
+    def session(self):
+        server = self.server
+        mail_from, recipients = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors='replace').strip()
+            verb = command.split(' ', 1)[0].upper()
+            with server.lock:
+                server.commands[verb] = server.commands.get(verb, 0) + 1
+            if verb == 'EHLO':
+                self.reply("250-fake.smtp\r\n250-AUTH PLAIN\r\n250 8BITMIME")
+            elif verb == 'HELO':
+                self.reply("250 fake.smtp")
+            elif verb == 'AUTH':
+                self.reply("235 2.7.0 Accepted")
+            elif verb == 'MAIL':
+                mail_from, recipients = command[10:].strip('<> '), []
+                self.reply("250 OK")
+            elif verb == 'RCPT':
+                recipients.append(command[8:].strip('<> '))
+                self.reply("250 OK")
+            elif verb == 'DATA':
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                body = []
+                for data in self.rfile:
+                    if data in (b".\r\n", b".\n"):
+                        break
+                    body.append(data)
+                with server.lock:
+                    server.messages.append((mail_from, recipients, b"".join(body)))
+                self.reply("250 OK queued")
+            elif verb in ('NOOP', 'RSET'):
+                self.reply("250 OK")
+            elif verb == 'QUIT':
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+class FakeSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, rtt=0.0, handshake=0.0):
+        super().__init__(('127.0.0.1', 0), FakeSMTPHandler)
+        self.rtt = rtt
+        self.handshake = handshake
+        self.lock = threading.Lock()
+        self.open = set()
+        self.connections = 0
+        self.commands = {}
+        self.messages = []
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def drop_all(self):
+        """Close every client connection, as an idle timeout on the server would"""
+        with self.lock:
+            connections = list(self.open)
+        for connection in connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def stop(self):
+        self.shutdown()
+        self.drop_all()
+        self.server_close()
@@ -0,0 +1,195 @@
+"""
+Durable alert spool - SQLite in WAL mode
+Emergency, anomaly and digest emails are written here before they are
+sent and marked delivered once the SMTP server accepts them (or the alert
+is declined on purpose). An alert held back by the rate limit stays
+pending until the digest that carries it is spooled - that digest's row
+and the delivered marks of its alerts go into the same transaction. Alerts
+still pending when the process dies or the SMTP server stays unreachable
+are sent at the next start.
+
+Writes are batched: add() appends to an open transaction, committed every
+`batch_size` writes, by a one-shot scheduler timer `flush_interval` after
+the batch was opened and by commit(spool_id) right before that alert's
+first send - so enqueueing stays well under a millisecond, and no alert is
+sent before it is on disk. A lost delivered mark only means the email goes
+out twice after a crash.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from digest import Digest, digest_from_dict
+from events import Event, from_dict
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS alerts (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created REAL NOT NULL,
+    delivered REAL
+);
+CREATE INDEX IF NOT EXISTS pending_alerts ON alerts (id) WHERE delivered IS NULL;
+"""
+
+def encode(data):
+    """JSON for an event (with its arrival time), a digest item or a plain value such as a report tuple"""
+    if isinstance(data, Event):
+        fields = data.to_dict()
+        del fields['timestamp']
+        return json.dumps({'event': fields, 'time_ns': data.time_ns}, default=str)
+    if is_digest_item(data):
+        kind, digests = data
+        return json.dumps({'digest': kind, 'digests': [digest.to_dict() for digest in digests]})
+    return json.dumps({'value': data}, default=str)
+
+def decode(payload):
+    record = json.loads(payload)
+    if 'event' in record:
+        event = from_dict(record['event'])
+        event.time_ns = record['time_ns']
+        return event
+    if 'digest' in record:
+        return (record['digest'], [digest_from_dict(fields) for fields in record['digests']])
+    value = record['value']
+    return tuple(value) if isinstance(value, list) else value
+
+def is_digest_item(data):
+    """(kind, [Digest, ...]) as queued by EmailSender's queue_digest"""
+    return (isinstance(data, tuple) and len(data) == 2 and isinstance(data[1], list)
+            and bool(data[1]) and all(isinstance(digest, Digest) for digest in data[1]))
+
+class AlertSpool:
+    """Pending alerts on disk, shared by the outbox workers and the main loop"""
+
+    def __init__(self, path, batch_size=64, kinds=('emergency', 'anomaly', 'digest'),
+                 retention=None, scheduler=None, flush_interval=1.0, synchronous='NORMAL'):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.path = path
+        self.batch_size = batch_size
+        self.kinds = frozenset(kinds)   # outbox kinds worth keeping across a restart
+        self.scheduler = scheduler      # commits a batch flush_interval after it was opened
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        # Autocommit mode - transactions are opened and committed explicitly in batches
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        # NORMAL: a commit survives a process crash; FULL also survives power loss
+        self.db.execute(f'PRAGMA synchronous={synchronous}')
+        self.db.executescript(SCHEMA)
+        self.in_transaction = False
+        self.uncommitted = 0
+        self.last_id = self.db.execute('SELECT COALESCE(MAX(id), 0) FROM alerts').fetchone()[0]
+        self.committed_id = self.last_id
+
+        # Counters for the status printout
+        self.added = 0
+        self.delivered_count = 0
+        self.commits = 0
+
+        if retention is not None:
+            self.purge(retention)
+
+    def add(self, kind, data):
+        """Spool an alert - returns its id; durable by the next commit
+
+        A digest takes over the rows of the held-back alerts it carries:
+        they are marked delivered in the same transaction.
+        """
+        payload = encode(data)
+        carried = [row for digest in data[1] for row in digest.spool_ids] if is_digest_item(data) else []
+        with self.lock:
+            opened = self._begin()
+            spool_id = self.last_id = self.db.execute(
+                'INSERT INTO alerts (kind, payload, created) VALUES (?, ?, ?)',
+                (kind, payload, time.time())).lastrowid
+            if carried:
+                now = time.time()
+                self.db.executemany('UPDATE alerts SET delivered = ? WHERE id = ?', [(now, row) for row in carried])
+                self.delivered_count += len(carried)
+            self.added += 1
+            self._written()
+        self._schedule_flush(opened)
+        return spool_id
+
+    def delivered(self, spool_id):
+        """Mark an alert done - it will not be sent again"""
+        with self.lock:
+            opened = self._begin()
+            self.db.execute('UPDATE alerts SET delivered = ? WHERE id = ?', (time.time(), spool_id))
+            self.delivered_count += 1
+            self._written()
+        self._schedule_flush(opened)
+
+    def commit(self, spool_id=None):
+        """Make sure spool_id (default: everything written so far) is on disk"""
+        with self.lock:
+            if self.in_transaction and (spool_id is None or spool_id > self.committed_id):
+                self._commit()
+
+    flush = commit
+
+    def _begin(self):
+        """Open a transaction unless one is open - True if this opened it"""
+        if self.in_transaction:
+            return False
+        self.db.execute('BEGIN')
+        self.in_transaction = True
+        return True
+
+    def _schedule_flush(self, opened):
+        # Scheduled after self.lock is released - call_later takes the scheduler's lock and may wake the loop
+        if opened and self.scheduler is not None:
+            self.scheduler.call_later(self.flush_interval, self.flush)
+
+    def _written(self):
+        self.uncommitted += 1
+        if self.uncommitted >= self.batch_size:
+            self._commit()
+
+    def _commit(self):
+        self.db.execute('COMMIT')
+        self.in_transaction = False
+        self.uncommitted = 0
+        self.committed_id = self.last_id
+        self.commits += 1
+
+    def pending(self):
+        """[(spool_id, kind, data)] not yet delivered, oldest first"""
+        with self.lock:
+            if self.in_transaction:
+                self._commit()
+            rows = self.db.execute(
+                'SELECT id, kind, payload FROM alerts WHERE delivered IS NULL ORDER BY id').fetchall()
+        return [(spool_id, kind, decode(payload)) for spool_id, kind, payload in rows]
+
+    def purge(self, retention):
+        """Forget alerts delivered more than retention seconds ago; returns how many"""
+        with self.lock:
+            self._begin()
+            removed = self.db.execute('DELETE FROM alerts WHERE delivered IS NOT NULL AND delivered < ?',
+                                      (time.time() - retention,)).rowcount
+            self._commit()
+        return removed
+
+    def stats(self):
+        with self.lock:
+            pending = self.db.execute('SELECT COUNT(*) FROM alerts WHERE delivered IS NULL').fetchone()[0]
+            return {'added': self.added, 'delivered': self.delivered_count,
+                    'pending': pending, 'commits': self.commits}
+
+    def format_line(self):
+        stats = self.stats()
+        return (f"spool    pending={stats['pending']} added={stats['added']} "
+                f"delivered={stats['delivered']} commits={stats['commits']}")
+
+    def close(self):
+        with self.lock:
+            if self.in_transaction:
+                self._commit()
+            self.db.close()
@@ -1,18 +1,65 @@
+import asyncio
 import serial
 import time
 import threading
-from queue import Queue, Empty
+from queue import Empty
+from ingest_queue import BoundedMessageQueue, NEVER_DROP_PREFIXES, PRIORITY_PREFIXES, DROP_OLDEST
+
+# Read modes for the background thread:
+#   'chunked' - drain every available byte per read and split all complete lines
+#   'line'    - legacy readline() polling (one line per 10 ms)
+READ_MODE_CHUNKED = 'chunked'
+READ_MODE_LINE = 'line'
+
+class LineBuffer:
+    """Accumulates raw serial bytes and splits out every complete line"""
+    
+    def __init__(self, max_line_length=1024):
+        self.pending = bytearray()
+        self.max_line_length = max_line_length
+    
+    def feed(self, data):
+        """Append raw bytes and return the complete lines (stripped bytes)"""
+        pending = self.pending
+        pending += data
+        
+        end = pending.rfind(b'\n')
+        if end < 0:
+            # No terminator yet - discard runaway garbage (wrong baudrate, noise)
+            if len(pending) > self.max_line_length:
+                pending.clear()
+            return []
+        
+        chunk = bytes(pending[:end])
+        del pending[:end + 1]
+        return [line for line in (raw.strip() for raw in chunk.split(b'\n')) if line]
+    
+    def clear(self):
+        """Drop any partial line"""
+        self.pending.clear()
 
 class ArduinoReader:
-    def __init__(self, port, baudrate=9600, timeout=1):
+    def __init__(self, port, baudrate=9600, timeout=1, read_mode=READ_MODE_CHUNKED,
+                 chunk_size=4096, echo=True, queue_size=2048,
+                 never_drop_prefixes=NEVER_DROP_PREFIXES, drop_policy=DROP_OLDEST,
+                 priority_prefixes=PRIORITY_PREFIXES, raw_lines=False):
         self.port = port
         self.baudrate = baudrate
         self.timeout = timeout
         self.serial_connection = None
-        self.message_queue = Queue()
+        self.message_queue = BoundedMessageQueue(queue_size, never_drop_prefixes, drop_policy)
+        self.priority_prefixes = tuple(priority_prefixes)  # raw bytes prefixes for the fast lane
+        self.raw_lines = raw_lines  # Queue undecoded bytes for ArduinoMessageParser.parse_bytes
         self.is_connected = False
         self.is_reading = False
         self.read_thread = None
+        self.read_mode = read_mode
+        self.echo = echo  # Print every line to console for debugging
+        self.read_buffer = bytearray(chunk_size)
+        self.line_buffer = LineBuffer()
+        self.async_lines = None  # asyncio.Queue while an async iterator is active
+        self.async_loop = None
+        self.line_listeners = []  # callbacks given every raw line (e.g. SessionRecorder)
     
     def connect(self):
         """Connect to Arduino/ESP32 via serial port"""
@@ -33,6 +80,7 @@ class ArduinoReader:
             
             if self.serial_connection.is_open:
                 self.is_connected = True
+                self.line_buffer.clear()
                 print(f"✓ Successfully connected to ESP32/Arduino on {self.port}")
                 return True
             else:
@@ -46,6 +94,22 @@ class ArduinoReader:
             print(f"✗ Unexpected connection error: {e}")
             return False
     
+    def attach(self, connection, banner=(), line_buffer=None):
+        """Adopt an already open connection (e.g. from port discovery)
+        
+        Banner lines read while probing are queued first so the consumer
+        still sees STATUS:READY / BASELINE, and no ESP32 boot delay is
+        needed because the board has already announced itself.
+        """
+        self.serial_connection = connection
+        self.port = connection.port
+        self.is_connected = connection.is_open
+        self.line_buffer = line_buffer or LineBuffer()
+        for line in banner:
+            self.message_queue.put(line.encode('utf-8') if self.raw_lines else line)
+        print(f"✓ Attached to ESP32/Arduino on {self.port}")
+        return self.is_connected
+    
     def start_reading(self):
         """Start reading messages from Arduino in background thread"""
         if not self.is_connected:
@@ -57,7 +121,11 @@ class ArduinoReader:
             return True
         
         self.is_reading = True
-        self.read_thread = threading.Thread(target=self._read_loop, daemon=True)
+        if self.read_mode == READ_MODE_CHUNKED:
+            target = self._read_loop_chunked
+        else:
+            target = self._read_loop
+        self.read_thread = threading.Thread(target=target, daemon=True)
         self.read_thread.start()
         print("✓ Started reading from Arduino")
         return True
@@ -73,10 +141,13 @@ class ArduinoReader:
                     decoded_line = line.decode('utf-8', errors='ignore').strip()
                     
                     if decoded_line:
+                        self._notify_listeners(line.strip())
                         # Add to queue for processing
-                        self.message_queue.put(decoded_line)
+                        self.message_queue.put(decoded_line,
+                                               priority=line.startswith(self.priority_prefixes))
                         # Also print to console for debugging
-                        print(f"Arduino: {decoded_line}")
+                        if self.echo:
+                            print(f"Arduino: {decoded_line}")
                 
                 time.sleep(0.01)  # Small delay to prevent high CPU usage
                 
@@ -90,6 +161,166 @@ class ArduinoReader:
         
         print("Arduino reading thread stopped")
     
+    def _read_loop_chunked(self):
+        """Background thread that drains all available bytes per read
+        
+        Bytes land in a reusable buffer and every complete line is split
+        out at once, so throughput follows the baudrate instead of a sleep.
+        When nothing is waiting the read blocks (up to the serial timeout)
+        for the next byte rather than polling.
+        """
+        print("Arduino reading thread started (chunked mode)")
+        
+        view = memoryview(self.read_buffer)
+        chunk_size = len(view)
+        
+        while self.is_reading and self.is_connected:
+            try:
+                connection = self.serial_connection
+                if not connection:
+                    break
+                
+                waiting = connection.in_waiting
+                size = min(waiting, chunk_size) if waiting else 1
+                count = connection.readinto(view[:size])
+                
+                if count:
+                    received = time.monotonic_ns()
+                    for line in self.line_buffer.feed(view[:count]):
+                        self._dispatch_line(line, received)
+                
+            except serial.SerialException as e:
+                print(f"✗ Serial read error: {e}")
+                self.is_connected = False
+                break
+            except Exception as e:
+                print(f"✗ Read loop error: {e}")
+                break
+        
+        print("Arduino reading thread stopped")
+    
+    def add_line_listener(self, listener):
+        """Call listener(raw_line) for every line before it is queued"""
+        self.line_listeners.append(listener)
+    
+    def _notify_listeners(self, line):
+        for listener in self.line_listeners:
+            listener(line)
+    
+    def _decode_line(self, line):
+        """Decode one complete raw line (and echo it for debugging)"""
+        decoded_line = line.decode('utf-8', errors='ignore')
+        if self.echo:
+            print(f"Arduino: {decoded_line}")
+        return decoded_line
+    
+    def _dispatch_line(self, line, received=None):
+        """Decode one complete raw line and hand it to the consumer
+        
+        Emergency lines are recognised on the raw bytes and go down the
+        queue's priority lane, ahead of anything already buffered.
+        received is the monotonic_ns() the read returned (default: now).
+        """
+        if self.line_listeners:
+            self._notify_listeners(line)
+        priority = line.startswith(self.priority_prefixes)
+        if self.raw_lines:
+            if self.echo:
+                print(f"Arduino: {line.decode('utf-8', errors='ignore')}")
+            self.message_queue.put(line, priority=priority, received=received)
+        else:
+            self.message_queue.put(self._decode_line(line), priority=priority, received=received)
+    
+    def __aiter__(self):
+        """Support `async for line in reader`"""
+        return self.lines()
+    
+    async def lines(self):
+        """Async generator yielding decoded lines as they arrive
+        
+        On POSIX the serial file descriptor is registered with the running
+        event loop, so lines are split and yielded from the loop itself
+        with no reader thread and no polling. Ports without a file
+        descriptor (Windows COM ports) fall back to blocking chunk reads
+        in the loop's default executor. Lines already queued - the banner
+        attach() was given - come out first.
+        """
+        if not self.is_connected or not self.serial_connection:
+            print("✗ Cannot read - Arduino not connected")
+            return
+        
+        if self.is_reading:
+            raise RuntimeError("Async iteration cannot share the port with the read thread - "
+                               "call stop_reading() first")
+        
+        loop = asyncio.get_running_loop()
+        ready = asyncio.Queue()
+        self.async_loop = loop
+        self.async_lines = ready
+        for line in self.message_queue.get_many(self.message_queue.qsize(), block=False):
+            ready.put_nowait(line.decode('utf-8', errors='ignore') if isinstance(line, bytes) else line)
+        
+        try:
+            fd = self.serial_connection.fileno()
+        except (AttributeError, OSError, ValueError):
+            fd = None
+        
+        if fd is not None:
+            loop.add_reader(fd, self._on_readable)
+            print("✓ Started async reading from Arduino")
+        else:
+            pump = loop.create_task(self._executor_pump())
+        
+        try:
+            while True:
+                line = await ready.get()
+                if line is None:
+                    break
+                yield line
+        finally:
+            if fd is not None:
+                loop.remove_reader(fd)
+            else:
+                pump.cancel()
+            self.async_lines = None
+            self.async_loop = None
+    
+    def _on_readable(self):
+        """Event loop callback - drain everything the port has buffered"""
+        try:
+            connection = self.serial_connection
+            data = connection.read(connection.in_waiting or 1)
+        except serial.SerialException as e:
+            print(f"✗ Serial read error: {e}")
+            self.is_connected = False
+            self.async_lines.put_nowait(None)
+            return
+        
+        for line in self.line_buffer.feed(data):
+            self._notify_listeners(line)
+            self.async_lines.put_nowait(self._decode_line(line))
+    
+    async def _executor_pump(self):
+        """Fallback for ports without a pollable descriptor"""
+        loop = asyncio.get_running_loop()
+        while self.is_connected and self.async_lines is not None:
+            try:
+                data = await loop.run_in_executor(None, self._read_available)
+            except serial.SerialException as e:
+                print(f"✗ Serial read error: {e}")
+                self.is_connected = False
+                break
+            for line in self.line_buffer.feed(data):
+                self._notify_listeners(line)
+                self.async_lines.put_nowait(self._decode_line(line))
+        if self.async_lines is not None:
+            self.async_lines.put_nowait(None)
+    
+    def _read_available(self):
+        """Blocking read of whatever is waiting (at least one byte or timeout)"""
+        connection = self.serial_connection
+        return connection.read(connection.in_waiting or 1)
+    
     def get_message(self, timeout=1.0):
         """Get next message from Arduino (blocking with timeout)"""
         try:
@@ -97,6 +328,27 @@ class ArduinoReader:
         except Empty:
             return None
     
+    def get_messages(self, max_n=256, timeout=1.0):
+        """Get every buffered message (up to max_n), waiting up to timeout for the first
+        
+        Returns a list - empty if nothing arrived in time. Draining a
+        batch per call means the consumer keeps pace with the device
+        instead of with its own polling interval.
+        """
+        return self.message_queue.get_many(max_n, timeout=timeout)
+    
+    def get_stamped_messages(self, max_n=256, timeout=1.0):
+        """get_messages() as (received monotonic_ns, message) pairs for latency tracing"""
+        return self.message_queue.get_many_stamped(max_n, timeout=timeout)
+    
+    def wake(self):
+        """End a get_messages() call that is waiting for lines"""
+        self.message_queue.wake()
+    
+    def get_queue_stats(self):
+        """Ingestion queue counters (depth, dropped, high-water mark...)"""
+        return self.message_queue.stats()
+    
     def send_command(self, command):
         """Send command to Arduino"""
         if not self.is_connected or not self.serial_connection:
@@ -118,6 +370,13 @@ class ArduinoReader:
         self.is_reading = False
         if self.read_thread and self.read_thread.is_alive():
             self.read_thread.join(timeout=2)
+        
+        # Wake a consumer blocked in get_messages() so it sees the shutdown
+        self.message_queue.wake()
+        
+        # Wake any async iterator so `async for` ends cleanly
+        if self.async_lines is not None and self.async_loop is not None:
+            self.async_loop.call_soon_threadsafe(self.async_lines.put_nowait, None)
     
     def disconnect(self):
         """Disconnect from Arduino"""
@@ -140,6 +399,8 @@ class ArduinoReader:
             start_time = time.time()
             while time.time() - start_time < 3:
                 message = self.get_message(timeout=0.5)
+                if isinstance(message, bytes):
+                    message = message.decode('utf-8', errors='ignore')
                 if message and "STATUS:" in message:
                     print("✓ Arduino connection test passed")
                     return True
@@ -0,0 +1,88 @@
+"""
+Per-device assembly of EMERGENCY/ALERT START...END blocks
+Each open block is keyed by (device, category), holds at most max_fields
+field lines and has a deadline on a TimerWheel. A block whose END never
+arrives (board reset, dropped line) is flushed as an incomplete event
+or discarded when the deadline passes, when it overflows, or when the
+same device starts a new block of that category.
+"""
+
+from timer_wheel import TimerWheel
+
+# What to do with a block that never saw its END line
+FLUSH = 'flush'
+DISCARD = 'discard'
+
+BLOCK_TIMEOUT = 2.0       # seconds - the firmware prints a whole block in a few ms
+MAX_BLOCK_FIELDS = 32     # the largest block in protocol_spec has 9 fields
+STALE_POLICY = {'EMERGENCY': FLUSH, 'ALERT': DISCARD}  # a partial HELP alert is still worth sending
+
+class BlockAssembler:
+    def __init__(self, timeout=BLOCK_TIMEOUT, max_fields=MAX_BLOCK_FIELDS, stale_policy=None, wheel=None):
+        self.timeout = timeout
+        self.max_fields = max_fields
+        self.stale_policy = dict(STALE_POLICY, **(stale_policy or {}))
+        self.wheel = wheel if wheel is not None else TimerWheel()
+        self.blocks = {}   # (device, category) -> [event, field_count, timer]
+        self.stale = []    # (device, event) flushed since the last sweep()
+        self.stats = {'completed': 0, 'flushed': 0, 'discarded': 0, 'timed_out': 0,
+                      'restarted': 0, 'overflowed': 0}
+
+    def open(self, device, category, event):
+        """Start a block, retiring any block of the same category still open on device"""
+        key = (device, category)
+        if key in self.blocks:
+            self.stats['restarted'] += 1
+            self._retire(key)
+        self.blocks[key] = [event, 0, self.wheel.schedule(self.timeout, self._expire, key)]
+
+    def field(self, device, category):
+        """Event the next field line of an open block goes into, or None"""
+        record = self.blocks.get((device, category))
+        if record is None:
+            return None
+        if record[1] >= self.max_fields:
+            self.stats['overflowed'] += 1
+            self._retire((device, category))
+            return None
+        record[1] += 1
+        return record[0]
+
+    def close(self, device, category):
+        """Finish a block on its END line - the complete event, or None if none was open"""
+        record = self.blocks.pop((device, category), None)
+        if record is None:
+            return None
+        self.wheel.cancel(record[2])
+        self.stats['completed'] += 1
+        return record[0]
+
+    def discard_device(self, device):
+        """Drop every open block of a device (disconnected or removed)"""
+        for key in [key for key in self.blocks if key[0] == device]:
+            record = self.blocks.pop(key)
+            self.wheel.cancel(record[2])
+            self.stats['discarded'] += 1
+
+    def sweep(self, now=None):
+        """Advance the deadlines; returns [(device, incomplete event)] flushed since the last sweep"""
+        self.wheel.advance(now)
+        stale, self.stale = self.stale, []
+        return stale
+
+    def _expire(self, key):
+        self.stats['timed_out'] += 1
+        self._retire(key)
+
+    def _retire(self, key):
+        event, field_count, timer = self.blocks.pop(key)
+        self.wheel.cancel(timer)
+        if field_count and self.stale_policy.get(key[1]) == FLUSH:
+            event.incomplete = True
+            self.stale.append((key[0], event))
+            self.stats['flushed'] += 1
+        else:
+            self.stats['discarded'] += 1
+
+    def __len__(self):
+        return len(self.blocks)
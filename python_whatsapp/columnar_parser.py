@@ -0,0 +1,234 @@
+"""
+Columnar batch parser for offline analysis of recorded sessions
+Turns a buffer, log file or session recording of raw ESP32 lines into
+NumPy columns - timestamp, device, kind, level, baseline, difference -
+without a Python-level loop per line (except walking a recording's
+record headers).
+
+Every line is classified by comparing its first 24 bytes, read as three
+little-endian uint64 words, against the known prefixes. The value is the
+run of digits at the end of the line, decoded from an 8-byte tail window.
+Baselines from STATUS:/ESP32_/ALERT:BASELINE lines are carried forward;
+an ALERT:LEVEL row takes the baseline and difference printed right after
+it in the same block.
+
+Usage:
+  python columnar_parser.py session.rec [more.rec | capture.log ...]
+"""
+
+import sys
+import numpy as np
+from session_recorder import MAGIC, RECORD_HEADER, SESSION_HEADER
+
+# Row kinds - index into KINDS
+CURRENT_LEVEL, ALERT_LEVEL, SOUND_LEVEL, LEVEL, CURRENT = range(5)
+KINDS = ('current_level', 'alert_level', 'sound_level', 'level', 'current')
+
+LEVEL_PREFIXES = (
+    (b'STATUS:CURRENT_LEVEL:', CURRENT_LEVEL),
+    (b'ALERT:LEVEL:', ALERT_LEVEL),
+    (b'EMERGENCY:SOUND_LEVEL:', SOUND_LEVEL),
+    (b'EMERGENCY:TYPE:', SOUND_LEVEL),   # the firmware glues SOUND_LEVEL onto the TYPE line
+    (b'LEVEL:', LEVEL),
+    (b'CURRENT:', CURRENT),
+)
+BASELINE_PREFIXES = (b'STATUS:BASELINE:', b'ESP32_BASELINE:', b'BASELINE:', b'ALERT:BASELINE:')
+ALERT_DIFFERENCE = b'ALERT:DIFFERENCE:'
+
+PREFIX_BYTES = 24   # longest prefix above is 22
+TAIL_BYTES = 8      # up to 7 digits plus the ':' before them
+PAD = 32
+
+def _compile_prefix(prefix):
+    """(word index, mask, value) triples matching prefix against the uint64 words"""
+    checks = []
+    for index in range(0, len(prefix), 8):
+        chunk = prefix[index:index + 8]
+        value = int.from_bytes(chunk, 'little')
+        mask = (1 << (8 * len(chunk))) - 1
+        checks.append((index // 8, np.uint64(mask), np.uint64(value)))
+    return len(prefix), checks
+
+COMPILED = {prefix: _compile_prefix(prefix)
+            for prefix in [p for p, _ in LEVEL_PREFIXES] + list(BASELINE_PREFIXES) + [ALERT_DIFFERENCE]}
+
+def _unaligned_words(padded):
+    """uint64 view starting at every byte offset of padded"""
+    return np.ndarray(shape=(len(padded) - 7,), dtype='<u8', buffer=padded, strides=(1,))
+
+def _match(words, lengths, prefix):
+    length, checks = COMPILED[prefix]
+    matched = lengths >= length
+    for index, mask, value in checks:
+        matched &= (words[index] & mask) == value
+    return matched
+
+def _trailing_ints(words64, ends):
+    """Integer made of the digits ending each line, and whether there was one after a ':'"""
+    tail = words64[ends - TAIL_BYTES].view(np.uint8).reshape(-1, TAIL_BYTES)
+    digits = tail - np.uint8(48)
+    run = np.logical_and.accumulate((digits <= 9)[:, ::-1], axis=1)  # digits counted from the end
+    count = run.sum(axis=1)
+    powers = 10 ** np.arange(TAIL_BYTES, dtype=np.int64)
+    values = (np.where(run, digits[:, ::-1], 0).astype(np.int64) * powers).sum(axis=1)
+    rows = np.arange(len(ends))
+    separator = tail[rows, np.maximum(TAIL_BYTES - 1 - count, 0)] == ord(':')
+    return values, (count > 0) & (count < TAIL_BYTES) & separator
+
+def _columns(data, starts, ends, device, timestamps, initial_baseline):
+    """Columns for the lines data[starts[i]:ends[i]] (ends exclusive, no line terminators)"""
+    if not len(starts):
+        return _empty_columns()
+    padded = np.zeros(len(data) + 2 * PAD, dtype=np.uint8)
+    padded[PAD:PAD + len(data)] = np.frombuffer(data, dtype=np.uint8)
+    words64 = _unaligned_words(padded)
+    starts = starts + PAD
+    ends = ends + PAD
+    lengths = ends - starts
+    words = tuple(words64[starts + index] for index in range(0, PREFIX_BYTES, 8))
+
+    kind = np.full(len(starts), -1, dtype=np.int8)
+    for prefix, code in reversed(LEVEL_PREFIXES):
+        kind[_match(words, lengths, prefix)] = code
+    is_baseline = np.zeros(len(starts), dtype=bool)
+    for prefix in BASELINE_PREFIXES:
+        is_baseline |= _match(words, lengths, prefix)
+    is_difference = _match(words, lengths, ALERT_DIFFERENCE)
+
+    # Only lines that carry a value are decoded
+    wanted = np.flatnonzero((kind >= 0) | is_baseline | is_difference)
+    values = np.zeros(len(starts), dtype=np.int64)
+    valid = np.zeros(len(starts), dtype=bool)
+    values[wanted], valid[wanted] = _trailing_ints(words64, ends[wanted])
+
+    # Baseline in force at every line: the last valid baseline line so far
+    baseline_at = np.where(is_baseline & valid, np.arange(len(starts)), -1)
+    np.maximum.accumulate(baseline_at, out=baseline_at)
+    carried = np.where(baseline_at >= 0, values[np.maximum(baseline_at, 0)], initial_baseline)
+
+    rows = np.flatnonzero((kind >= 0) & valid)
+    level = values[rows]
+    baseline = carried[rows]
+    difference = level - baseline
+
+    # ALERT:LEVEL is followed by its own ALERT:BASELINE and ALERT:DIFFERENCE lines
+    alerts = np.flatnonzero(kind[rows] == ALERT_LEVEL)
+    for offset, flags, column in ((1, is_baseline, baseline), (2, is_difference, difference)):
+        follow = rows[alerts] + offset
+        inside = follow < len(starts)
+        hit = alerts[inside][flags[follow[inside]] & valid[follow[inside]]]
+        column[hit] = values[rows[hit] + offset]
+
+    if timestamps is None:
+        stamp = np.full(len(rows), np.nan)
+    else:
+        stamp = np.asarray(timestamps, dtype=np.float64)[rows]
+    return {
+        'timestamp': stamp,
+        'device': np.full(len(rows), device, dtype=np.int16),
+        'kind': kind[rows],
+        'level': level,
+        'baseline': baseline,
+        'difference': difference,
+    }
+
+def _empty_columns():
+    """Columns with no rows, for an empty capture"""
+    return {
+        'timestamp': np.empty(0),
+        'device': np.empty(0, dtype=np.int16),
+        'kind': np.empty(0, dtype=np.int8),
+        'level': np.empty(0, dtype=np.int64),
+        'baseline': np.empty(0, dtype=np.int64),
+        'difference': np.empty(0, dtype=np.int64),
+    }
+
+def parse_buffer(data, device=0, timestamps=None, initial_baseline=200):
+    """Columns for a buffer of raw lines separated by \\n or \\r\\n
+
+    timestamps optionally gives one epoch time per line (NaN otherwise).
+    """
+    data = bytes(data)
+    if data and not data.endswith(b'\n'):
+        data += b'\n'
+    newlines = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == 10)
+    if not len(newlines):
+        return _empty_columns()
+    starts = np.concatenate(([0], newlines[:-1] + 1)).astype(np.int64)
+    ends = newlines.astype(np.int64)
+    if len(ends):
+        carriage = np.frombuffer(data, dtype=np.uint8)[np.maximum(ends - 1, 0)] == 13
+        ends = ends - (carriage & (ends > starts))
+    return _columns(data, starts, ends, device, timestamps, initial_baseline)
+
+def parse_file(path, device=0, initial_baseline=200):
+    """Columns for a plain text capture of serial lines"""
+    with open(path, 'rb') as capture:
+        return parse_buffer(capture.read(), device, initial_baseline=initial_baseline)
+
+def parse_recording(path, device=0, initial_baseline=200):
+    """Columns for a session_recorder file, with the recorded wall-clock times"""
+    with open(path, 'rb') as session_file:
+        data = session_file.read()
+    if not data.startswith(MAGIC):
+        raise ValueError(f"{path} is not a session recording")
+
+    # Record lengths chain the offsets, so this walk is the one per-line loop
+    offsets, session_starts = [], []
+    unpack = RECORD_HEADER.unpack_from
+    header_size = RECORD_HEADER.size
+    magic_size = len(MAGIC)
+    offset, end = 0, len(data)
+    while offset + header_size <= end:
+        delta, length = unpack(data, offset)
+        if delta == 0xFFFFFFFF:  # session marker
+            if data[offset:offset + magic_size] != MAGIC:
+                raise ValueError(f"{path} is not a session recording (bad header at byte {offset})")
+            start_epoch, = SESSION_HEADER.unpack_from(data, offset + magic_size)
+            session_starts.append((len(offsets), start_epoch))
+            offset += magic_size + SESSION_HEADER.size
+            continue
+        offset += header_size
+        if offset + length > end:
+            break  # record cut short by a crash
+        offsets.append(offset)
+        offset += length
+
+    # Each line is preceded by its uint32 delta and uint16 length
+    starts = np.array(offsets, dtype=np.int64)
+    raw = np.frombuffer(data, dtype=np.uint8)
+    ends = starts + np.ndarray(shape=(len(raw) - 1,), dtype='<u2', buffer=raw, strides=(1,))[starts - 2]
+    deltas = np.ndarray(shape=(len(raw) - 3,), dtype='<u4', buffer=raw, strides=(1,))[starts - header_size]
+
+    # Deltas count from the previous record, and from the header for a session's first record
+    elapsed = deltas / 1e6
+    timestamps = np.empty(len(starts))
+    bounds = [first for first, _ in session_starts[1:]] + [len(starts)]
+    for (first, start_epoch), last in zip(session_starts, bounds):
+        timestamps[first:last] = start_epoch + np.cumsum(elapsed[first:last])
+    return _columns(data, starts, ends, device, timestamps, initial_baseline)
+
+def concat(parts):
+    """One set of columns from several parse_* results (e.g. one per device)"""
+    return {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        return
+    parts = []
+    for device, path in enumerate(sys.argv[1:]):
+        with open(path, 'rb') as source:
+            is_recording = source.read(len(MAGIC)) == MAGIC
+        parts.append(parse_recording(path, device) if is_recording else parse_file(path, device))
+    columns = concat(parts)
+
+    print(f"{len(columns['level']):,} level rows from {len(parts)} file(s)")
+    for code, name in enumerate(KINDS):
+        levels = columns['level'][columns['kind'] == code]
+        if len(levels):
+            print(f"  {name:<14} {len(levels):>10,}  min {levels.min():>5}  "
+                  f"mean {levels.mean():>8.1f}  max {levels.max():>5}")
+
+if __name__ == "__main__":
+    main()
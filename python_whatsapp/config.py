@@ -8,6 +8,75 @@ ARDUINO_PORT = 'COM5'      # CHANGE THIS: Windows: COM3-COM10 | Linux: /dev/ttyU
 BAUDRATE = 115200          # ESP32 standard baudrate (much faster than Arduino)
 SERIAL_TIMEOUT = 3         # Longer timeout for ESP32 initialization (ESP32 needs time to boot)
 
+# Ingestion queue - bounded buffer between the serial reader and the main loop
+INGEST_QUEUE_SIZE = 2048                     # lines held before the drop policy kicks in
+INGEST_DROP_POLICY = 'drop_oldest'           # 'drop_oldest' or 'drop_newest' for LEVEL/STATUS lines
+INGEST_NEVER_DROP = ('EMERGENCY:', 'ALERT:')  # always delivered, even over capacity
+INGEST_PRIORITY_PREFIXES = (b'EMERGENCY:',)   # raw prefixes drained ahead of everything else
+RAW_LINE_PARSING = True                      # queue raw bytes lines, decoded once by the consumer
+INGEST_BATCH_SIZE = 256                      # most lines the main loop drains per wakeup
+
+# Block assembly - EMERGENCY/ALERT START...END blocks whose END never arrives
+# (board reset, dropped line) are closed after BLOCK_TIMEOUT: partial emergencies
+# are still dispatched, partial alerts are dropped
+BLOCK_TIMEOUT = 2.0                          # seconds an open block may wait for its END line
+BLOCK_MAX_FIELDS = 32                        # field lines accepted per block before it is closed
+
+# Pipeline - the loop reads and parses; parsed events go to a detector stage and
+# emails to a notifier stage, each with its own bounded queue and worker threads,
+# so a slow SMTP login never holds up reading and parsing
+DETECT_WORKERS = 1                           # keep 1: handlers update the counters in line order
+DETECT_QUEUE_SIZE = 1024                     # parsed events waiting for the detector
+NOTIFY_WORKERS = 2                           # emails sent in parallel
+NOTIFY_QUEUE_SIZE = 256                      # pending emails - when full, the least urgent queued one makes room
+
+# Notification outbox (outbox.py) - emails go out emergency first, then anomaly,
+# then reports; a failed send is retried with exponential backoff until its deadline
+OUTBOX_RETRIES = 8                           # attempts after the first one
+OUTBOX_BACKOFF = 2.0                         # seconds before the first retry, doubled after each
+OUTBOX_MAX_BACKOFF = 60.0                    # longest wait between attempts
+OUTBOX_DEADLINES = {                         # seconds an email may stay undelivered before it is given up
+    'emergency': 600,
+    'anomaly': 300,
+    'report': 3600,
+}
+
+# Alert spool (alert_spool.py) - emergency/anomaly emails are written to SQLite
+# before they are sent and marked delivered once accepted; alerts a crash or an
+# SMTP outage left undelivered are sent at the next start
+ALERT_SPOOL_FILE = 'logs/alert_spool.db'     # None to keep alerts in memory only
+SPOOL_BATCH_SIZE = 64                        # writes per commit while alerts pour in
+SPOOL_FLUSH_INTERVAL = 1.0                   # seconds a batch may stay uncommitted
+SPOOL_RETENTION = 7 * 86400                  # seconds delivered alerts stay in the spool
+
+# Periodic tasks - timers on the main loop's scheduler (scheduler.py), which
+# sleeps until the next line or the next due task instead of polling
+STATS_INTERVAL = 30                          # seconds between one-line stats (only after new messages)
+STATUS_INTERVAL = 60                         # seconds between full status printouts
+DAILY_REPORT_INTERVAL = 86400                # seconds between status report emails (24 hours)
+HEARTBEAT_TIMEOUT = 400                      # seconds without any line before warning (firmware STATUS every 180s)
+
+# Port discovery - every candidate is probed at the same time at startup and the
+# ESP32 is recognised by its STATUS:DEVICE_TYPE:ESP32 / STATUS:READY banner
+ALTERNATIVE_PORTS = [
+    'COM3', 'COM4', 'COM5', 'COM6', 'COM7', 'COM8',  # Windows
+    '/dev/ttyUSB0', '/dev/ttyUSB1', '/dev/ttyACM0',  # Linux
+    '/dev/cu.usbserial-0001', '/dev/cu.usbmodem14101'  # Mac
+]
+DISCOVERY_BANNER_TIMEOUT = 6   # seconds (boot + 3.6s calibration before STATUS:READY)
+
+# Session recording - every raw serial line with its timing, for replaying
+# incidents offline (python main.py replay <file> [speed])
+SESSION_RECORD_FILE = None      # e.g. 'logs/esp32_session.rec' to record every run
+REPLAY_SEND_EMAILS = False      # replays only print the emails they would send
+
+# Multi-device hub (python main.py hub) - one selector loop for every port
+# Map each serial port to the device ID used in alerts (Linux/Mac only)
+DEVICE_PORTS = {
+    # '/dev/ttyUSB0': 'ESP32_SOUND_001',
+    # '/dev/ttyUSB1': 'ESP32_SOUND_002',
+}
+
 # Email Settings
 SMTP_SERVER = 'smtp.gmail.com'
 SMTP_PORT = 587
@@ -16,15 +85,32 @@ EMAIL_PASSWORD = 'xxxxxxxxxxxxx'     # CHANGE THIS: Your app password
 EMERGENCY_EMAIL = 'xxxxxxxxxxxxxxxxxx'    # CHANGE THIS: Emergency recipient
 CC_EMAILS = []                              # Optional: Additional recipients
 
+# SMTP sessions stay connected and logged in between emails (smtp_pool.py), so an
+# alert skips the connect/STARTTLS/login handshake; dropped sessions reconnect
+SMTP_POOL_SIZE = 2                          # warm sessions, one per notifier worker
+SMTP_KEEPALIVE = 60                         # seconds between NOOPs on idle sessions
+SMTP_TIMEOUT = 30                           # seconds before a stalled SMTP command fails
+
 # Alternative Email Providers:
 # Outlook: smtp.office365.com, port 587
 # Yahoo: smtp.mail.yahoo.com, port 587
 
 # ESP32 Detection Settings (Optimized for 12-bit ADC: 0-4095 range)
-EMERGENCY_COOLDOWN = 20        # seconds between emergency emails (ESP32 processes faster)
-ANOMALY_COOLDOWN = 180         # seconds between anomaly emails (3 minutes)
+EMERGENCY_COOLDOWN = 20        # seconds between emergency emails per device/location (ESP32 processes faster)
+ANOMALY_COOLDOWN = 180         # seconds between anomaly emails per device/location (3 minutes)
 HIGH_SEVERITY_ONLY = True      # Only send email for HIGH/CRITICAL anomalies
 
+# Email rate limits (rate_limiter.py) - a token bucket per (device, location, alert type):
+# BURST emails may go out back to back, then one per COOLDOWN seconds; alerts over the
+# limit go into that key's digest, so a noisy sensor never holds back the others
+EMERGENCY_BURST = 1            # emergency emails a device/location may send back to back
+ANOMALY_BURST = 1              # anomaly emails a device/location may send back to back
+EMAIL_RATE_LIMITS = {
+    'emergency': (EMERGENCY_BURST, EMERGENCY_COOLDOWN),
+    'anomaly': (ANOMALY_BURST, ANOMALY_COOLDOWN),
+}
+RATE_LIMIT_MAX_KEYS = 1024     # buckets kept - the least recently used are evicted beyond this
+
 # ESP32 Specific Settings
 ESP32_MODE = True                           # Enable ESP32 optimizations
 ESP32_ADC_RESOLUTION = 12                   # ESP32 12-bit ADC
@@ -33,7 +119,7 @@ ESP32_BASELINE_TYPICAL = 200                # Typical ESP32 baseline noise level
 ESP32_THRESHOLD_MULTIPLIER = 1.5            # ESP32 threshold adjustment
 ESP32_INIT_DELAY = 3                        # ESP32 initialization delay (seconds)
 
-# Detection Patterns (ESP32 optimized)
+# Detection Patterns (ESP32 optimized) - compiled into one KeywordMatcher, any language
 HELP_KEYWORDS = [
     'HELP_DETECTED',
     'VOICE_HELP',
@@ -120,6 +206,31 @@ Lower severity events are logged locally for review.
 Powered by ESP32 Sound Detector System
 """
 
+# Digest of the alerts held back by a rate limit - sent once the device may email again
+DIGEST_SUBJECT = "📋 {title} Digest - {count} alert(s) during cooldown - {location}"
+DIGEST_TEMPLATE = """📋 {title} DIGEST - ALERTS HELD BACK DURING COOLDOWN
+
+{count} {kind} alert(s) arrived during the {cooldown}s email cooldown.
+Instead of one email each, they are summarised here per device.
+
+Window: {first} to {last}
+
+{devices}
+
+Further {kind} alerts in the next {cooldown}s go into the next digest;
+after a quiet cooldown, alerts are emailed one by one again.
+
+---
+Powered by ESP32 Sound Detector System
+"""
+DIGEST_DEVICE_TEMPLATE = """Device: {device_id} (ESP32) - {location}
+- Alerts: {count}
+- Peak Sound Level: {peak_level}/4095
+- First: {first}
+- Last: {last}
+- {breakdown_label}: {breakdown}
+"""
+
 # Startup notification template
 STARTUP_SUBJECT = "✅ ESP32 Sound Detector Started - {location}"
 STARTUP_TEMPLATE = """✅ ESP32 SOUND DETECTOR SYSTEM STARTED
@@ -222,6 +333,9 @@ Detection Settings:
 - High Severity Only: {high_severity_only}
 - HELP Detection: Enabled
 
+Alert Latency (per stage, serial line to email accepted):
+{latency}
+
 Device Information:
 - Location: {location}
 - Device ID: {device_id}
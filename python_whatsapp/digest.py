@@ -0,0 +1,136 @@
+"""
+Digests of alerts held back by the email rate limit
+An emergency or anomaly that arrives while its (device, location, type)
+rate limit is used up is not thrown away: it is folded into a Digest for
+that key (count, peak level, first/last time and a severity /
+emergency-type breakdown). Once the key may send again EmailSender sends
+one digest email for everything collected, so email volume stays flat
+under load and nothing is lost.
+
+The send methods return HELD_BACK for such an alert: it is neither sent
+(True) nor failed (False, retried) nor declined (None). Its spool row
+stays pending and the digest records the row id, so the alert survives a
+crash during the cooldown; AlertSpool marks the rows delivered when the
+digest carrying them is spooled in their place.
+"""
+
+import threading
+from datetime import datetime
+from events import event_time
+from rate_limiter import alert_key
+
+class HeldBack:
+    """Result of an alert taken over by a digest - false, so `if sent:` reads as not sent"""
+
+    def __bool__(self):
+        return False
+
+    def __repr__(self):
+        return 'HELD_BACK'
+
+HELD_BACK = HeldBack()
+
+class Digest:
+    """Alerts of one kind from one device, summarised"""
+
+    __slots__ = ('kind', 'device_id', 'location', 'count', 'peak_level', 'first', 'last', 'breakdown',
+                 'spool_ids')
+
+    def __init__(self, kind, device_id):
+        self.kind = kind
+        self.device_id = device_id
+        self.location = 'Unknown Location'
+        self.count = 0
+        self.peak_level = None
+        self.first = None
+        self.last = None
+        self.breakdown = {}    # severity (anomalies) or emergency type -> count
+        self.spool_ids = []    # spool rows of the alerts folded in, marked delivered by this digest
+
+    def add(self, event, spool_id=None):
+        when = event_time(event)
+        self.count += 1
+        self.location = event.get('location', self.location)
+        level = level_of(event)
+        if level is not None and (self.peak_level is None or level > self.peak_level):
+            self.peak_level = level
+        if self.first is None or when < self.first:
+            self.first = when
+        if self.last is None or when > self.last:
+            self.last = when
+        category = str(event.get('severity' if self.kind == 'anomaly' else 'emergency_type', 'UNKNOWN')).upper()
+        self.breakdown[category] = self.breakdown.get(category, 0) + 1
+        if spool_id is not None:
+            self.spool_ids.append(spool_id)
+
+    def breakdown_text(self):
+        """Most frequent first, e.g. 'HIGH x3, CRITICAL x1'"""
+        ordered = sorted(self.breakdown.items(), key=lambda item: (-item[1], item[0]))
+        return ', '.join(f"{name} x{count}" for name, count in ordered)
+
+    def to_dict(self):
+        """Plain fields for the alert spool - the source rows are not kept, the digest replaces them"""
+        return {'kind': self.kind, 'device_id': self.device_id, 'location': self.location,
+                'count': self.count, 'peak_level': self.peak_level, 'first': self.first.isoformat(),
+                'last': self.last.isoformat(), 'breakdown': self.breakdown}
+
+def digest_from_dict(fields):
+    """Rebuild a spooled Digest"""
+    digest = Digest(fields['kind'], fields['device_id'])
+    digest.location = fields['location']
+    digest.count = fields['count']
+    digest.peak_level = fields['peak_level']
+    digest.first = datetime.fromisoformat(fields['first'])
+    digest.last = datetime.fromisoformat(fields['last'])
+    digest.breakdown = dict(fields['breakdown'])
+    return digest
+
+def level_of(event):
+    """Sound level of an alert as an int, None if it carries none"""
+    level = event.get('sound_level', event.get('level'))
+    try:
+        return int(level)
+    except (TypeError, ValueError):
+        return None
+
+class DigestBuffer:
+    """Digests per rate-limit key (device, location, kind) - filled by notifier workers"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.digests = {}
+
+    def add(self, kind, event, spool_id=None):
+        """Fold event (and its spool row, if any) into its key's digest - returns the key"""
+        key = alert_key(kind, event)
+        with self.lock:
+            digest = self.digests.get(key)
+            if digest is None:
+                digest = self.digests[key] = Digest(kind, key[0])
+            digest.add(event, spool_id)
+        return key
+
+    def pop(self, key):
+        """Remove and return the digest of one key, None if nothing is held"""
+        with self.lock:
+            return self.digests.pop(key, None)
+
+    def take(self, kind):
+        """Remove and return every digest of kind, by device"""
+        with self.lock:
+            keys = sorted(key for key in self.digests if key[2] == kind)
+            return [self.digests.pop(key) for key in keys]
+
+    def kinds(self):
+        with self.lock:
+            return sorted({key[2] for key in self.digests})
+
+    def held(self, kind=None):
+        """Alerts waiting in digests (of kind, or all)"""
+        with self.lock:
+            return sum(digest.count for key, digest in self.digests.items()
+                       if kind is None or key[2] == kind)
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.digests
@@ -1,10 +1,17 @@
 import smtplib
+import threading
 import time
 import os
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from datetime import datetime
 from config import *
+from events import event_time
+from scheduler import Scheduler
+from latency import SMTP_CONNECT, SMTP_ACCEPTED
+from smtp_pool import SMTPPool
+from digest import DigestBuffer, HELD_BACK
+from rate_limiter import RateLimiter, alert_key
 
 # Try to import desktop notifications
 try:
@@ -15,21 +22,45 @@ except ImportError:
     print("Warning: plyer not available - desktop notifications disabled")
 
 class EmailSender:
-    def __init__(self):
+    def __init__(self, dry_run=False, scheduler=None, latency=None, smtp_pool=None, queue_digest=None,
+                 limiter=None):
+        self.dry_run = dry_run  # print instead of sending (session replays)
+        self.latency = latency  # LatencyTracker stamped with SMTP connect/accepted, optional
+        # Digests are due on the main loop's scheduler once their key may send again
+        self.scheduler = scheduler if scheduler is not None else Scheduler()
+        # Token bucket per (device, location, type) - a noisy sensor only uses up its own emails
+        self.limiter = limiter if limiter is not None else RateLimiter(
+            EMAIL_RATE_LIMITS, RATE_LIMIT_MAX_KEYS, clock=self.scheduler.clock)
+        # Alerts held back by the rate limit are summarised per key and sent as one digest;
+        # queue_digest(kind, digests) hands that email to the notifier, default: send right away
+        self.digests = DigestBuffer()
+        self.digest_lock = threading.Lock()
+        self.digests_due = set()  # keys with a digest timer on the scheduler
+        self.queue_digest = queue_digest if queue_digest is not None else self.send_digest_email
+        self.digest_count = 0
         self.last_emergency_time = 0
         self.last_anomaly_time = 0
         self.emergency_count = 0
         self.anomaly_count = 0
-        self.smtp_connection = None
+        # Logged-in SMTP sessions reused across emails instead of a handshake per message
+        self.smtp_pool = smtp_pool if smtp_pool is not None else SMTPPool(
+            SMTP_SERVER, SMTP_PORT, EMAIL_USERNAME, EMAIL_PASSWORD,
+            size=SMTP_POOL_SIZE, timeout=SMTP_TIMEOUT)
+        # Notifier workers send in parallel; the locks cover only the counters and timestamps
+        self.emergency_lock = threading.Lock()
+        self.anomaly_lock = threading.Lock()
+        self.log_lock = threading.Lock()  # one detection log entry at a time
     
     def test_connection(self):
         """Test email server connection"""
+        if self.dry_run:
+            print("✓ Email dry run - nothing will be sent")
+            return True
         try:
             print("Testing email server connection...")
-            server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-            server.starttls()
-            server.login(EMAIL_USERNAME, EMAIL_PASSWORD)
-            server.quit()
+            # The session stays logged in, so the first alert skips the handshake
+            with self.smtp_pool.session():
+                pass
             print("✓ Email server connection successful!")
             return True
         except smtplib.SMTPAuthenticationError:
@@ -45,14 +76,20 @@ class EmailSender:
             print(f"✗ Email connection error: {e}")
             return False
     
-    def send_emergency_email(self, emergency_data):
-        """Send emergency email alert"""
+    def send_emergency_email(self, emergency_data, spool_id=None):
+        """Send emergency email alert - False if sending failed, HELD_BACK if held back by the rate limit
+
+        spool_id is the alert's AlertSpool row; the digest that takes over a held-back alert carries it.
+        """
         current_time = time.time()
         
-        # Check cooldown period
-        if current_time - self.last_emergency_time < EMERGENCY_COOLDOWN:
-            print(f"Emergency cooldown active ({EMERGENCY_COOLDOWN - (current_time - self.last_emergency_time):.0f}s remaining)")
-            return False
+        # Check this device's rate limit
+        key = alert_key('emergency', emergency_data)
+        remaining = self.limiter.acquire(key)
+        if remaining:
+            self._hold_back(key, emergency_data, remaining, spool_id)
+            print(f"Emergency cooldown active for {key[0]} ({remaining:.0f}s remaining) - added to the digest")
+            return HELD_BACK
         
         # Format the emergency email
         subject = EMERGENCY_SUBJECT.format(
@@ -61,12 +98,15 @@ class EmailSender:
         message = self._format_emergency_message(emergency_data)
         
         # Send email
-        success = self._send_email(subject, message, is_emergency=True)
+        success = self._send_email(subject, message, is_emergency=True,
+                                   trace=getattr(emergency_data, 'trace', None))
         
         if success:
-            self.last_emergency_time = current_time
-            self.emergency_count += 1
-            print(f"🚨 Emergency Email #{self.emergency_count} sent successfully!")
+            with self.emergency_lock:
+                self.last_emergency_time = current_time
+                self.emergency_count += 1
+                count = self.emergency_count
+            print(f"🚨 Emergency Email #{count} sent successfully!")
             
             # Send desktop notification
             self._send_desktop_notification(
@@ -76,24 +116,31 @@ class EmailSender:
             
             # Log the emergency
             self._log_message("EMERGENCY", emergency_data, message)
+        else:
+            # Not sent - the retry must not find this key's token used up
+            self.limiter.refund(key)
         
         return success
     
-    def send_anomaly_email(self, anomaly_data):
-        """Send anomaly email alert (only for high severity)"""
+    def send_anomaly_email(self, anomaly_data, spool_id=None):
+        """Send anomaly email alert (only for high severity) - False if sending failed, HELD_BACK if
+        held back by the rate limit, None if below the severity threshold"""
         severity = anomaly_data.get('severity', '').upper()
         
         # Only send email for high severity anomalies
         if HIGH_SEVERITY_ONLY and severity not in ['HIGH', 'CRITICAL']:
             print(f"Anomaly severity '{severity}' below threshold for email")
-            return False
+            return None
         
         current_time = time.time()
         
-        # Check cooldown period
-        if current_time - self.last_anomaly_time < ANOMALY_COOLDOWN:
-            print(f"Anomaly cooldown active ({ANOMALY_COOLDOWN - (current_time - self.last_anomaly_time):.0f}s remaining)")
-            return False
+        # Check this device's rate limit
+        key = alert_key('anomaly', anomaly_data)
+        remaining = self.limiter.acquire(key)
+        if remaining:
+            self._hold_back(key, anomaly_data, remaining, spool_id)
+            print(f"Anomaly cooldown active for {key[0]} ({remaining:.0f}s remaining) - added to the digest")
+            return HELD_BACK
         
         # Format the anomaly email
         subject = ANOMALY_SUBJECT.format(
@@ -103,12 +150,15 @@ class EmailSender:
         message = self._format_anomaly_message(anomaly_data)
         
         # Send email
-        success = self._send_email(subject, message, is_emergency=False)
+        success = self._send_email(subject, message, is_emergency=False,
+                                   trace=getattr(anomaly_data, 'trace', None))
         
         if success:
-            self.last_anomaly_time = current_time
-            self.anomaly_count += 1
-            print(f"⚠️ Anomaly Email #{self.anomaly_count} sent successfully!")
+            with self.anomaly_lock:
+                self.last_anomaly_time = current_time
+                self.anomaly_count += 1
+                count = self.anomaly_count
+            print(f"⚠️ Anomaly Email #{count} sent successfully!")
             
             # Send desktop notification
             self._send_desktop_notification(
@@ -118,6 +168,91 @@ class EmailSender:
             
             # Log the anomaly
             self._log_message("ANOMALY", anomaly_data, message)
+        else:
+            self.limiter.refund(key)
+        
+        return success
+    
+    def _hold_back(self, key, data, remaining, spool_id=None):
+        """Add a rate-limited alert to its key's digest, due once the key may send again"""
+        with self.digest_lock:
+            self.digests.add(key[2], data, spool_id)
+            due = key not in self.digests_due
+            self.digests_due.add(key)
+        # Scheduled after digest_lock is released - call_later takes the scheduler's lock and may wake the loop
+        if due:
+            self.scheduler.call_later(remaining, self._digest_due, key)
+    
+    def _digest_due(self, key):
+        with self.digest_lock:
+            if key not in self.digests:  # flushed at shutdown
+                self.digests_due.discard(key)
+                return
+            # The digest uses a token too, so a steady stream of alerts costs one email per cooldown
+            remaining = self.limiter.acquire(key)
+            if not remaining:
+                digest = self.digests.pop(key)
+                self.digests_due.discard(key)
+        if remaining:
+            # A worker sent an email of this key meanwhile - wait for the next token
+            self.scheduler.call_later(remaining, self._digest_due, key)
+            return
+        self.queue_digest(key[2], [digest])
+    
+    def _cooldown_seconds(self, kind):
+        return self.limiter.interval(kind)
+    
+    def flush_digests(self):
+        """Hand over every digest still collecting (shutdown) - returns how many alerts they hold"""
+        with self.digest_lock:
+            held = self.digests.held()
+            flushed = [(kind, self.digests.take(kind)) for kind in self.digests.kinds()]
+            # Their timers find nothing left and stop
+            self.digests_due.clear()
+        for kind, digests in flushed:
+            self.queue_digest(kind, digests)
+        return held
+    
+    def send_digest_email(self, kind, digests):
+        """Send one email summarising the alerts of kind held back by the rate limit"""
+        count = sum(digest.count for digest in digests)
+        first = min(digest.first for digest in digests)
+        last = max(digest.last for digest in digests)
+        locations = sorted({digest.location for digest in digests})
+        title = kind.capitalize()
+        subject = DIGEST_SUBJECT.format(
+            title=title,
+            count=count,
+            location=locations[0] if len(locations) == 1 else 'Multiple Locations'
+        )
+        devices = '\n'.join(DIGEST_DEVICE_TEMPLATE.format(
+            device_id=digest.device_id,
+            location=digest.location,
+            count=digest.count,
+            peak_level=digest.peak_level if digest.peak_level is not None else 'Unknown',
+            first=digest.first.strftime('%Y-%m-%d %H:%M:%S'),
+            last=digest.last.strftime('%Y-%m-%d %H:%M:%S'),
+            breakdown_label='Severity' if kind == 'anomaly' else 'Type',
+            breakdown=digest.breakdown_text()
+        ) for digest in digests)
+        message = DIGEST_TEMPLATE.format(
+            title=title.upper(),
+            count=count,
+            kind=kind,
+            cooldown=self._cooldown_seconds(kind),
+            first=first.strftime('%Y-%m-%d %H:%M:%S'),
+            last=last.strftime('%Y-%m-%d %H:%M:%S'),
+            devices=devices
+        )
+        
+        success = self._send_email(subject, message, is_emergency=(kind == 'emergency'))
+        
+        if success:
+            with self.digest_lock:
+                self.digest_count += 1
+                number = self.digest_count
+            print(f"📋 {title} digest #{number} sent ({count} alert(s))")
+            self._log_message(f"{kind.upper()} DIGEST", {'alerts': count, 'devices': len(digests)}, message)
         
         return success
     
@@ -125,10 +260,11 @@ class EmailSender:
         """Format emergency message using template"""
         return EMERGENCY_TEMPLATE.format(
             location=data.get('location', 'Unknown Location'),
-            timestamp=datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            sound_level=data.get('sound_level', 'Unknown'),
-            device_id=data.get('emergency_id', 'SOUND_001'),
-            uptime=data.get('uptime', 'Unknown')
+            timestamp=event_time(data).strftime('%Y-%m-%d %H:%M:%S'),
+            sound_level=data.get('sound_level', data.get('level', 'Unknown')),
+            device_id=data.get('device_id', data.get('emergency_id', 'SOUND_001')),
+            uptime=data.get('uptime', 'Unknown'),
+            contact=data.get('contact', data.get('emergency_contact', 'N/A'))
         )
     
     def _format_anomaly_message(self, data):
@@ -139,13 +275,13 @@ class EmailSender:
             level=data.get('level', 'Unknown'),
             baseline=data.get('baseline', 'Unknown'),
             difference=data.get('difference', 'Unknown'),
-            timestamp=datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            device_id=data.get('alert_id', 'SOUND_001'),
+            timestamp=event_time(data).strftime('%Y-%m-%d %H:%M:%S'),
+            device_id=data.get('device_id', data.get('alert_id', 'SOUND_001')),
             uptime=data.get('uptime', 'Unknown')
         )
     
-    def _send_email(self, subject, message, is_emergency=False):
-        """Send email using SMTP"""
+    def _send_email(self, subject, message, is_emergency=False, trace=None):
+        """Send email using SMTP - trace (an event's latency stamps) gets the SMTP stamps"""
         try:
             # Create message
             msg = MIMEMultipart()
@@ -169,15 +305,19 @@ class EmailSender:
             # Attach message
             msg.attach(MIMEText(message, 'plain'))
             
+            if self.dry_run:
+                print(f"[dry run] Would email {recipients}: {subject}")
+                self._stamp(trace, SMTP_CONNECT)
+                self._stamp(trace, SMTP_ACCEPTED)
+                return True
+            
             # Send email
             print(f"Sending email to {recipients}...")
-            server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-            server.starttls()
-            server.login(EMAIL_USERNAME, EMAIL_PASSWORD)
-            
             text = msg.as_string()
-            server.sendmail(EMAIL_USERNAME, recipients, text)
-            server.quit()
+            with self.smtp_pool.session() as session:
+                self._stamp(trace, SMTP_CONNECT)
+                session.sendmail(EMAIL_USERNAME, recipients, text)
+                self._stamp(trace, SMTP_ACCEPTED)
             
             print(f"✓ Email sent successfully to {len(recipients)} recipient(s)")
             return True
@@ -193,6 +333,19 @@ class EmailSender:
             print(f"✗ Email send error: {e}")
             return False
     
+    def keepalive(self):
+        """NOOP the idle SMTP sessions so the next alert finds them logged in"""
+        if not self.dry_run:
+            self.smtp_pool.keepalive()
+    
+    def close(self):
+        """Log out of every pooled SMTP session"""
+        self.smtp_pool.close()
+    
+    def _stamp(self, trace, name):
+        if self.latency is not None:
+            self.latency.stamp(trace, name)
+    
     def _send_desktop_notification(self, title, message):
         """Send desktop notification"""
         if not DESKTOP_NOTIFICATIONS or not NOTIFICATIONS_AVAILABLE:
@@ -220,7 +373,7 @@ class EmailSender:
             
             timestamp = datetime.now().isoformat()
             
-            with open(LOG_FILE, 'a', encoding='utf-8') as f:
+            with self.log_lock, open(LOG_FILE, 'a', encoding='utf-8') as f:
                 f.write(f"\n{'='*50}\n")
                 f.write(f"{timestamp} - {msg_type} EMAIL SENT\n")
                 f.write(f"Recipients: {EMERGENCY_EMAIL}")
@@ -274,6 +427,7 @@ This is an automated test message from your Arduino Sound Detector.
         return {
             'emergency_count': self.emergency_count,
             'anomaly_count': self.anomaly_count,
+            'digest_count': self.digest_count,
             'last_emergency': self.last_emergency_time,
             'last_anomaly': self.last_anomaly_time
         }
@@ -300,6 +454,7 @@ Statistics:
 Email Breakdown:
 - Emergency Emails: {self.emergency_count}
 - Anomaly Emails: {self.anomaly_count}
+- Digest Emails: {self.digest_count}
 
 Current Settings:
 - Emergency Cooldown: {EMERGENCY_COOLDOWN}s
@@ -0,0 +1,536 @@
+"""
+Pseudo-terminal ESP32 simulator for load and soak testing (Linux/Mac only)
+Each simulated board owns a pty pair and prints exactly what
+arduino_code/sound_detector/sound_detector.ino prints - including the
+Serial.print() calls with no newline that glue two protocol lines together
+(STATUS:DEVICE_TYPE:ESP32STATUS:CPU_FREQ:240,
+EMERGENCY:TYPE:VOICE_HELPEMERGENCY:SOUND_LEVEL:2875).
+ArduinoReader, port discovery and SerialHub open the slave side like a
+real serial port, and the simulator answers STATUS/RESET/BASELINE/
+SENSITIVITY:n/TEST/TESTHELP commands written to it.
+
+A real board is reset by the DTR toggle when the port is opened, so the
+host always sees the boot banner. pyserial flushes the input queue on
+open; the simulator watches for that flush (pty packet mode) and boots
+the board then, and again on every later open.
+
+Usage:
+  python esp32_simulator.py --devices 4 --alert-rate 50 --help-rate 0.2
+"""
+
+import argparse
+import fcntl
+import heapq
+import os
+import random
+import selectors
+import struct
+import sys
+import termios
+import threading
+import time
+import tty
+from arduino_reader import LineBuffer
+from protocol_spec import format_block
+
+# Values from arduino_code/sound_detector/config.h and sound_detector.ino
+DEVICE_LOCATION = "Home Office"
+EMERGENCY_CONTACT = "+91 0000000000"
+DETECTION_SENSITIVITY = 150
+ESP32_CPU_FREQ = 240
+CALIBRATION_SAMPLES = 60
+STATUS_INTERVAL = 180           # seconds between STATUS:UPDATE blocks
+
+# Device output beyond this many unread bytes pauses event generation,
+# like USB CDC backpressure, instead of growing without limit
+OUTPUT_HIGH_WATER = 64 * 1024
+
+class SerialOut:
+    """Collects Serial.print/println output exactly as the Arduino core formats it"""
+
+    def __init__(self):
+        self.steps = []   # (delay_before_seconds, bytes)
+        self.parts = []
+        self.delay = 0.0
+
+    def print(self, value):
+        self.parts.append(str(value).encode('utf-8'))
+
+    def println(self, value=''):
+        self.parts.append(str(value).encode('utf-8') + b'\r\n')
+
+    def write(self, data):
+        """Serial.write() of already formatted bytes"""
+        self.parts.append(data)
+
+    def wait(self, seconds):
+        """delay() in the firmware - ends the current output step"""
+        self._close_step()
+        self.delay += seconds
+
+    def _close_step(self):
+        if self.parts:
+            self.steps.append((self.delay, b''.join(self.parts)))
+            self.parts = []
+            self.delay = 0.0
+
+    def take(self):
+        """Return and reset the collected (delay, bytes) steps"""
+        self._close_step()
+        steps, self.steps = self.steps, []
+        if self.delay:
+            steps.append((self.delay, b''))  # trailing delay keeps the board busy
+            self.delay = 0.0
+        return steps
+
+class SimulatedESP32:
+    """The sound_detector.ino state machine, minus the microphone
+
+    Each firmware routine returns (delay, bytes) steps; delays are the
+    firmware's delay() calls (LED flashing, calibration sampling).
+    """
+
+    def __init__(self, device_id='ESP32_SOUND_001', location=DEVICE_LOCATION,
+                 contact=EMERGENCY_CONTACT, rng=None):
+        self.device_id = device_id
+        self.location = location
+        self.contact = contact
+        self.rng = rng or random.Random()
+        self.serial = SerialOut()
+        self.boot_time = time.monotonic()
+        self.system_start_time = 0
+        self.baseline_noise = 0
+        self.sound_threshold = 600
+        self.anomaly_count = 0
+        self.help_call_count = 0
+
+    def millis(self):
+        return int((time.monotonic() - self.boot_time) * 1000)
+
+    def uptime_string(self):
+        seconds = (self.millis() - self.system_start_time) // 1000
+        minutes = seconds // 60
+        hours = minutes // 60
+        return f"{hours}h:{minutes % 60}m:{seconds % 60}s"
+
+    def analog_read(self):
+        return max(0, int(self.rng.gauss(self.baseline_noise or 200, 25)))
+
+    def setup(self):
+        serial = self.serial
+        serial.println("=== ESP32 SOUND ANOMALY DETECTOR WITH HELP COMMAND ===")
+        serial.println("STATUS:STARTING")
+        serial.print("STATUS:DEVICE_TYPE:ESP32")
+        serial.print("STATUS:CPU_FREQ:")
+        serial.println(ESP32_CPU_FREQ)
+        serial.wait(5 * 0.3)  # startup LED flashes
+        self._calibrate_baseline()
+        self.system_start_time = self.millis()
+        serial.println("STATUS:READY")
+        serial.print("BASELINE:")
+        serial.println(self.baseline_noise)
+        serial.print("THRESHOLD:")
+        serial.println(self.sound_threshold)
+        serial.println("HELP_DETECTION:ENABLED")
+        serial.println("=== ESP32 MONITORING STARTED ===")
+        serial.println("Say 'HELP' for emergency assistance")
+        serial.wait(1.0)
+        return serial.take()
+
+    def _calibrate_baseline(self):
+        serial = self.serial
+        serial.println("CALIBRATION:START")
+        serial.println("Please remain quiet during ESP32 calibration...")
+        total = 0
+        for i in range(CALIBRATION_SAMPLES):
+            total += int(self.rng.gauss(200, 20))
+            if i % 8 == 0:
+                serial.print("CALIBRATION:PROGRESS:")
+                serial.println((i * 100) // CALIBRATION_SAMPLES)
+            serial.wait(0.06)
+        self.baseline_noise = total // CALIBRATION_SAMPLES
+        self.sound_threshold = self.baseline_noise + DETECTION_SENSITIVITY
+        serial.println("CALIBRATION:COMPLETE")
+        serial.println("ESP32 calibrated - You can now say 'HELP' for emergency assistance")
+        serial.print("ESP32_BASELINE:")
+        serial.println(self.baseline_noise)
+        serial.print("ESP32_THRESHOLD:")
+        serial.println(self.sound_threshold)
+
+    def handle_help_command(self, sound_level=None):
+        serial = self.serial
+        self.help_call_count += 1
+        serial.wait(10 * 0.1)  # emergency LED pattern
+        serial.println("EMERGENCY:HELP_DETECTED")
+        serial.write(format_block('EMERGENCY', {
+            'ID': self.help_call_count,
+            'TIMESTAMP': self.millis(),
+            'TYPE': "VOICE_HELP",
+            'SOUND_LEVEL': sound_level if sound_level is not None else self.rng.randint(1500, 4000),
+            'LOCATION': self.location,
+            'UPTIME': self.uptime_string(),
+            'MESSAGE': "Person needs help at location",
+            'ACTION_REQUIRED': "SEND_WHATSAPP",
+            'CONTACT': self.contact,
+        }))
+        serial.wait(3.0)
+        serial.println("HELP command detected - Emergency alert sent!")
+        return serial.take()
+
+    def handle_anomaly_detection(self, sound_level=None):
+        serial = self.serial
+        if sound_level is None:
+            sound_level = self.baseline_noise + self.rng.randint(DETECTION_SENSITIVITY, 3000)
+        self.anomaly_count += 1
+        serial.wait(3 * 0.3)  # alert LED pattern
+        severity = self._calculate_severity(sound_level)
+        serial.write(format_block('ALERT', {
+            'ID': self.anomaly_count,
+            'TIMESTAMP': self.millis(),
+            'LEVEL': sound_level,
+            'BASELINE': self.baseline_noise,
+            'DIFFERENCE': sound_level - self.baseline_noise,
+            'SEVERITY': ("LOW", "MEDIUM", "HIGH", "CRITICAL")[severity],
+            'LOCATION': self.location,
+            'UPTIME': self.uptime_string(),
+        }))
+        serial.wait(severity * 0.5)
+        return serial.take()
+
+    def _calculate_severity(self, level):
+        difference = level - self.baseline_noise
+        if difference > DETECTION_SENSITIVITY * 3:
+            return 3
+        if difference > DETECTION_SENSITIVITY * 2:
+            return 2
+        if difference > DETECTION_SENSITIVITY:
+            return 1
+        return 0
+
+    def send_status_update(self):
+        serial = self.serial
+        serial.println("STATUS:UPDATE")
+        serial.print("STATUS:UPTIME:")
+        serial.println(self.uptime_string())
+        serial.print("STATUS:BASELINE:")
+        serial.println(self.baseline_noise)
+        serial.print("STATUS:THRESHOLD:")
+        serial.println(self.sound_threshold)
+        serial.print("STATUS:ALERTS:")
+        serial.println(self.anomaly_count)
+        serial.print("STATUS:HELP_CALLS:")
+        serial.println(self.help_call_count)
+        serial.print("STATUS:CURRENT_LEVEL:")
+        serial.println(self.analog_read())
+        serial.print("STATUS:FREE_MEMORY:")
+        serial.println(self.rng.randint(180000, 200000))
+        return serial.take()
+
+    def handle_serial_command(self, command):
+        serial = self.serial
+        command = command.strip().upper()
+        if command == "STATUS":
+            return self.send_status_update()
+        elif command == "RESET":
+            self.anomaly_count = 0
+            self.help_call_count = 0
+            self._calibrate_baseline()
+            serial.println("COMMAND:RESET:COMPLETE")
+        elif command == "BASELINE":
+            self._calibrate_baseline()
+            serial.println("COMMAND:BASELINE:COMPLETE")
+        elif command.startswith("SENSITIVITY:"):
+            try:
+                sensitivity = int(command[12:])
+            except ValueError:
+                sensitivity = 0  # String.toInt() returns 0 on garbage
+            if 0 < sensitivity < 500:
+                self.sound_threshold = self.baseline_noise + sensitivity
+                serial.print("COMMAND:SENSITIVITY:SET:")
+                serial.println(sensitivity)
+        elif command == "TEST":
+            serial.println("ALERT:START")
+            serial.println("ALERT:ID:TEST")
+            serial.println("ALERT:TYPE:MANUAL_TEST")
+            serial.println("ALERT:SEVERITY:LOW")
+            serial.println("ALERT:END")
+        elif command == "TESTHELP":
+            serial.println("EMERGENCY:HELP_DETECTED")
+            serial.println("Testing HELP emergency system...")
+            steps = serial.take()
+            return steps + self.handle_help_command(self.analog_read())
+        else:
+            serial.print("COMMAND:UNKNOWN:")
+            serial.println(command)
+        return serial.take()
+
+class PtyDevice:
+    """One simulated board on its own pseudo-terminal"""
+
+    def __init__(self, firmware, alert_rate, help_rate, status_interval,
+                 burst_interval, burst_size, firmware_delays):
+        self.firmware = firmware
+        self.device_id = firmware.device_id
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)  # no echo, no \n -> \r\n translation
+        os.set_blocking(self.master, False)
+        # Packet mode: reads from the master report when the host flushes its input
+        fcntl.ioctl(self.master, termios.TIOCPKT, struct.pack('i', 1))
+        self.port = os.ttyname(self.slave)
+
+        self.alert_rate = alert_rate
+        self.help_rate = help_rate
+        self.status_interval = status_interval
+        self.burst_interval = burst_interval
+        self.burst_size = burst_size
+        self.firmware_delays = firmware_delays
+
+        self.steps = []            # queued (due, sequence, bytes) output
+        self.sequence = 0
+        self.busy_until = 0.0      # firmware is inside delay() until then
+        self.output = bytearray()  # written to the pty as fast as the host reads
+        self.commands = LineBuffer()
+        self.next_event = {}
+        self.lines_written = 0
+        self.bytes_written = 0
+        self.resets = 0
+
+    def schedule(self, steps, now):
+        """Queue firmware output; honours delay() only when firmware_delays is set"""
+        due = max(now, self.busy_until)
+        for delay, data in steps:
+            if self.firmware_delays:
+                due += delay
+            if data:
+                self.sequence += 1
+                heapq.heappush(self.steps, (due, self.sequence, data))
+        self.busy_until = due
+
+    def boot(self, now):
+        """Boot the firmware and arm the event timers"""
+        rng = self.firmware.rng
+        self.steps = []
+        self.output.clear()
+        self.busy_until = now
+        self.firmware.boot_time = time.monotonic()
+        self.firmware.anomaly_count = 0
+        self.firmware.help_call_count = 0
+        self.schedule(self.firmware.setup(), now)
+        ready = self.busy_until
+        self.next_event = {
+            'alert': ready + rng.expovariate(self.alert_rate) if self.alert_rate else None,
+            'help': ready + rng.expovariate(self.help_rate) if self.help_rate else None,
+            'status': ready + self.status_interval if self.status_interval else None,
+            'burst': ready + self.burst_interval if self.burst_interval and self.burst_size else None,
+        }
+
+    def generate(self, now):
+        """Emit every event that is due (Poisson arrivals per configured rate)"""
+        firmware = self.firmware
+        rng = firmware.rng
+        events = self.next_event
+        for kind in events:
+            while events[kind] is not None and events[kind] <= now:
+                if len(self.output) >= OUTPUT_HIGH_WATER or self.busy_until > now:
+                    return
+                due = events[kind]
+                if kind == 'alert':
+                    self.schedule(firmware.handle_anomaly_detection(), now)
+                    # Never catch up on more than a second of missed events
+                    events[kind] = max(due, now - 1.0) + rng.expovariate(self.alert_rate)
+                elif kind == 'help':
+                    self.schedule(firmware.handle_help_command(), now)
+                    events[kind] = max(due, now - 1.0) + rng.expovariate(self.help_rate)
+                elif kind == 'status':
+                    self.schedule(firmware.send_status_update(), now)
+                    events[kind] = now + self.status_interval
+                elif kind == 'burst':
+                    for _ in range(self.burst_size):
+                        self.schedule(firmware.handle_anomaly_detection(), now)
+                    events[kind] = now + self.burst_interval
+
+    def next_due(self):
+        """Earliest time this device has something to do"""
+        times = [due for due in self.next_event.values() if due is not None]
+        if self.steps:
+            times.append(self.steps[0][0])
+        return min(times) if times else None
+
+    def flush(self, now):
+        """Move due output into the pty; returns True while bytes are still pending"""
+        steps = self.steps
+        while steps and steps[0][0] <= now:
+            data = heapq.heappop(steps)[2]
+            self.output += data
+            self.lines_written += data.count(b'\n')
+        if self.output:
+            try:
+                written = os.write(self.master, self.output)
+            except BlockingIOError:
+                written = 0
+            except OSError:
+                # EIO until the host opens the slave on some platforms
+                written = 0
+            del self.output[:written]
+            self.bytes_written += written
+        return bool(self.output)
+
+    def read_commands(self, now):
+        try:
+            packet = os.read(self.master, 1025)
+        except (BlockingIOError, OSError):
+            return
+        if not packet:
+            return
+        if packet[0] != termios.TIOCPKT_DATA:
+            if packet[0] & termios.TIOCPKT_FLUSHREAD:
+                # Host opened the port (pyserial flushes on open) - reset like DTR would
+                self.resets += 1
+                self.commands.clear()
+                self.boot(now)
+            return
+        for command in self.commands.feed(packet[1:]):
+            self.schedule(self.firmware.handle_serial_command(command.decode('utf-8', errors='ignore')),
+                          now)
+
+    def close(self):
+        for fd in (self.master, self.slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+class ESP32Simulator:
+    """Runs any number of simulated boards from one selector loop
+
+    alert_rate / help_rate are mean events per second per device
+    (exponential inter-arrival), status_interval is the STATUS:UPDATE
+    period and every burst_interval seconds burst_size alerts are sent
+    back to back. firmware_delays=True replays the firmware's delay()
+    timing (3.6 s calibration, LED flashes); leave it off for load tests.
+    With wait_for_host=False boards boot immediately instead of when the
+    port is first opened (for hosts that do not flush on open).
+    """
+
+    def __init__(self, devices=1, alert_rate=1.0, help_rate=0.05, status_interval=STATUS_INTERVAL,
+                 burst_interval=0, burst_size=0, firmware_delays=False, seed=None,
+                 location=DEVICE_LOCATION, wait_for_host=True):
+        rng = random.Random(seed)
+        self.devices = []
+        for index in range(devices):
+            firmware = SimulatedESP32(f"ESP32_SOUND_{index + 1:03d}",
+                                      location if devices == 1 else f"{location} {index + 1}",
+                                      rng=random.Random(rng.random()))
+            self.devices.append(PtyDevice(firmware, alert_rate, help_rate, status_interval,
+                                          burst_interval, burst_size, firmware_delays))
+        self.wait_for_host = wait_for_host
+        self.selector = selectors.DefaultSelector()
+        self.running = False
+        self.thread = None
+        self.started_at = None
+
+    @property
+    def ports(self):
+        return [device.port for device in self.devices]
+
+    def start(self):
+        """Power up every board and serve them from a background thread"""
+        now = time.monotonic()
+        self.started_at = now
+        for device in self.devices:
+            if not self.wait_for_host:
+                device.boot(now)
+            self.selector.register(device.master, selectors.EVENT_READ, device)
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def _run(self):
+        while self.running:
+            now = time.monotonic()
+            pending = False
+            wake = now + 0.5
+            for device in self.devices:
+                device.generate(now)
+                if device.flush(now):
+                    pending = True
+                due = device.next_due()
+                if due is not None and due < wake:
+                    wake = due
+
+            # Unread output: poll again shortly instead of spinning on a full pty
+            timeout = 0.001 if pending else max(0.0, wake - time.monotonic())
+            for key, _ in self.selector.select(timeout):
+                key.data.read_commands(time.monotonic())
+
+    def stop(self):
+        """Stop the loop and close every pty"""
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=2)
+        self.selector.close()
+        for device in self.devices:
+            device.close()
+
+    def stats(self):
+        """Lines and bytes delivered per device"""
+        elapsed = time.monotonic() - self.started_at if self.started_at else 0
+        return {
+            device.device_id: {
+                'port': device.port,
+                'lines_written': device.lines_written,
+                'bytes_written': device.bytes_written,
+                'pending_bytes': len(device.output),
+                'lines_per_second': device.lines_written / elapsed if elapsed else 0
+            }
+            for device in self.devices
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate ESP32 sound detectors on pseudo-terminals")
+    parser.add_argument('--devices', type=int, default=1, help="number of simulated boards")
+    parser.add_argument('--alert-rate', type=float, default=1.0, help="ALERT blocks per second per board")
+    parser.add_argument('--help-rate', type=float, default=0.05, help="HELP emergencies per second per board")
+    parser.add_argument('--status-interval', type=float, default=STATUS_INTERVAL,
+                        help="seconds between STATUS:UPDATE blocks")
+    parser.add_argument('--burst-interval', type=float, default=0, help="seconds between alert bursts")
+    parser.add_argument('--burst-size', type=int, default=0, help="alerts per burst")
+    parser.add_argument('--firmware-delays', action='store_true',
+                        help="keep the firmware's delay() timing (calibration, LED flashes)")
+    parser.add_argument('--duration', type=float, default=0, help="seconds to run (0 = until Ctrl+C)")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    simulator = ESP32Simulator(args.devices, args.alert_rate, args.help_rate, args.status_interval,
+                               args.burst_interval, args.burst_size, args.firmware_delays, args.seed)
+    simulator.start()
+
+    print("=" * 70)
+    print("ESP32 SIMULATOR")
+    print("=" * 70)
+    for device in simulator.devices:
+        print(f"✓ {device.device_id} on {device.port}")
+    print("\nFor config.py:")
+    print(f"  ARDUINO_PORT = '{simulator.ports[0]}'")
+    print("  DEVICE_PORTS = {")
+    for device in simulator.devices:
+        print(f"      '{device.port}': '{device.device_id}',")
+    print("  }")
+    print("\n💡 Press Ctrl+C to stop\n")
+
+    try:
+        started = time.monotonic()
+        while not args.duration or time.monotonic() - started < args.duration:
+            time.sleep(min(10, args.duration or 10))
+            stats = simulator.stats()
+            total = sum(device['lines_per_second'] for device in stats.values())
+            pending = sum(device['pending_bytes'] for device in stats.values())
+            print(f"📈 {total:,.0f} lines/s across {len(stats)} device(s), {pending:,} bytes unread")
+    except KeyboardInterrupt:
+        print("\n🛑 Simulator stopped")
+    finally:
+        simulator.stop()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""
+Compact event objects for parsed ESP32 messages
+One __slots__ object per event instead of a dict. The arrival time is kept
+as an epoch-nanosecond int and only turned into text when an email, log
+line or repr needs it. Events still answer the dict-style reads (get,
+[], in, items) the handlers, email templates and dashboard use.
+"""
+
+import time
+from datetime import datetime
+
+class Event:
+    # device_id/port are set by SerialHub and the handlers; trace holds latency stamps
+    # (latency.py) for emergency/anomaly events and is not one of the dict keys
+    __slots__ = ('time_ns', 'device_id', 'port', 'trace')
+    type = None
+    keys_order = ('type', 'timestamp', 'device_id', 'port')
+    key_set = frozenset(keys_order)
+
+    def __init_subclass__(cls):
+        cls.keys_order = ('type', 'timestamp') + cls.__slots__ + ('device_id', 'port')
+        cls.key_set = frozenset(cls.keys_order)
+
+    def __init__(self, **fields):
+        self.time_ns = time.time_ns()
+        for key, value in fields.items():
+            setattr(self, key, value)
+
+    def local_time(self):
+        """Arrival time as a local datetime"""
+        return datetime.fromtimestamp(self.time_ns / 1e9)
+
+    @property
+    def timestamp(self):
+        """ISO arrival time, formatted on demand"""
+        return self.local_time().isoformat()
+
+    # Dict-style access - only fields that were set count as keys
+    def __getitem__(self, key):
+        if key in self.key_set:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                pass
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self.key_set and hasattr(self, key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return [key for key in self.keys_order if hasattr(self, key)]
+
+    def items(self):
+        return [(key, getattr(self, key)) for key in self.keys()]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+class EmergencyEvent(Event):
+    __slots__ = ('emergency_id', 'arduino_timestamp', 'emergency_type', 'subtype', 'level',
+                 'location', 'uptime', 'message', 'emergency_contact', 'immediate', 'source',
+                 'trigger_message', 'triggers', 'incomplete')
+    type = 'emergency'
+
+class AnomalyEvent(Event):
+    __slots__ = ('alert_id', 'arduino_timestamp', 'level', 'baseline', 'difference', 'severity',
+                 'location', 'uptime', 'source', 'triggers', 'incomplete')
+    type = 'anomaly'
+
+class StatusEvent(Event):
+    __slots__ = ('field', 'value')
+    type = 'status'
+
+    def __init__(self, field, value):
+        self.time_ns = time.time_ns()
+        self.field = field
+        self.value = value
+
+EVENT_TYPES = {cls.type: cls for cls in (EmergencyEvent, AnomalyEvent, StatusEvent)}
+
+def from_dict(data):
+    """Event for a message dict ({'type': ..., field: value, ...})"""
+    fields = {key: value for key, value in data.items() if key not in ('type', 'timestamp')}
+    if data['type'] == 'status':
+        return StatusEvent(fields['field'], fields['value'])
+    return EVENT_TYPES[data['type']](**fields)
+
+def event_time(data):
+    """When data happened - the event's own time, or now for plain dicts"""
+    return data.local_time() if isinstance(data, Event) else datetime.now()
@@ -0,0 +1,214 @@
+"""
+Bounded ingestion queue for serial lines
+Ring-buffer backpressure so a stalled consumer cannot grow memory without limit
+"""
+
+import threading
+from collections import deque
+from time import monotonic_ns
+from queue import Empty
+
+# Lines that must reach the consumer no matter how far behind it is
+NEVER_DROP_PREFIXES = ('EMERGENCY:', 'ALERT:')
+
+# Raw-line prefixes the reader sends down the priority lane (checked on bytes)
+PRIORITY_PREFIXES = (b'EMERGENCY:',)
+
+# What to discard when the queue is full of droppable lines
+DROP_OLDEST = 'drop_oldest'
+DROP_NEWEST = 'drop_newest'
+
+class BoundedMessageQueue:
+    """Queue-compatible bounded FIFO with per-line drop policy
+
+    Droppable lines (LEVEL/STATUS/CALIBRATION...) and protected lines
+    (EMERGENCY:/ALERT:) live in separate ring buffers tagged with a
+    sequence number, so FIFO order is kept across both while evicting
+    the oldest droppable line stays O(1). Protected lines are never
+    dropped: when the queue is full of them they are admitted over
+    capacity and counted as overflow.
+
+    A third, priority lane holds emergency lines. It is always drained
+    before the other two, so a HELP detection does not wait behind
+    thousands of buffered LEVEL/STATUS lines. Its lines count towards
+    maxsize and are protected too: a full queue evicts a droppable line
+    to make room, and once only protected lines are left an emergency
+    line is admitted over capacity and counted as overflow, so an
+    EMERGENCY START...END block is never cut in half.
+
+    Every entry keeps the monotonic time its line was received, for
+    consumers that trace latency (get_many_stamped).
+    """
+
+    def __init__(self, maxsize=2048, never_drop_prefixes=NEVER_DROP_PREFIXES, policy=DROP_OLDEST):
+        if policy not in (DROP_OLDEST, DROP_NEWEST):
+            raise ValueError(f"Unknown drop policy: {policy}")
+        self.maxsize = maxsize
+        self.never_drop_prefixes = tuple(never_drop_prefixes)
+        # Raw-line readers queue bytes, so keep an encoded copy of the prefixes
+        self.never_drop_bytes = tuple(prefix.encode('utf-8') for prefix in self.never_drop_prefixes)
+        self.policy = policy
+        self.priority = deque()
+        self.droppable = deque()
+        self.protected = deque()
+        self.sequence = 0
+        self.not_empty = threading.Condition(threading.Lock())
+        self.woken = False  # set by wake() to end a blocking get_many() early
+
+        # Counters for sizing the queue under load
+        self.enqueued = 0
+        self.dequeued = 0
+        self.dropped = 0
+        self.overflow = 0
+        self.high_water = 0
+        self.priority_enqueued = 0
+
+    def _is_protected(self, line):
+        if isinstance(line, str):
+            return line.startswith(self.never_drop_prefixes)
+        return line.startswith(self.never_drop_bytes)
+
+    def put(self, line, block=True, timeout=None, priority=False, received=None):
+        """Add a line, evicting per policy instead of blocking when full
+
+        received is the monotonic_ns() the line came off the wire (default: now).
+        """
+        if received is None:
+            received = monotonic_ns()
+        with self.not_empty:
+            if priority:
+                if self._depth() >= self.maxsize:
+                    if self.droppable:
+                        self.droppable.popleft()
+                        self.dropped += 1
+                    else:
+                        self.overflow += 1
+                self.priority.append((0, line, received))
+                self.enqueued += 1
+                self.priority_enqueued += 1
+                self._track_depth()
+                self.not_empty.notify()
+                return True
+
+            protected = self._is_protected(line)
+            if self._depth() >= self.maxsize:
+                if self.droppable and (protected or self.policy == DROP_OLDEST):
+                    self.droppable.popleft()
+                    self.dropped += 1
+                elif protected:
+                    self.overflow += 1
+                else:
+                    self.dropped += 1
+                    return False
+
+            self.sequence += 1
+            if protected:
+                self.protected.append((self.sequence, line, received))
+            else:
+                self.droppable.append((self.sequence, line, received))
+            self.enqueued += 1
+            self._track_depth()
+            self.not_empty.notify()
+            return True
+
+    def put_nowait(self, line, priority=False, received=None):
+        return self.put(line, block=False, priority=priority, received=received)
+
+    def _depth(self):
+        return len(self.priority) + len(self.droppable) + len(self.protected)
+
+    def _track_depth(self):
+        depth = self._depth()
+        if depth > self.high_water:
+            self.high_water = depth
+
+    def _pop(self):
+        """Remove the next (sequence, line, received) entry - priority lane first, then oldest across the others"""
+        self.dequeued += 1
+        if self.priority:
+            return self.priority.popleft()
+        droppable, protected = self.droppable, self.protected
+        if protected and (not droppable or protected[0][0] < droppable[0][0]):
+            return protected.popleft()
+        return droppable.popleft()
+
+    def get(self, block=True, timeout=None):
+        """Remove and return the oldest line; raises queue.Empty like Queue.get"""
+        with self.not_empty:
+            if not block:
+                if not self._depth():
+                    raise Empty
+            elif timeout is None:
+                while not self._depth():
+                    self.not_empty.wait()
+            else:
+                if not self.not_empty.wait_for(self._depth, timeout):
+                    raise Empty
+            return self._pop()[1]
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def get_many(self, max_n=256, block=True, timeout=None):
+        """Remove and return up to max_n lines in one lock acquisition
+
+        Waits like get() for the first line, then takes whatever else is
+        already buffered. Returns [] instead of raising on timeout or when
+        wake() interrupts the wait.
+        """
+        return [entry[1] for entry in self._get_entries(max_n, block, timeout)]
+
+    def get_many_stamped(self, max_n=256, block=True, timeout=None):
+        """get_many() as (received monotonic_ns, line) pairs"""
+        return [(entry[2], entry[1]) for entry in self._get_entries(max_n, block, timeout)]
+
+    def _get_entries(self, max_n, block, timeout):
+        with self.not_empty:
+            if not self._depth():
+                if not block:
+                    return []
+                ready = self.not_empty.wait_for(self._ready, timeout)
+                # A wake() that raced with a line is spent too - it must not cut a later wait short
+                self.woken = False
+                if not ready or not self._depth():
+                    return []
+            pop = self._pop
+            return [pop() for _ in range(min(max_n, self._depth()))]
+
+    def _ready(self):
+        return self._depth() or self.woken
+
+    def wake(self):
+        """Make a get_many() blocked with no timeout return [] (shutdown, end of input)
+
+        Safe from a signal handler: if the lock is busy its holder is not
+        waiting, and the next wait sees the flag before it sleeps.
+        """
+        self.woken = True
+        if self.not_empty.acquire(blocking=False):
+            self.not_empty.notify_all()
+            self.not_empty.release()
+
+    def qsize(self):
+        return self._depth()
+
+    def empty(self):
+        return not self._depth()
+
+    def full(self):
+        return self.qsize() >= self.maxsize
+
+    def stats(self):
+        """Counters for capacity planning"""
+        with self.not_empty:
+            return {
+                'depth': self._depth(),
+                'priority_depth': len(self.priority),
+                'maxsize': self.maxsize,
+                'enqueued': self.enqueued,
+                'dequeued': self.dequeued,
+                'dropped': self.dropped,
+                'overflow': self.overflow,
+                'high_water': self.high_water,
+                'priority_enqueued': self.priority_enqueued
+            }
@@ -0,0 +1,67 @@
+"""
+Single-pass keyword matcher for the HELP / anomaly trigger lists
+Every keyword group compiles into one regex shaped like a prefix trie, so
+a line is scanned once however many keywords (or languages) config lists:
+at each position the regex engine follows the next character instead of
+retrying every keyword. Lines are upper-cased once and matched
+case-sensitively - re.IGNORECASE loses the engine's literal-prefix
+search and is several times slower on the common no-hit line.
+"""
+
+import re
+
+def _trie_pattern(keywords):
+    """Regex for a set of keywords with shared prefixes factored out"""
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[''] = {}  # end of a keyword
+    return _node_pattern(trie)
+
+def _node_pattern(node):
+    branches = [re.escape(char) + _node_pattern(child) for char, child in sorted(node.items()) if char]
+    if not branches:
+        return ''
+    pattern = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+    # A keyword ends here - the rest is optional, and greedy so the longest keyword wins
+    return '(?:' + pattern + ')?' if '' in node else pattern
+
+class KeywordMatcher:
+    def __init__(self, groups):
+        """groups maps a group name to its keywords, e.g. {'help': HELP_KEYWORDS}"""
+        self.keywords = {}  # upper-cased keyword -> (keyword as configured, groups)
+        for group, keywords in groups.items():
+            for keyword in keywords:
+                original, names = self.keywords.get(keyword.upper(), (keyword, ()))
+                self.keywords[keyword.upper()] = (original, names + (group,))
+        
+        # The regex reports the longest keyword starting at a position; the
+        # keywords that are a prefix of it start there too
+        self.prefixes = {key: [other for other in self.keywords if key.startswith(other)]
+                         for key in self.keywords}
+        self.regex = re.compile(_trie_pattern(sorted(self.keywords)))
+    
+    def search(self, text):
+        """First keyword found in text, or None"""
+        match = self.regex.search(text.upper())
+        return self.keywords[match.group()][0] if match else None
+    
+    def scan(self, text):
+        """Every keyword in text, overlapping ones included: {group: [keywords in order]}"""
+        upper = text.upper()
+        match = self.regex.search(upper)
+        if match is None:
+            return {}
+        hits = {}
+        seen = set()
+        while match is not None:
+            for key in self.prefixes[match.group()]:
+                if key not in seen:
+                    seen.add(key)
+                    keyword, groups = self.keywords[key]
+                    for group in groups:
+                        hits.setdefault(group, []).append(keyword)
+            match = self.regex.search(upper, match.start() + 1)
+        return hits
@@ -0,0 +1,147 @@
+"""
+Latency tracing from serial byte to delivered alert
+Every event carries a trace - a dict of monotonic_ns stamps taken when
+its line was received, parsed, reached its handler, got an SMTP session
+and was accepted by the SMTP server. Each span between two stamps goes
+into an HDR-style histogram (log buckets with linear sub-buckets), so
+percentiles stay within ~3% over microseconds to hours in fixed memory.
+"""
+
+import threading
+import time
+
+# Stamps in pipeline order
+RECEIVED = 'received'            # serial read returned the line (reader thread)
+PARSED = 'parsed'                # parser / pattern detection produced the event
+HANDLED = 'handled'              # detect stage handler started
+SMTP_CONNECT = 'smtp_connect'    # SMTP session connected and logged in
+SMTP_ACCEPTED = 'smtp_accepted'  # server accepted the message
+
+# (start stamp, end stamp, label) - recorded when the end stamp is taken
+SPANS = (
+    (RECEIVED, PARSED, 'serial → parsed'),
+    (PARSED, HANDLED, 'parsed → handler'),
+    (HANDLED, SMTP_CONNECT, 'handler → SMTP connect'),
+    (SMTP_CONNECT, SMTP_ACCEPTED, 'SMTP connect → accepted'),
+    (RECEIVED, SMTP_ACCEPTED, 'serial → email accepted'),
+)
+
+class LatencyHistogram:
+    """Microsecond histogram: values below 2**bits are exact, above that each
+    power of two is split into 2**bits linear sub-buckets"""
+
+    def __init__(self, bits=5):
+        self.bits = bits
+        self.sub = 1 << bits
+        self.counts = []
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def _index(self, value):
+        if value < self.sub:
+            return value
+        shift = value.bit_length() - self.bits - 1
+        return self.sub + shift * self.sub + (value >> shift) - self.sub
+
+    def _lowest(self, index):
+        """Smallest value that lands in bucket index"""
+        if index < self.sub:
+            return index
+        shift, offset = divmod(index - self.sub, self.sub)
+        return (self.sub + offset) << shift
+
+    def record(self, value):
+        value = max(int(value), 0)
+        index = self._index(value)
+        counts = self.counts
+        if index >= len(counts):
+            counts.extend([0] * (index + 1 - len(counts)))
+        counts[index] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, percent):
+        """Value at or below which percent of the recorded values fall (bucket's upper edge)"""
+        if not self.count:
+            return 0
+        rank = max(1, -int(-percent * self.count // 100))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self._lowest(index + 1) - 1, self.max)
+        return self.max
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def merge(self, other):
+        if len(other.counts) > len(self.counts):
+            self.counts.extend([0] * (len(other.counts) - len(self.counts)))
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        self.max = max(self.max, other.max)
+
+def format_us(value):
+    """Microseconds as a short human duration"""
+    if value < 1000:
+        return f"{value:.0f}µs"
+    if value < 1000000:
+        return f"{value / 1000:.1f}ms"
+    return f"{value / 1000000:.2f}s"
+
+class LatencyTracker:
+    """One histogram per span, fed by stamp() calls from any pipeline thread"""
+
+    def __init__(self, spans=SPANS):
+        self.spans = spans
+        self.histograms = {label: LatencyHistogram() for _, _, label in spans}
+        self.ending = {}
+        for start, end, label in spans:
+            self.ending.setdefault(end, []).append((start, self.histograms[label]))
+        self.lock = threading.Lock()
+
+    def stamp(self, trace, name, now=None):
+        """Add stamp name to trace and record every span it ends; no-op without a trace"""
+        if trace is None:
+            return
+        now = time.monotonic_ns() if now is None else now
+        trace[name] = now
+        spans = self.ending.get(name)
+        if spans:
+            with self.lock:
+                for start, histogram in spans:
+                    if start in trace:
+                        histogram.record((now - trace[start]) // 1000)
+
+    def summary(self):
+        """{label: {count, mean/p50/p99/p99.9/max in µs}} for reports and tests"""
+        with self.lock:
+            return {label: {'count': histogram.count,
+                            'mean_us': histogram.mean(),
+                            'p50_us': histogram.percentile(50),
+                            'p99_us': histogram.percentile(99),
+                            'p999_us': histogram.percentile(99.9),
+                            'max_us': histogram.max}
+                    for label, histogram in self.histograms.items()}
+
+    def format_lines(self):
+        """One line per span that has samples"""
+        lines = []
+        for label, summary in self.summary().items():
+            if not summary['count']:
+                continue
+            lines.append(f"{label:<24} n={summary['count']:<6} "
+                         f"p50={format_us(summary['p50_us']):>8} p99={format_us(summary['p99_us']):>8} "
+                         f"p99.9={format_us(summary['p999_us']):>8} max={format_us(summary['max_us']):>8}")
+        return lines or ["no traced events yet"]
@@ -8,17 +8,54 @@ Monitors ESP32 serial output and sends email alerts for emergencies and anomalie
 import sys
 import time
 import signal
+import asyncio
 from datetime import datetime
 from arduino_reader import ArduinoReader
 from message_parser import ArduinoMessageParser
+from block_assembler import BlockAssembler
 from email_sender import EmailSender
+from port_discovery import candidate_ports, discover_esp32
+from session_recorder import SessionRecorder, ReplayReader
+from keyword_matcher import KeywordMatcher
+from events import EmergencyEvent, AnomalyEvent, event_time
+from pipeline import Pipeline
+from outbox import Outbox
+from alert_spool import AlertSpool
+from scheduler import Scheduler
+from latency import LatencyTracker, RECEIVED, PARSED, HANDLED
 from config import *
 
+# HELP / anomaly trigger keywords from config, all matched in one pass per line
+TRIGGERS = KeywordMatcher({'help': HELP_KEYWORDS, 'anomaly': ANOMALY_KEYWORDS})
+
 class ESP32EmailIntegration:
     def __init__(self):
-        self.esp32 = ArduinoReader(ARDUINO_PORT, BAUDRATE, SERIAL_TIMEOUT)
-        self.parser = ArduinoMessageParser()
-        self.email_sender = EmailSender()
+        self.esp32 = ArduinoReader(ARDUINO_PORT, BAUDRATE, SERIAL_TIMEOUT,
+                                   queue_size=INGEST_QUEUE_SIZE,
+                                   never_drop_prefixes=INGEST_NEVER_DROP,
+                                   drop_policy=INGEST_DROP_POLICY,
+                                   priority_prefixes=INGEST_PRIORITY_PREFIXES,
+                                   raw_lines=RAW_LINE_PARSING)
+        # Block deadlines, digests and periodic tasks share one scheduler; the loops
+        # sleep until its next deadline or the next line
+        self.scheduler = Scheduler()
+        self.parser = ArduinoMessageParser(BlockAssembler(BLOCK_TIMEOUT, BLOCK_MAX_FIELDS, wheel=self.scheduler))
+        self.heartbeat = None
+        self.stats_shown_at = 0
+        # reader thread -> ingest queue -> parse (the loop) -> detect -> notify (email)
+        self.pipeline = Pipeline()
+        self.parse_stage = self.pipeline.add('parse', workers=0)
+        self.pipeline.add('detect', self._handle_parsed_data, DETECT_WORKERS, DETECT_QUEUE_SIZE)
+        # Emails go out most urgent first and failed sends are retried with backoff
+        self.pipeline.add_stage(Outbox('notify', self._send_notification, NOTIFY_WORKERS, NOTIFY_QUEUE_SIZE,
+                                       OUTBOX_RETRIES, OUTBOX_BACKOFF, OUTBOX_MAX_BACKOFF, OUTBOX_DEADLINES))
+        # Serial receipt -> parsed -> handler -> SMTP connect -> accepted, per alert event
+        self.latency = LatencyTracker()
+        self.email_sender = EmailSender(scheduler=self.scheduler, latency=self.latency,
+                                        queue_digest=self._queue_digest)
+        self.recorder = None
+        self.spool = None  # opened by the monitoring loops, not by replays
+        self.hub = None
         self.running = False
         self.stats = {
             'messages_processed': 0,
@@ -33,7 +70,7 @@ class ESP32EmailIntegration:
         
         signal.signal(signal.SIGINT, self._signal_handler)
     
-    def setup(self):
+    def setup(self, start_reading=True):
         """Setup ESP32 connection and email"""
         print("=" * 70)
         print("ESP32 SOUND DETECTOR - EMAIL INTEGRATION SYSTEM")
@@ -48,46 +85,23 @@ class ESP32EmailIntegration:
         print()
         
         # Test email first
-        print("Testing email configuration...")
-        if not self.email_sender.test_connection():
-            print("\n" + "="*60)
-            print("⚠️  EMAIL SETUP REQUIRED")
-            print("="*60)
-            print("For Gmail:")
-            print("1. Enable 2-Factor Authentication")
-            print("2. Generate App Password: https://myaccount.google.com/apppasswords")
-            print("3. Update config.py with your App Password")
-            print()
-            print("Update config.py:")
-            print("  EMAIL_USERNAME = 'your_email@gmail.com'")
-            print("  EMAIL_PASSWORD = 'your_app_password'")
-            print("  EMERGENCY_EMAIL = 'recipient@example.com'")
-            print("="*60)
+        if not self._check_email():
             return False
         
-        # Connect to ESP32
-        print(f"\nConnecting to ESP32 on {ARDUINO_PORT}...")
-        if not self.esp32.connect():
-            print("Trying alternative ports...")
-            
-            alternative_ports = [
-                'COM3', 'COM4', 'COM5', 'COM6', 'COM7', 'COM8',  # Windows
-                '/dev/ttyUSB0', '/dev/ttyUSB1', '/dev/ttyACM0',  # Linux
-                '/dev/cu.usbserial-0001', '/dev/cu.usbmodem14101'  # Mac
-            ]
-            
-            connected = False
-            for port in alternative_ports:
-                if port != ARDUINO_PORT:
-                    print(f"  Trying {port}...")
-                    self.esp32.port = port
-                    if self.esp32.connect():
-                        print(f"✓ Connected to ESP32 on {port}")
-                        connected = True
-                        break
-                    time.sleep(0.5)
-            
-            if not connected:
+        # Find the ESP32 - every candidate port is probed at the same time
+        ports = candidate_ports(ARDUINO_PORT, ALTERNATIVE_PORTS)
+        print(f"\nProbing {len(ports)} port(s) for ESP32 (preferred: {ARDUINO_PORT})...")
+        found = discover_esp32(ports, BAUDRATE, DISCOVERY_BANNER_TIMEOUT)
+        banner_ready = False
+        
+        if found:
+            print(f"✓ ESP32 identified on {found['port']} in {found['elapsed']:.1f}s")
+            self.esp32.attach(found['connection'], found['banner'], found['line_buffer'])
+            banner_ready = any('STATUS:READY' in line for line in found['banner'])
+        else:
+            # No banner - the board may already be running, try the configured port directly
+            print(f"No ESP32 banner seen, connecting to {ARDUINO_PORT} directly...")
+            if not self.esp32.connect():
                 print("✗ Failed to connect to ESP32!")
                 print("\nTroubleshooting:")
                 print("1. Check USB connection")
@@ -96,6 +110,17 @@ class ESP32EmailIntegration:
                 print("4. Try unplugging and reconnecting ESP32")
                 return False
         
+        if SESSION_RECORD_FILE:
+            self.recorder = SessionRecorder(SESSION_RECORD_FILE).attach(self.esp32)
+        
+        if not start_reading:
+            # Async mode reads the port from the event loop - the banner's READY/BASELINE
+            # lines come out of the async iterator first and get the normal status handling
+            print("✓ ESP32 setup complete!")
+            print("✓ Email setup complete!")
+            print()
+            return True
+        
         # Start reading from ESP32
         print("\nStarting ESP32 communication...")
         if not self.esp32.start_reading():
@@ -103,8 +128,9 @@ class ESP32EmailIntegration:
             return False
         
         # Wait for ESP32 to calibrate (ESP32 needs time to initialize)
-        print(f"Waiting {ESP32_INIT_DELAY}s for ESP32 initialization and calibration...")
-        time.sleep(ESP32_INIT_DELAY)
+        if not banner_ready:
+            print(f"Waiting {ESP32_INIT_DELAY}s for ESP32 initialization and calibration...")
+            time.sleep(ESP32_INIT_DELAY)
         
         # Check for ESP32 ready messages
         print("Checking ESP32 status...")
@@ -113,6 +139,8 @@ class ESP32EmailIntegration:
         
         while time.time() - ready_check_start < 10:
             msg = self.esp32.get_message(timeout=0.5)
+            if isinstance(msg, bytes):
+                msg = msg.decode('utf-8', errors='ignore')
             if msg:
                 print(f"  ESP32: {msg}")
                 if 'READY' in msg or 'MONITORING' in msg or 'ESP32' in msg:
@@ -128,6 +156,8 @@ class ESP32EmailIntegration:
                         self.stats['location'] = msg.split(':')[-1].strip()
                     except:
                         pass
+                if 'STATUS:READY' in msg:
+                    break  # Calibration done - no need to wait out the window
         
         if esp32_responding:
             print("✓ ESP32 is responding and ready!")
@@ -140,6 +170,26 @@ class ESP32EmailIntegration:
         print()
         return True
     
+    def _check_email(self):
+        """Test the email configuration and print setup help on failure"""
+        print("Testing email configuration...")
+        if not self.email_sender.test_connection():
+            print("\n" + "="*60)
+            print("⚠️  EMAIL SETUP REQUIRED")
+            print("="*60)
+            print("For Gmail:")
+            print("1. Enable 2-Factor Authentication")
+            print("2. Generate App Password: https://myaccount.google.com/apppasswords")
+            print("3. Update config.py with your App Password")
+            print()
+            print("Update config.py:")
+            print("  EMAIL_USERNAME = 'your_email@gmail.com'")
+            print("  EMAIL_PASSWORD = 'your_app_password'")
+            print("  EMERGENCY_EMAIL = 'recipient@example.com'")
+            print("="*60)
+            return False
+        return True
+    
     def run(self):
         """Main integration loop"""
         if not self.setup():
@@ -169,6 +219,7 @@ class ESP32EmailIntegration:
         print()
         
         # Send startup email
+        self._start_pipeline()
         self._send_startup_email()
         
         # Start input handler thread
@@ -176,83 +227,297 @@ class ESP32EmailIntegration:
         input_thread = threading.Thread(target=self._input_handler, daemon=True)
         input_thread.start()
         
+        self.scheduler.wake = self.esp32.wake
+        self._start_timers(self._show_current_status)
+        
         try:
-            last_status_time = time.time()
-            last_report_time = time.time()
-            
             while self.running:
-                # Get message from ESP32
-                message = self.esp32.get_message(timeout=1.0)
-                
-                if message:
-                    self.stats['messages_processed'] += 1
-                    
-                    # Parse the message
-                    parsed_data = self.parser.parse_message(message)
-                    
-                    # Also try ESP32-specific detection
-                    if not parsed_data:
-                        parsed_data = self._detect_esp32_patterns(message)
-                    
-                    if parsed_data:
-                        self._handle_parsed_data(parsed_data)
-                    
-                    # Show periodic stats
-                    if self.stats['messages_processed'] % 100 == 0:
-                        self._show_stats()
-                
-                # Show status every 60 seconds
-                if time.time() - last_status_time > 60:
-                    self._show_current_status()
-                    last_status_time = time.time()
-                
-                # Send daily report
-                if time.time() - last_report_time > 86400:  # 24 hours
-                    self._send_daily_report()
-                    last_report_time = time.time()
-                
-                time.sleep(0.05)  # Fast polling for ESP32
+                # Sleep until a line arrives or a timer is due, then drain every buffered line
+                batch = self.esp32.get_stamped_messages(INGEST_BATCH_SIZE, timeout=self.scheduler.wait_timeout())
+                if batch:
+                    self.scheduler.reschedule(self.heartbeat, HEARTBEAT_TIMEOUT)
+                with self.parse_stage.timed(len(batch)):
+                    for received, message in batch:
+                        self._process_message(message, received=received)
+                self._sweep_blocks()
+        
+        except Exception as e:
+            print(f"✗ Error in main loop: {e}")
+            import traceback
+            traceback.print_exc()
+        
+        finally:
+            self._cleanup()
+        
+        return True
+    
+    async def run_async(self):
+        """Main integration loop on asyncio
+        
+        Lines are consumed with `async for` straight off the serial port,
+        so there is no reader thread, no queue hop and no polling sleep.
+        One loop timer, re-armed for the scheduler's next deadline, runs
+        the periodic tasks and block deadlines.
+        """
+        if not self.setup(start_reading=False):
+            print("Setup failed. Exiting.")
+            return False
+        
+        self.running = True
+        
+        print("=" * 70)
+        print("🚀 ESP32 EMAIL INTEGRATION STARTED! (asyncio mode)")
+        print("=" * 70)
+        print("✓ Monitoring ESP32 for sound anomalies and emergencies")
+        print("💡 Press Ctrl+C to stop")
+        print("=" * 70)
+        print()
+        
+        self._start_pipeline()
+        self._send_startup_email()
+        
+        import threading
+        input_thread = threading.Thread(target=self._input_handler, daemon=True)
+        input_thread.start()
+        
+        loop = asyncio.get_running_loop()
+        wakeup = None
+        
+        def drive():
+            nonlocal wakeup
+            self._sweep_blocks()
+            timeout = self.scheduler.wait_timeout()
+            wakeup = loop.call_later(timeout, drive) if timeout is not None else None
+        
+        def rearm():
+            if wakeup:
+                wakeup.cancel()
+            drive()
+        
+        self.scheduler.wake = lambda: loop.call_soon_threadsafe(rearm)
+        self._start_timers(self._show_current_status)
+        drive()
+        
+        try:
+            async for message in self.esp32:
+                self.scheduler.reschedule(self.heartbeat, HEARTBEAT_TIMEOUT)
+                with self.parse_stage.timed(1):
+                    self._process_message(message, received=time.monotonic_ns())
+                if not self.running:
+                    break
         
         except Exception as e:
             print(f"✗ Error in main loop: {e}")
             import traceback
             traceback.print_exc()
         
+        finally:
+            self.scheduler.wake = None
+            if wakeup:
+                wakeup.cancel()
+            self._cleanup()
+        
+        return True
+    
+    def run_replay(self, path, speed=1.0):
+        """Feed a recorded session through the normal processing path
+        
+        speed=1 reproduces the original timing, speed=N runs N times
+        faster and speed=None replays as fast as lines can be processed.
+        Emails are only printed unless REPLAY_SEND_EMAILS is set.
+        """
+        print("=" * 70)
+        print("ESP32 SOUND DETECTOR - SESSION REPLAY")
+        print("=" * 70)
+        
+        self.esp32 = ReplayReader(path, speed,
+                                  echo=bool(speed),
+                                  queue_size=INGEST_QUEUE_SIZE,
+                                  never_drop_prefixes=INGEST_NEVER_DROP,
+                                  drop_policy=INGEST_DROP_POLICY,
+                                  priority_prefixes=INGEST_PRIORITY_PREFIXES,
+                                  raw_lines=RAW_LINE_PARSING)
+        self.email_sender.dry_run = not REPLAY_SEND_EMAILS
+        if not self.esp32.connect() or not self.esp32.start_reading():
+            print("Replay failed. Exiting.")
+            return False
+        
+        self.running = True
+        self.scheduler.wake = self.esp32.wake
+        self.pipeline.start()
+        started = time.perf_counter()
+        
+        try:
+            while self.running and not self.esp32.is_finished():
+                # The replay thread wakes this wait when the session ends
+                batch = self.esp32.get_stamped_messages(INGEST_BATCH_SIZE, timeout=self.scheduler.wait_timeout())
+                with self.parse_stage.timed(len(batch)):
+                    for received, message in batch:
+                        self._process_message(message, received=received)
+                self._sweep_blocks()
+        
+        except Exception as e:
+            print(f"✗ Error in replay loop: {e}")
+            import traceback
+            traceback.print_exc()
+        
+        finally:
+            elapsed = time.perf_counter() - started
+            replayed = self.esp32.lines_replayed
+            print(f"\n✓ Replayed {replayed} lines in {elapsed:.2f}s "
+                  f"({replayed / elapsed if elapsed else 0:,.0f} lines/s)")
+            self._cleanup()
+        
+        return True
+    
+    def run_hub(self):
+        """Monitor every port in DEVICE_PORTS from one selector loop"""
+        from serial_hub import SerialHub
+        
+        print("=" * 70)
+        print("ESP32 SOUND DETECTOR - MULTI-DEVICE HUB")
+        print("=" * 70)
+        if not self._check_email():
+            print("Setup failed. Exiting.")
+            return False
+        
+        self.hub = SerialHub(raw_lines=RAW_LINE_PARSING, parser=self.parser)
+        for port, device_id in DEVICE_PORTS.items():
+            self.hub.add_device(port, device_id, BAUDRATE)
+        
+        if not self.hub.devices:
+            print("✗ No ESP32 ports could be opened - check DEVICE_PORTS in config.py")
+            return False
+        
+        self.running = True
+        print(f"🚀 Monitoring {len(self.hub.devices)} ESP32 device(s) - press Ctrl+C to stop\n")
+        self._start_pipeline()
+        self._send_startup_email()
+        
+        self.scheduler.wake = self.hub.wake
+        self._start_timers(self._show_hub_status, daily_report=False)
+        
+        try:
+            while self.running:
+                batch = self.hub.poll(timeout=self.scheduler.wait_timeout())
+                received = time.monotonic_ns()  # the hub reads the ports right before returning
+                if batch:
+                    self.scheduler.reschedule(self.heartbeat, HEARTBEAT_TIMEOUT)
+                with self.parse_stage.timed(len(batch)):
+                    for device, message in batch:
+                        self._process_message(message, device, received)
+                self._sweep_blocks()
+        
+        except Exception as e:
+            print(f"✗ Error in hub loop: {e}")
+            import traceback
+            traceback.print_exc()
+        
         finally:
             self._cleanup()
+            self.hub.close()
         
         return True
     
-    def _detect_esp32_patterns(self, message):
+    def _show_hub_status(self):
+        """Show one status line per hub device"""
+        print(f"\n📈 Hub Status ({len(self.hub.devices)} devices, uptime {self._get_uptime()}):")
+        for device in self.hub.devices.values():
+            device_stats = device.stats
+            print(f"   {device.device_id:<20} {device.port:<16} "
+                  f"msgs={device_stats['messages_processed']} "
+                  f"emergencies={device_stats['emergencies_detected']} "
+                  f"anomalies={device_stats['anomalies_detected']} "
+                  f"baseline={device_stats['baseline']}")
+        self._show_pipeline_status()
+        self._show_latency()
+        print()
+    
+    def _process_message(self, message, device=None, received=None):
+        """Parse one ESP32 line and hand anything detected to the detect stage
+        
+        Hub lines pass their SerialDevice so open blocks and location /
+        baseline tracking stay per device. received is the line's serial
+        receipt time (monotonic_ns); alert events get a latency trace from it.
+        """
+        self.stats['messages_processed'] += 1
+        stats = self.stats
+        if device is not None:
+            stats = device.stats
+            stats['messages_processed'] += 1
+        
+        # Parse the message - raw lines are decoded once and never re-stripped
+        if isinstance(message, bytes):
+            message = message.decode('utf-8', errors='ignore')
+            parsed_data = self.parser.parse_line(message, device)
+        else:
+            parsed_data = self.parser.parse_message(message, device)
+        
+        # Also try ESP32-specific detection
+        if not parsed_data:
+            parsed_data = self._detect_esp32_patterns(message, stats)
+        
+        if parsed_data:
+            if received is not None and parsed_data.type != 'status':
+                parsed_data.trace = {RECEIVED: received}
+                self.latency.stamp(parsed_data.trace, PARSED)
+            self.pipeline.put('detect', (parsed_data, stats))
+    
+    def _start_pipeline(self):
+        """Start the stages - with a spool, alerts the last run left undelivered go out first"""
+        if ALERT_SPOOL_FILE and self.spool is None:
+            self.spool = AlertSpool(ALERT_SPOOL_FILE, SPOOL_BATCH_SIZE, retention=SPOOL_RETENTION,
+                                    scheduler=self.scheduler, flush_interval=SPOOL_FLUSH_INTERVAL)
+            self.pipeline['notify'].spool = self.spool
+        self.pipeline.start()
+        replayed = self.pipeline['notify'].replay()
+        if replayed:
+            print(f"📬 Resending {replayed} alert email(s) left undelivered by the last run")
+    
+    def _start_timers(self, show_status, daily_report=True):
+        """Periodic tasks of a monitoring loop - all run from _sweep_blocks()"""
+        self.scheduler.every(STATS_INTERVAL, self._show_new_stats)
+        self.scheduler.every(STATUS_INTERVAL, show_status)
+        if daily_report:
+            self.scheduler.every(DAILY_REPORT_INTERVAL, self._send_daily_report)
+        # NOOPs go through the notify stage so SMTP round trips stay off this loop
+        self.scheduler.every(SMTP_KEEPALIVE, self.pipeline.put, 'notify', ('keepalive', None), False)
+        # Pushed back by every batch of lines, so it only fires when the serial link goes quiet
+        self.heartbeat = self.scheduler.every(HEARTBEAT_TIMEOUT, self._heartbeat_missed)
+    
+    def _heartbeat_missed(self):
+        """No line from any ESP32 for HEARTBEAT_TIMEOUT seconds"""
+        print(f"⚠️  No data from the ESP32 for {HEARTBEAT_TIMEOUT}s - check USB cable and power")
+    
+    def _sweep_blocks(self):
+        """Run due scheduler tasks and dispatch EMERGENCY/ALERT blocks cut off before their END line"""
+        for device, event in self.parser.sweep():
+            stats = device.stats if device is not None else self.stats
+            print(f"⚠️  Incomplete {event.type} block from {stats['device_id']} - dispatching the fields received")
+            self.pipeline.put('detect', (event, stats))
+    
+    def _detect_esp32_patterns(self, message, stats=None):
         """Detect ESP32-specific patterns"""
+        stats = stats if stats is not None else self.stats
         msg_upper = message.upper()
+        triggers = TRIGGERS.scan(message)
         
         # ESP32 HELP detection patterns
-        help_triggers = [
-            'HELP_DETECTED',
-            'EMERGENCY:HELP',
-            'VOICE_HELP',
-            'PERSON NEEDS HELP',
-            'HELP COMMAND'
-        ]
-        
-        for trigger in help_triggers:
-            if trigger in msg_upper:
-                return {
-                    'type': 'emergency',
-                    'emergency_type': 'HELP',
-                    'level': 999,
-                    'immediate': True,
-                    'timestamp': datetime.now().isoformat(),
-                    'source': 'esp32_help_detection',
-                    'trigger_message': message
-                }
+        if 'help' in triggers:
+            return EmergencyEvent(
+                emergency_type='HELP',
+                level=999,
+                immediate=True,
+                source='esp32_help_detection',
+                trigger_message=message,
+                triggers=triggers['help']
+            )
         
         # ESP32 baseline updates
         if 'BASELINE:' in message or 'ESP32_BASELINE:' in message:
             try:
                 baseline = int(message.split(':')[-1].strip())
-                self.stats['baseline'] = baseline
+                stats['baseline'] = baseline
                 print(f"📊 ESP32 Baseline updated: {baseline}/4095")
             except:
                 pass
@@ -265,116 +530,143 @@ class ESP32EmailIntegration:
                 
                 if level > 1500:  # High threshold for ESP32
                     severity = 'CRITICAL' if level > 3000 else 'HIGH' if level > 2000 else 'MEDIUM'
-                    return {
-                        'type': 'anomaly',
-                        'severity': severity,
-                        'level': level,
-                        'baseline': self.stats.get('baseline', 200),
-                        'difference': level - self.stats.get('baseline', 200),
-                        'timestamp': datetime.now().isoformat(),
-                        'source': 'esp32_adc_reading'
-                    }
+                    return AnomalyEvent(
+                        severity=severity,
+                        level=level,
+                        baseline=stats.get('baseline', 200),
+                        difference=level - stats.get('baseline', 200),
+                        source='esp32_adc_reading',
+                        triggers=triggers.get('anomaly', [])
+                    )
             except:
                 pass
         
         return None
     
-    def _handle_parsed_data(self, data):
-        """Handle parsed message data"""
+    def _handle_parsed_data(self, data, stats=None):
+        """Detect stage: classify parsed message data (runs on a detector worker)"""
+        self.latency.stamp(getattr(data, 'trace', None), HANDLED)
+        stats = stats if stats is not None else self.stats
         data_type = data.get('type')
         
         if 'location' in data:
-            self.stats['location'] = data['location']
+            stats['location'] = data['location']
         
         if data_type == 'emergency':
-            self._handle_emergency(data)
+            self._handle_emergency(data, stats)
         elif data_type == 'anomaly':
-            self._handle_anomaly(data)
+            self._handle_anomaly(data, stats)
         elif data_type == 'status':
-            self._handle_status(data)
+            self._handle_status(data, stats)
     
-    def _handle_emergency(self, data):
+    def _handle_emergency(self, data, stats=None):
         """Handle emergency detection"""
+        stats = stats if stats is not None else self.stats
         self.stats['emergencies_detected'] += 1
+        if stats is not self.stats:
+            stats['emergencies_detected'] += 1
         
         print("\n" + "🚨" * 30)
         print("🚨 EMERGENCY DETECTED - HELP COMMAND!")
         print("🚨" * 30)
         print(f"Type: {data.get('emergency_type', 'HELP')}")
-        print(f"Location: {data.get('location', self.stats['location'])}")
-        print(f"Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        print(f"Location: {data.get('location', stats['location'])}")
+        print(f"Device: {stats['device_id']}")
+        print(f"Time: {event_time(data).strftime('%Y-%m-%d %H:%M:%S')}")
         print(f"Sound Level: {data.get('level', 'Unknown')}/4095")
         print(f"Source: {data.get('source', 'ESP32')}")
         print("🚨" * 30)
         print()
         
-        # Send emergency email
-        emergency_data = {
-            'emergency_type': data.get('emergency_type', 'HELP'),
-            'location': data.get('location', self.stats['location']),
-            'sound_level': data.get('level', 999),
-            'device_id': self.stats['device_id'],
-            'timestamp': data.get('timestamp', datetime.now().isoformat()),
-            'uptime': self._get_uptime(),
-            'contact': EMERGENCY_CONTACT if 'EMERGENCY_CONTACT' in dir() else 'N/A'
-        }
+        # Send emergency email - the event itself, filled in with device context
+        data['device_id'] = stats['device_id']
+        if 'location' not in data:
+            data.location = stats['location']
+        if 'uptime' not in data:
+            data.uptime = self._get_uptime()
         
-        success = self.email_sender.send_emergency_email(emergency_data)
-        
-        if success:
-            print("✓ Emergency email sent successfully!")
-        else:
-            print("✗ Failed to send emergency email")
-        print()
+        self.pipeline.put('notify', ('emergency', data))
     
-    def _handle_anomaly(self, data):
+    def _handle_anomaly(self, data, stats=None):
         """Handle anomaly detection"""
+        stats = stats if stats is not None else self.stats
         severity = data.get('severity', 'MEDIUM').upper()
         
         if HIGH_SEVERITY_ONLY and severity not in ['HIGH', 'CRITICAL']:
             return
         
         self.stats['anomalies_detected'] += 1
+        if stats is not self.stats:
+            stats['anomalies_detected'] += 1
         
         print(f"\n⚠️  SOUND ANOMALY DETECTED - {severity}")
         print(f"Level: {data.get('level', 'Unknown')}/4095")
         print(f"Baseline: {data.get('baseline', 'Unknown')}/4095")
         print(f"Difference: +{data.get('difference', 'Unknown')}")
-        print(f"Location: {data.get('location', self.stats['location'])}")
-        print(f"Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        
-        anomaly_data = {
-            'severity': severity,
-            'level': data.get('level', 0),
-            'baseline': data.get('baseline', self.stats['baseline']),
-            'difference': data.get('difference', 0),
-            'location': data.get('location', self.stats['location']),
-            'device_id': self.stats['device_id'],
-            'timestamp': data.get('timestamp', datetime.now().isoformat()),
-            'uptime': self._get_uptime()
-        }
+        print(f"Location: {data.get('location', stats['location'])}")
+        print(f"Device: {stats['device_id']}")
+        print(f"Time: {event_time(data).strftime('%Y-%m-%d %H:%M:%S')}")
+        
+        data['severity'] = severity
+        data['device_id'] = stats['device_id']
+        if 'baseline' not in data:
+            data.baseline = stats['baseline']
+        if 'location' not in data:
+            data.location = stats['location']
+        if 'uptime' not in data:
+            data.uptime = self._get_uptime()
         
         if severity in ['HIGH', 'CRITICAL']:
-            success = self.email_sender.send_anomaly_email(anomaly_data)
-            if success:
-                print("✓ Anomaly email sent!")
-            else:
-                print("✗ Failed to send anomaly email")
+            # A full outbox drops a queued report for it, never an emergency
+            if not self.pipeline.put('notify', ('anomaly', data), block=False):
+                print("✗ Email queue full - anomaly email skipped")
         else:
             print(f"Severity '{severity}' - logged only, no email")
         print()
     
-    def _handle_status(self, data):
+    def _send_notification(self, kind, data):
+        """Notify stage: send one email (runs on an outbox worker) - False has the outbox retry it"""
+        spool_id = self.pipeline['notify'].current_spool_id()
+        if kind == 'emergency':
+            sent = self.email_sender.send_emergency_email(data, spool_id)
+            if sent:
+                print("✓ Emergency email sent successfully!")
+            elif sent is False:
+                print("✗ Failed to send emergency email")
+        elif kind == 'anomaly':
+            sent = self.email_sender.send_anomaly_email(data, spool_id)
+            if sent:
+                print("✓ Anomaly email sent!")
+            elif sent is False:
+                print("✗ Failed to send anomaly email")
+        elif kind == 'digest':
+            sent = self.email_sender.send_digest_email(*data)
+        elif kind == 'keepalive':
+            sent = self.email_sender.keepalive()
+        else:
+            subject, message, confirmation = data
+            sent = self.email_sender._send_email(subject, message)
+            if sent:
+                print(confirmation)
+        return sent
+    
+    def _queue_digest(self, kind, digests):
+        """A rate-limited device may email again - the digest of its held-back alerts goes to the notifier"""
+        if not self.pipeline.put('notify', ('digest', (kind, digests)), block=False):
+            print(f"✗ Email queue full - {kind} digest skipped")
+    
+    def _handle_status(self, data, stats=None):
         """Handle status messages"""
+        stats = stats if stats is not None else self.stats
         field = data.get('field', '')
         value = data.get('value', '')
         
         if field == 'ready':
-            print("✓ ESP32 ready and monitoring")
-            self.stats['esp32_ready'] = True
+            print(f"✓ ESP32 {stats['device_id']} ready and monitoring")
+            stats['esp32_ready'] = True
         elif field == 'baseline':
             try:
-                self.stats['baseline'] = int(value)
+                stats['baseline'] = int(value)
                 print(f"📊 ESP32 Baseline: {value}/4095")
             except:
                 pass
@@ -392,8 +684,7 @@ class ESP32EmailIntegration:
             high_severity_only=HIGH_SEVERITY_ONLY
         )
         
-        if self.email_sender._send_email(subject, message):
-            print("✓ Startup notification email sent\n")
+        self.pipeline.put('notify', ('report', (subject, message, "✓ Startup notification email sent\n")))
     
     def _send_daily_report(self):
         """Send daily status report"""
@@ -412,6 +703,7 @@ class ESP32EmailIntegration:
             emergencies_detected=self.stats['emergencies_detected'],
             anomalies_detected=self.stats['anomalies_detected'],
             total_emails=self.email_sender.emergency_count + self.email_sender.anomaly_count,
+            latency='\n'.join(f"- {line}" for line in self.latency.format_lines()),
             emergency_emails=self.email_sender.emergency_count,
             anomaly_emails=self.email_sender.anomaly_count,
             baseline=self.stats['baseline'],
@@ -420,8 +712,9 @@ class ESP32EmailIntegration:
             high_severity_only=HIGH_SEVERITY_ONLY
         )
         
-        if self.email_sender._send_email(subject, message):
-            print("✓ Daily status report sent")
+        # Runs on the scheduler - never wait for room behind queued alerts
+        if not self.pipeline.put('notify', ('report', (subject, message, "✓ Daily status report sent")), block=False):
+            print("✗ Email queue full - daily status report skipped")
     
     def _show_stats(self):
         """Show statistics"""
@@ -430,9 +723,15 @@ class ESP32EmailIntegration:
               f"{self.stats['emergencies_detected']} emergencies, "
               f"{self.stats['anomalies_detected']} anomalies | "
               f"Emails: {self.email_sender.emergency_count} emergency, "
-              f"{self.email_sender.anomaly_count} anomaly | "
+              f"{self.email_sender.anomaly_count} anomaly, {self.email_sender.digest_count} digest | "
               f"Uptime: {uptime}")
     
+    def _show_new_stats(self):
+        """Show statistics if messages arrived since they were last shown"""
+        if self.stats['messages_processed'] != self.stats_shown_at:
+            self.stats_shown_at = self.stats['messages_processed']
+            self._show_stats()
+    
     def _show_current_status(self):
         """Show current status"""
         uptime = self._get_uptime()
@@ -442,7 +741,31 @@ class ESP32EmailIntegration:
         print(f"   Uptime: {uptime}")
         print(f"   Messages: {self.stats['messages_processed']}")
         print(f"   Emergencies: {self.stats['emergencies_detected']}")
-        print(f"   Anomalies: {self.stats['anomalies_detected']}\n")
+        print(f"   Anomalies: {self.stats['anomalies_detected']}")
+        queue_stats = self.esp32.get_queue_stats()
+        print(f"   Ingest queue: {queue_stats['depth']}/{queue_stats['maxsize']} "
+              f"(high-water {queue_stats['high_water']}, dropped {queue_stats['dropped']}, "
+              f"overflow {queue_stats['overflow']})")
+        self._show_pipeline_status()
+        self._show_latency()
+        print()
+    
+    def _show_pipeline_status(self):
+        """Queue depth and service time of every pipeline stage"""
+        print("   Pipeline:")
+        for line in self.pipeline.format_metrics():
+            print(f"     {line}")
+        print(f"     {self.email_sender.limiter.format_line()}")
+        if self.spool:
+            print(f"     {self.spool.format_line()}")
+    
+    def _show_latency(self):
+        """Latency percentiles of every traced span, serial line to email accepted"""
+        print("   Latency:")
+        for line in self.latency.format_lines():
+            print(f"     {line}")
+        for line in self.email_sender.smtp_pool.format_lines():
+            print(f"     {line}")
     
     def _get_uptime(self):
         """Get formatted uptime"""
@@ -460,23 +783,16 @@ class ESP32EmailIntegration:
                 
                 if cmd == 'test_emergency':
                     print("🧪 Simulating HELP detection...")
-                    self._handle_emergency({
-                        'type': 'emergency',
-                        'emergency_type': 'HELP',
-                        'level': 999,
-                        'timestamp': datetime.now().isoformat()
-                    })
+                    self._handle_emergency(EmergencyEvent(emergency_type='HELP', level=999))
                 
                 elif cmd == 'test_anomaly':
                     print("🧪 Simulating HIGH anomaly...")
-                    self._handle_anomaly({
-                        'type': 'anomaly',
-                        'severity': 'HIGH',
-                        'level': 2500,
-                        'baseline': self.stats['baseline'],
-                        'difference': 2500 - self.stats['baseline'],
-                        'timestamp': datetime.now().isoformat()
-                    })
+                    self._handle_anomaly(AnomalyEvent(
+                        severity='HIGH',
+                        level=2500,
+                        baseline=self.stats['baseline'],
+                        difference=2500 - self.stats['baseline']
+                    ))
                 
                 elif cmd == 'status':
                     self._show_current_status()
@@ -496,12 +812,20 @@ class ESP32EmailIntegration:
         """Handle Ctrl+C"""
         print("\n🛑 Shutdown requested...")
         self.running = False
+        self.esp32.stop_reading()
+        if self.hub:
+            self.hub.wake()
     
     def _cleanup(self):
         """Cleanup and shutdown"""
         print("\n🔄 Shutting down...")
         self.running = False
         
+        # Let queued events and emails go out before the shutdown email; digests still
+        # collecting are sent inline by the stopped notifier
+        self.pipeline.stop()
+        self.email_sender.flush_digests()
+        
         # Send shutdown email
         subject = SHUTDOWN_SUBJECT.format(location=self.stats['location'])
         message = SHUTDOWN_TEMPLATE.format(
@@ -520,8 +844,13 @@ class ESP32EmailIntegration:
             print("✓ Shutdown notification sent")
         except:
             pass
+        self.email_sender.close()
+        if self.spool:
+            self.spool.close()
         
         self.esp32.disconnect()
+        if self.recorder:
+            self.recorder.close()
         self._show_stats()
         print("\n✓ ESP32 integration stopped\n")
 
@@ -533,6 +862,26 @@ def main():
             sender = EmailSender()
             if sender.test_connection() and sender.send_test_email():
                 print("✓ Email test successful!")
+            sender.close()
+            return
+        
+        elif sys.argv[1] == 'hub':
+            integration = ESP32EmailIntegration()
+            integration.run_hub()
+            return
+        
+        elif sys.argv[1] == 'async':
+            integration = ESP32EmailIntegration()
+            asyncio.run(integration.run_async())
+            return
+        
+        elif sys.argv[1] == 'replay':
+            if len(sys.argv) < 3:
+                print("Usage: python main.py replay <session file> [speed|max]")
+                return
+            speed = sys.argv[3] if len(sys.argv) > 3 else '1'
+            integration = ESP32EmailIntegration()
+            integration.run_replay(sys.argv[2], None if speed == 'max' else float(speed))
             return
         
         elif sys.argv[1] == 'help':
@@ -542,6 +891,10 @@ ESP32 Sound Detector Email Integration
 Usage:
   python main_esp32.py        - Run integration
   python main_esp32.py test   - Test email
+  python main_esp32.py async  - Run integration on asyncio (no reader thread)
+  python main_esp32.py hub    - Monitor every port in DEVICE_PORTS at once
+  python main_esp32.py replay <file> [speed|max]
+                              - Replay a recorded session (1 = real time)
   python main_esp32.py help   - Show help
 
 ESP32 Features:
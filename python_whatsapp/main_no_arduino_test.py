@@ -11,14 +11,23 @@ import signal
 from datetime import datetime
 from arduino_reader import ArduinoReader
 from message_parser import ArduinoMessageParser
+from block_assembler import BlockAssembler
 from email_sender import EmailSender
+from digest import HELD_BACK
+from scheduler import Scheduler
 from config import *
 
 class ArduinoEmailIntegration:
     def __init__(self):
-        self.arduino = ArduinoReader(ARDUINO_PORT, BAUDRATE, SERIAL_TIMEOUT)
-        self.parser = ArduinoMessageParser()
-        self.email_sender = EmailSender()
+        self.arduino = ArduinoReader(ARDUINO_PORT, BAUDRATE, SERIAL_TIMEOUT,
+                                     queue_size=INGEST_QUEUE_SIZE,
+                                     never_drop_prefixes=INGEST_NEVER_DROP,
+                                     drop_policy=INGEST_DROP_POLICY,
+                                     priority_prefixes=INGEST_PRIORITY_PREFIXES)
+        # Block deadlines share the loop's scheduler, so a cut-off EMERGENCY block still alerts
+        self.scheduler = Scheduler()
+        self.parser = ArduinoMessageParser(BlockAssembler(BLOCK_TIMEOUT, BLOCK_MAX_FIELDS, wheel=self.scheduler))
+        self.email_sender = EmailSender(scheduler=self.scheduler)
         self.running = False
         self.stats = {
             'messages_processed': 0,
@@ -137,6 +146,11 @@ class ArduinoEmailIntegration:
         input_thread = threading.Thread(target=self._input_handler, daemon=True)
         input_thread.start()
         
+        # Show status every 30 seconds
+        self.scheduler.every(30, self._show_periodic_status)
+        # Keep the SMTP session logged in for the next alert
+        self.scheduler.every(SMTP_KEEPALIVE, self.email_sender.keepalive)
+        
         try:
             while self.running:
                 # Try to reconnect Arduino if disconnected
@@ -150,10 +164,8 @@ class ArduinoEmailIntegration:
                         time.sleep(10)
                         continue
                 
-                # Get message from Arduino
-                message = self.arduino.get_message(timeout=1.0)
-                
-                if message:
+                # Drain every buffered Arduino line - waits until the next timer only when idle
+                for message in self.arduino.get_messages(INGEST_BATCH_SIZE, timeout=self.scheduler.wait_timeout()):
                     print(f"📨 Arduino: {message}")
                     self.stats['messages_processed'] += 1
                     
@@ -181,10 +193,8 @@ class ArduinoEmailIntegration:
                         elif parsed['type'] == 'status':
                             self._handle_status(parsed)
                     
-                # Show periodic status
-                self._show_periodic_status()
-                
-                time.sleep(0.1)  # Small delay to prevent excessive CPU usage
+                # Run due timers (periodic status, rate-limit digests, block deadlines)
+                self._sweep_blocks()
                 
         except KeyboardInterrupt:
             print("\n🛑 Shutdown requested by user")
@@ -193,6 +203,15 @@ class ArduinoEmailIntegration:
         finally:
             self.shutdown()
     
+    def _sweep_blocks(self):
+        """Run due scheduler tasks and handle EMERGENCY blocks cut off before their END line"""
+        for _, event in self.parser.sweep():
+            print(f"⚠️  Incomplete {event.type} block - handling the fields received")
+            if event.type == 'emergency':
+                self._handle_emergency(event)
+            elif event.type == 'anomaly':
+                self._handle_anomaly(event)
+    
     def _input_handler(self):
         """Handle manual test commands from user input"""
         try:
@@ -387,6 +406,8 @@ class ArduinoEmailIntegration:
             
             if success:
                 print("   ✅ Emergency email sent successfully!")
+            elif success is HELD_BACK:
+                print("   ⏱️ Emergency email held back by the rate limit - added to the digest")
             else:
                 print("   ❌ Failed to send emergency email")
                 
@@ -426,6 +447,8 @@ class ArduinoEmailIntegration:
             
             if success:
                 print("   ✅ Anomaly email sent successfully!")
+            elif success is HELD_BACK:
+                print("   ⏱️ Anomaly email held back by the rate limit - added to the digest")
             else:
                 print("   ❌ Failed to send anomaly email")
                 
@@ -442,21 +465,14 @@ class ArduinoEmailIntegration:
     
     def _show_periodic_status(self):
         """Show periodic status updates"""
-        current_time = time.time()
-        if not hasattr(self, '_last_status_time'):
-            self._last_status_time = current_time
-        
-        # Show status every 30 seconds
-        if current_time - self._last_status_time > 30:
-            uptime = self._get_uptime()
-            print(f"\n📈 System Status:")
-            print(f"   Uptime: {uptime}")
-            print(f"   Messages: {self.stats['messages_processed']}")
-            print(f"   Emergencies: {self.stats['emergencies_detected']}")
-            print(f"   Anomalies: {self.stats['anomalies_detected']}")
-            print(f"   Arduino: {'✅ Connected' if self.arduino.is_connected else '❌ Disconnected'}")
-            print()
-            self._last_status_time = current_time
+        uptime = self._get_uptime()
+        print(f"\n📈 System Status:")
+        print(f"   Uptime: {uptime}")
+        print(f"   Messages: {self.stats['messages_processed']}")
+        print(f"   Emergencies: {self.stats['emergencies_detected']}")
+        print(f"   Anomalies: {self.stats['anomalies_detected']}")
+        print(f"   Arduino: {'✅ Connected' if self.arduino.is_connected else '❌ Disconnected'}")
+        print()
     
     def _get_uptime(self):
         """Get system uptime as formatted string"""
@@ -470,6 +486,7 @@ class ArduinoEmailIntegration:
         """Handle shutdown signals"""
         print("\n🛑 Shutdown signal received")
         self.running = False
+        self.arduino.wake()
     
     def shutdown(self):
         """Clean shutdown"""
@@ -478,6 +495,7 @@ class ArduinoEmailIntegration:
         
         if self.arduino:
             self.arduino.disconnect()
+        self.email_sender.close()
         
         # Final stats
         uptime = self._get_uptime()
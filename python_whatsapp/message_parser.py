@@ -1,143 +1,92 @@
-from datetime import datetime
+from block_assembler import BlockAssembler
+from events import EVENT_TYPES, StatusEvent, from_dict
+from protocol_spec import (BLOCKS, BLOCK_END, BLOCK_FIELD, BLOCK_START, STATUS,
+                           compile_line_table)
+
+# CATEGORY -> FIELD -> (kind, category, keys, converter), built once from protocol_spec
+LINE_TABLE = compile_line_table()
 
 class ArduinoMessageParser:
-    def __init__(self):
-        self.in_emergency_block = False
-        self.in_alert_block = False
-        self.current_emergency = {}
-        self.current_alert = {}
+    def __init__(self, assembler=None):
+        # Open START...END blocks, per device and category
+        self.assembler = assembler if assembler is not None else BlockAssembler()
+        self.block_events = {category: EVENT_TYPES[block['type']] for category, block in BLOCKS.items()}
     
-    def parse_message(self, message):
+    def parse_message(self, message, device=None):
         """Parse a single message line from Arduino"""
-        message = message.strip()
-        
-        if not message:
-            return None
-        
-        # Handle immediate emergency detection - this should trigger immediately
-        if message == "EMERGENCY:HELP_DETECTED":
-            return {
-                'type': 'emergency',
-                'emergency_type': 'HELP',
-                'subtype': 'help_detected_immediate',
-                'timestamp': datetime.now().isoformat(),
-                'immediate': True,
-                'level': 999  # High priority
-            }
+        return self.parse_line(message.strip(), device)
+    
+    def parse_bytes(self, raw, device=None):
+        """Parse a raw serial line (bytes, already stripped by the reader)
         
-        # Handle emergency block start/end
-        elif message == "EMERGENCY:START":
-            self.in_emergency_block = True
-            self.current_emergency = {
-                'type': 'emergency',
-                'timestamp': datetime.now().isoformat()
-            }
-            return None
+        The line is decoded exactly once and then parsed in a single pass.
+        Decoding short ASCII lines is cheaper in CPython than running the
+        prefix/field searches on bytes, where every method call pays for
+        buffer-protocol argument handling.
+        """
+        return self.parse_line(raw.decode('utf-8', errors='ignore'), device)
+    
+    def parse_line(self, message, device=None):
+        """Parse an already stripped line with one split and two table lookups
         
-        elif message == "EMERGENCY:END":
-            if self.in_emergency_block:
-                self.in_emergency_block = False
-                result = self.current_emergency.copy()
-                self.current_emergency = {}
-                return result
+        CATEGORY and FIELD select the protocol_spec entry; anything after
+        the second ':' is the value. device keys the open blocks, so one
+        parser can serve interleaved lines from many boards.
+        """
+        parts = message.split(':', 2)
+        fields = LINE_TABLE.get(parts[0])
+        if fields is None or len(parts) == 1:
             return None
+        entry = fields.get(parts[1])
+        if entry is None:
+            return self._parse_unlisted(parts, device)
         
-        # Handle alert block start/end
-        elif message == "ALERT:START":
-            self.in_alert_block = True
-            self.current_alert = {
-                'type': 'anomaly',
-                'timestamp': datetime.now().isoformat()
-            }
-            return None
+        kind, category, keys, converter = entry
+        if kind is STATUS:
+            return StatusEvent(keys[0], parts[2] if len(parts) == 3 else '')
         
-        elif message == "ALERT:END":
-            if self.in_alert_block:
-                self.in_alert_block = False
-                result = self.current_alert.copy()
-                self.current_alert = {}
-                return result
+        if kind is BLOCK_FIELD:
+            block = self.assembler.field(device, category)
+            if block is not None:
+                value = parts[2] if len(parts) == 3 else ''
+                if converter is not None:
+                    value = converter(value)
+                for key in keys:
+                    setattr(block, key, value)
             return None
         
-        # Parse data fields within blocks
-        elif ":" in message:
-            return self._parse_data_field(message)
+        if len(parts) == 3:
+            return None  # START/END/event lines never carry a value
         
-        return None
-    
-    def _parse_data_field(self, message):
-        """Parse data fields like EMERGENCY:LOCATION:Home Office"""
-        parts = message.split(":", 2)
-        
-        if len(parts) < 2:
+        if kind is BLOCK_START:
+            self.assembler.open(device, category, self.block_events[category]())
             return None
         
-        category = parts[0]
-        field = parts[1]
-        value = parts[2] if len(parts) > 2 else ""
-        
-        # Handle emergency data
-        if category == "EMERGENCY" and self.in_emergency_block:
-            field_lower = field.lower()
-            
-            if field_lower == 'id':
-                self.current_emergency['emergency_id'] = value
-            elif field_lower == 'timestamp':
-                self.current_emergency['arduino_timestamp'] = value
-            elif field_lower == 'type':
-                self.current_emergency['emergency_type'] = value
-                self.current_emergency['subtype'] = value
-            elif field_lower == 'sound_level':
-                try:
-                    self.current_emergency['level'] = int(value)
-                except:
-                    self.current_emergency['level'] = value
-            elif field_lower == 'location':
-                self.current_emergency['location'] = value
-            elif field_lower == 'uptime':
-                self.current_emergency['uptime'] = value
-            elif field_lower == 'message':
-                self.current_emergency['message'] = value
-            elif field_lower == 'contact':
-                self.current_emergency['emergency_contact'] = value
+        if kind is BLOCK_END:
+            return self.assembler.close(device, category)
         
-        # Handle alert data
-        elif category == "ALERT" and self.in_alert_block:
-            field_lower = field.lower()
-            
-            if field_lower == 'id':
-                self.current_alert['alert_id'] = value
-            elif field_lower == 'timestamp':
-                self.current_alert['arduino_timestamp'] = value
-            elif field_lower == 'level':
-                try:
-                    self.current_alert['level'] = int(value)
-                except:
-                    self.current_alert['level'] = value
-            elif field_lower == 'baseline':
-                try:
-                    self.current_alert['baseline'] = int(value)
-                except:
-                    self.current_alert['baseline'] = value
-            elif field_lower == 'difference':
-                try:
-                    self.current_alert['difference'] = int(value)
-                except:
-                    self.current_alert['difference'] = value
-            elif field_lower == 'severity':
-                self.current_alert['severity'] = value
-            elif field_lower == 'location':
-                self.current_alert['location'] = value
-            elif field_lower == 'uptime':
-                self.current_alert['uptime'] = value
+        # Immediate event (EMERGENCY:HELP_DETECTED) - converter holds the template
+        return from_dict(converter)
+    
+    def _parse_unlisted(self, parts, device):
+        """Fields the spec does not list: unknown STATUS fields and lower-case block fields"""
+        category, field = parts[0], parts[1]
+        value = parts[2] if len(parts) == 3 else ''
         
-        # Handle status messages
-        elif category == "STATUS":
-            return {
-                'type': 'status',
-                'field': field.lower(),
-                'value': value,
-                'timestamp': datetime.now().isoformat()
-            }
+        if category == 'STATUS':
+            return StatusEvent(field.lower(), value)
         
-        return None
\ No newline at end of file
+        entry = LINE_TABLE[category].get(field.upper())
+        if entry is not None and entry[0] is BLOCK_FIELD:
+            block = self.assembler.field(device, category)
+            if block is not None:
+                _, _, keys, converter = entry
+                if converter is not None:
+                    value = converter(value)
+                for key in keys:
+                    setattr(block, key, value)
+        return None
+    
+    def sweep(self, now=None):
+        """[(device, incomplete event)] for blocks that never saw their END line"""
+        return self.assembler.sweep(now)
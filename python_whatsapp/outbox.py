@@ -0,0 +1,229 @@
+"""
+Notification outbox - prioritised, retried email delivery
+Handlers put an alert and return at once. The outbox's workers always take
+the most urgent alert queued (emergency, then anomaly, then report and
+status emails). A delivery that fails is retried with exponential backoff
+until it succeeds, runs out of attempts or passes its kind's deadline.
+When the outbox is full, a new alert takes the place of the least urgent
+queued alert behind it, so an emergency never waits on anomaly mail.
+
+The handler's result decides what happens: False (or an exception) means
+the send failed and is retried. True, None for an alert that was
+declined on purpose (below threshold) or HELD_BACK for one folded into a
+rate-limit digest means it is done.
+
+With an AlertSpool attached, spooled kinds are written to disk when queued
+and marked delivered when done; replay() queues what a previous run left.
+A HELD_BACK alert is the exception: its row stays pending until the digest
+that carries it is spooled.
+"""
+
+import heapq
+import itertools
+import queue
+import threading
+import time
+from digest import HELD_BACK
+from pipeline import Stage, STOP
+
+# Lower goes first; kinds not listed (keepalive) go last
+PRIORITIES = {'emergency': 0, 'anomaly': 1, 'digest': 1, 'report': 2}
+LOWEST = 3
+
+class Alert:
+    """One queued delivery: the stage item (kind, data) plus its retry state"""
+
+    __slots__ = ('item', 'priority', 'deadline', 'attempts', 'spool_id')
+
+    def __init__(self, item, priority, deadline=None, spool_id=None):
+        self.item = item
+        self.priority = priority
+        self.deadline = deadline   # time.monotonic() after which it is given up
+        self.attempts = 0
+        self.spool_id = spool_id   # row in the alert spool, None if not spooled
+
+    @property
+    def kind(self):
+        return self.item[0]
+
+class AlertQueue:
+    """Bounded queue.Queue stand-in for the outbox workers
+
+    get() returns the most urgent ready alert; alerts waiting out a retry
+    backoff become ready when due. After close() every held retry is ready
+    at once and get() returns STOP when nothing is left.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.ready = []      # heap of (priority, seq, alert)
+        self.delayed = []    # heap of (due, seq, alert)
+        self.seq = itertools.count()
+        self.lock = threading.Lock()
+        self.not_empty = threading.Condition(self.lock)
+        self.not_full = threading.Condition(self.lock)
+        self.closed = False
+        self.evicted = 0
+
+    def qsize(self):
+        with self.lock:
+            return len(self.ready) + len(self.delayed)
+
+    def put(self, alert, block=True):
+        """Queue alert; when full, drop a less urgent queued alert or wait (queue.Full if not block)"""
+        with self.lock:
+            while len(self.ready) + len(self.delayed) >= self.maxsize:
+                if self._evict(alert.priority):
+                    break
+                if not block:
+                    raise queue.Full
+                self.not_full.wait()
+            heapq.heappush(self.ready, (alert.priority, next(self.seq), alert))
+            self.not_empty.notify()
+
+    def _evict(self, priority):
+        # The newest alert of the least urgent kind, if it is less urgent than priority
+        entries = self.ready + [(alert.priority, seq, alert) for _, seq, alert in self.delayed]
+        if not entries:
+            return False
+        worst = max(entries, key=lambda entry: entry[:2])
+        if worst[0] <= priority:
+            return False
+        self.ready = [entry for entry in self.ready if entry[1] != worst[1]]
+        self.delayed = [entry for entry in self.delayed if entry[1] != worst[1]]
+        heapq.heapify(self.ready)
+        heapq.heapify(self.delayed)
+        self.evicted += 1
+        print(f"✗ Outbox full - queued {worst[2].kind} alert dropped for a more urgent one")
+        return True
+
+    def retry(self, alert, delay):
+        """Hold alert for delay seconds - retries may overfill the queue, they were already in it"""
+        with self.lock:
+            heapq.heappush(self.delayed, (time.monotonic() + delay, next(self.seq), alert))
+            self.not_empty.notify()
+
+    def get(self):
+        with self.lock:
+            while True:
+                self._release_due()
+                if self.ready:
+                    alert = heapq.heappop(self.ready)[2]
+                    self.not_full.notify()
+                    return alert
+                if self.closed and not self.delayed:
+                    return STOP
+                timeout = self.delayed[0][0] - time.monotonic() if self.delayed else None
+                self.not_empty.wait(timeout)
+
+    def _release_due(self):
+        now = time.monotonic()
+        while self.delayed and (self.closed or self.delayed[0][0] <= now):
+            _, seq, alert = heapq.heappop(self.delayed)
+            heapq.heappush(self.ready, (alert.priority, seq, alert))
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            self.not_empty.notify_all()
+
+    def drain(self):
+        """Take every alert left, most urgent first"""
+        with self.lock:
+            self.closed = True
+            self._release_due()
+            alerts = [heapq.heappop(self.ready)[2] for _ in range(len(self.ready))]
+            self.not_full.notify_all()
+            return alerts
+
+class Outbox(Stage):
+    """Pipeline stage delivering (kind, data) alerts by priority with retries and deadlines"""
+
+    def __init__(self, name, handler=None, workers=1, maxsize=256, retries=8,
+                 backoff=2.0, max_backoff=60.0, deadlines=None, spool=None):
+        super().__init__(name, handler, workers, maxsize)
+        self.queue = AlertQueue(maxsize) if workers else None
+        self.retries = retries          # attempts after the first one
+        self.backoff = backoff          # seconds before the first retry, doubled after each
+        self.max_backoff = max_backoff
+        self.deadlines = deadlines or {}  # kind -> seconds an alert may stay undelivered
+        self.spool = spool                # AlertSpool, optional
+        self.current = threading.local()  # the alert each worker is delivering
+        self.stopping = False
+        self.retried = 0
+        self.failed = 0
+        self.expired = 0
+
+    def put(self, item, block=True, spool_id=None):
+        """Queue (kind, data); returns False if block is False and nothing less urgent can make room"""
+        kind = item[0]
+        if spool_id is None and self.spool is not None and kind in self.spool.kinds:
+            spool_id = self.spool.add(kind, item[1])
+        seconds = self.deadlines.get(kind)
+        deadline = time.monotonic() + seconds if seconds is not None else None
+        return super().put(Alert(item, PRIORITIES.get(kind, LOWEST), deadline, spool_id), block)
+
+    def replay(self):
+        """Queue every alert the spool still holds from an earlier run; returns how many"""
+        pending = self.spool.pending() if self.spool is not None else []
+        for spool_id, kind, data in pending:
+            self.put((kind, data), spool_id=spool_id)
+        return len(pending)
+
+    def _run(self, alert):
+        """Deliver one alert; a failure is retried after a backoff while attempts and deadline allow"""
+        if alert.deadline is not None and time.monotonic() > alert.deadline:
+            self._count('expired')
+            print(f"✗ {alert.kind} alert expired undelivered after {alert.attempts} attempt(s)")
+            return
+        if alert.spool_id is not None and not alert.attempts:
+            self.spool.commit(alert.spool_id)  # on disk before the first send
+        alert.attempts += 1
+        self.current.alert = alert
+        try:
+            result = super()._run(alert.item)
+        finally:
+            self.current.alert = None
+        if result is not False:
+            if alert.spool_id is not None and result is not HELD_BACK:
+                self.spool.delivered(alert.spool_id)
+            return
+        delay = min(self.backoff * 2 ** (alert.attempts - 1), self.max_backoff)
+        retry = (self.threads and not self.stopping and alert.attempts <= self.retries
+                 and (alert.deadline is None or time.monotonic() + delay <= alert.deadline))
+        if not retry:
+            self._count('failed')
+            print(f"✗ {alert.kind} alert undelivered after {alert.attempts} attempt(s)")
+            return
+        self._count('retried')
+        print(f"⚠️  {alert.kind} delivery failed - attempt {alert.attempts + 1} in {delay:.0f}s")
+        self.queue.retry(alert, delay)
+
+    def current_spool_id(self):
+        """Spool row of the alert the calling worker is delivering - for a digest to take it over"""
+        alert = getattr(self.current, 'alert', None)
+        return alert.spool_id if alert is not None else None
+
+    def _count(self, name):
+        with self.lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def stop(self, timeout=5.0):
+        """Deliver everything queued - alerts waiting out a backoff get one last attempt now"""
+        self.stopping = True
+        if self.queue is None:
+            return
+        self.queue.close()
+        for thread in self.threads:
+            thread.join(timeout)
+        self.threads = []
+        for alert in self.queue.drain():
+            self._run(alert)
+
+    def metrics(self):
+        metrics = super().metrics()
+        with self.lock:
+            metrics.update(retried=self.retried, failed=self.failed, expired=self.expired)
+        if self.queue is not None:
+            metrics['dropped'] += self.queue.evicted
+        return metrics
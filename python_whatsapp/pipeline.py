@@ -0,0 +1,175 @@
+"""
+Staged processing pipeline for the integration loops
+Each stage has its own bounded queue and worker threads, so a slow stage
+(an SMTP login in the notifier) backs up only its own queue instead of
+stalling reading, parsing and detection. Every stage keeps its queue
+depth and service time for the status printout.
+"""
+
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+STOP = object()  # queued once per worker by stop()
+
+class Stage:
+    """One pipeline step: handler(*item) runs for every item on one of `workers` threads
+
+    A stage with workers=0, or one that is not started, runs handler on the
+    caller's thread - the parse stage is the loop itself and only uses timed().
+    """
+
+    def __init__(self, name, handler=None, workers=1, maxsize=256):
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.maxsize = maxsize
+        self.queue = queue.Queue(maxsize) if workers else None
+        self.threads = []
+        self.lock = threading.Lock()
+
+        # Counters for the status printout
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.high_water = 0
+        self.busy = 0.0          # seconds spent in handler
+        self.max_service = 0.0   # slowest item (batch average for timed())
+
+    def start(self):
+        if self.threads:
+            return self
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"{self.name}-{index}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        return self
+
+    def put(self, item, block=True):
+        """Queue an item; returns False if block is False and the queue is full"""
+        if not self.threads:
+            self._run(item)
+            return True
+        try:
+            self.queue.put(item, block)
+        except queue.Full:
+            with self.lock:
+                self.dropped += 1
+            return False
+        depth = self.queue.qsize()
+        if depth > self.high_water:
+            self.high_water = depth
+        return True
+
+    def _work(self):
+        get = self.queue.get
+        while True:
+            item = get()
+            if item is STOP:
+                break
+            self._run(item)
+
+    def _run(self, item):
+        """handler(*item) - returns its result, False if it raised"""
+        started = time.perf_counter()
+        result = False
+        try:
+            result = self.handler(*item)
+        except Exception as e:
+            with self.lock:
+                self.errors += 1
+            print(f"✗ {self.name} stage error: {e}")
+        self._record(1, time.perf_counter() - started)
+        return result
+
+    @contextmanager
+    def timed(self, count):
+        """Count count items handled inline by the with-block"""
+        started = time.perf_counter()
+        yield
+        if count:
+            self._record(count, time.perf_counter() - started)
+
+    def _record(self, count, elapsed):
+        with self.lock:
+            self.processed += count
+            self.busy += elapsed
+            if elapsed / count > self.max_service:
+                self.max_service = elapsed / count
+
+    def stop(self, timeout=5.0):
+        """Let the workers finish everything queued, then end them"""
+        for _ in self.threads:
+            self.queue.put(STOP)
+        for thread in self.threads:
+            thread.join(timeout)
+        self.threads = []
+        # Items queued behind the STOP markers run here instead of being lost
+        while self.queue is not None:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not STOP:
+                self._run(item)
+
+    def metrics(self):
+        with self.lock:
+            return {
+                'workers': self.workers if self.queue else 'inline',
+                'depth': self.queue.qsize() if self.queue else 0,
+                'maxsize': self.maxsize if self.queue else 0,
+                'high_water': self.high_water,
+                'processed': self.processed,
+                'dropped': self.dropped,
+                'errors': self.errors,
+                'mean_ms': self.busy / self.processed * 1000 if self.processed else 0.0,
+                'max_ms': self.max_service * 1000,
+            }
+
+class Pipeline:
+    """Named stages in upstream-to-downstream order"""
+
+    def __init__(self):
+        self.stages = {}
+
+    def add(self, name, handler=None, workers=1, maxsize=256):
+        return self.add_stage(Stage(name, handler, workers, maxsize))
+
+    def add_stage(self, stage):
+        """Append a ready-made stage (a Stage subclass such as the outbox)"""
+        self.stages[stage.name] = stage
+        return stage
+
+    def __getitem__(self, name):
+        return self.stages[name]
+
+    def put(self, name, item, block=True):
+        return self.stages[name].put(item, block)
+
+    def start(self):
+        for stage in self.stages.values():
+            stage.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        """Drain and stop upstream first so its last items still reach the next stage"""
+        for stage in self.stages.values():
+            stage.stop(timeout)
+
+    def metrics(self):
+        return {name: stage.metrics() for name, stage in self.stages.items()}
+
+    def format_metrics(self):
+        """One status line per stage"""
+        lines = []
+        for name, metrics in self.metrics().items():
+            # Counters only some stages keep (the outbox's retries)
+            extra = ''.join(f" {key}={metrics[key]}" for key in ('retried', 'failed', 'expired') if key in metrics)
+            lines.append(f"{name:<8} workers={metrics['workers']} "
+                         f"depth={metrics['depth']}/{metrics['maxsize']} "
+                         f"high-water={metrics['high_water']} processed={metrics['processed']} "
+                         f"dropped={metrics['dropped']} errors={metrics['errors']}{extra} "
+                         f"service={metrics['mean_ms']:.3f}ms avg/{metrics['max_ms']:.1f}ms max")
+        return lines
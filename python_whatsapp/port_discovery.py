@@ -0,0 +1,118 @@
+"""
+Parallel ESP32 port discovery
+Probes every candidate serial port at the same time and fingerprints the
+ESP32 sound detector by its startup banner
+"""
+
+import threading
+import time
+import serial
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from arduino_reader import LineBuffer
+
+# Lines printed by sound_detector.ino during setup()
+ESP32_BANNERS = ('STATUS:DEVICE_TYPE:ESP32', 'STATUS:READY')
+
+def candidate_ports(configured_port=None, alternative_ports=()):
+    """Ports the OS reports plus the configured fallbacks, without duplicates"""
+    ports = []
+    if configured_port:
+        ports.append(configured_port)
+
+    try:
+        from serial.tools import list_ports
+        for info in list_ports.comports():
+            if info.device not in ports:
+                ports.append(info.device)
+    except Exception as e:
+        print(f"Port listing unavailable: {e}")
+
+    for port in alternative_ports:
+        if port not in ports:
+            ports.append(port)
+    return ports
+
+def probe_port(port, baudrate, banner_timeout, found=None):
+    """Open one port and wait for an ESP32 banner line
+
+    Returns a dict with the still-open connection, the banner lines read
+    so far and the line buffer holding any partial line, or None when the
+    port cannot be opened or stays silent. Gives up early once `found`
+    is set by another probe.
+    """
+    try:
+        connection = serial.Serial(port=port, baudrate=baudrate, timeout=0.1)
+    except (serial.SerialException, OSError, ValueError):
+        return None
+
+    line_buffer = LineBuffer()
+    banner = []
+    deadline = time.monotonic() + banner_timeout
+
+    try:
+        while time.monotonic() < deadline:
+            if found is not None and found.is_set():
+                break
+
+            data = connection.read(connection.in_waiting or 1)
+            lines = [line.decode('utf-8', errors='ignore') for line in line_buffer.feed(data)]
+            # Lines that came in the same read as the banner are kept too
+            banner.extend(lines)
+            if any(line.startswith(ESP32_BANNERS) for line in lines):
+                return {
+                    'port': port,
+                    'connection': connection,
+                    'banner': banner,
+                    'line_buffer': line_buffer,
+                    'elapsed': banner_timeout - (deadline - time.monotonic())
+                }
+    except (serial.SerialException, OSError):
+        pass
+
+    connection.close()
+    return None
+
+def discover_esp32(ports, baudrate=115200, banner_timeout=6.0):
+    """Probe all ports concurrently and return the first ESP32 found (or None)
+
+    Total cost is one banner timeout no matter how many ports are tried.
+    Losing probes close their ports; the winner's connection stays open
+    so the board is not reset a second time.
+    """
+    if not ports:
+        return None
+
+    found = threading.Event()
+    winner = None
+
+    with ThreadPoolExecutor(max_workers=len(ports), thread_name_prefix='probe') as pool:
+        futures = [pool.submit(probe_port, port, baudrate, banner_timeout, found) for port in ports]
+        for future in as_completed(futures):
+            result = future.result()
+            if not result:
+                continue
+            if winner is None:
+                winner = result
+                found.set()
+            else:
+                result['connection'].close()
+
+    return winner
+
+def main():
+    """List candidate ports and report which one is an ESP32"""
+    from config import ARDUINO_PORT, ALTERNATIVE_PORTS, BAUDRATE, DISCOVERY_BANNER_TIMEOUT
+
+    ports = candidate_ports(ARDUINO_PORT, ALTERNATIVE_PORTS)
+    print(f"Probing {len(ports)} port(s) in parallel: {', '.join(ports)}")
+    result = discover_esp32(ports, BAUDRATE, DISCOVERY_BANNER_TIMEOUT)
+    if result:
+        print(f"✓ ESP32 found on {result['port']} after {result['elapsed']:.1f}s")
+        for line in result['banner']:
+            print(f"  {line}")
+        result['connection'].close()
+    else:
+        print(f"✗ No ESP32 banner within {DISCOVERY_BANNER_TIMEOUT}s")
+
+if __name__ == "__main__":
+    main()
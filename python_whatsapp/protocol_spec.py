@@ -0,0 +1,145 @@
+"""
+Declarative spec of the sound_detector.ino serial protocol
+One table drives the line parser (ArduinoMessageParser), the pty
+simulator (esp32_simulator) and the protocol docs (python protocol_spec.py)
+
+Every protocol line is CATEGORY:FIELD[:value]. Fields are listed in the
+order the firmware prints them, each mapped to the result key(s) it fills
+and the converter applied to its value (None keeps the string).
+"""
+
+def to_int(value):
+    """int() like the firmware's numeric fields, keeping the raw text if it is not a number"""
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+# Blocks: CATEGORY:START, CATEGORY:<FIELD>:<value>..., CATEGORY:END
+BLOCKS = {
+    'EMERGENCY': {
+        'type': 'emergency',
+        'fields': {
+            'ID': ('emergency_id', None),
+            'TIMESTAMP': ('arduino_timestamp', None),
+            'TYPE': (('emergency_type', 'subtype'), None),
+            'SOUND_LEVEL': ('level', to_int),
+            'LOCATION': ('location', None),
+            'UPTIME': ('uptime', None),
+            'MESSAGE': ('message', None),
+            'ACTION_REQUIRED': ((), None),     # printed by the firmware, not kept
+            'CONTACT': ('emergency_contact', None),
+        },
+    },
+    'ALERT': {
+        'type': 'anomaly',
+        'fields': {
+            'ID': ('alert_id', None),
+            'TIMESTAMP': ('arduino_timestamp', None),
+            'LEVEL': ('level', to_int),
+            'BASELINE': ('baseline', to_int),
+            'DIFFERENCE': ('difference', to_int),
+            'SEVERITY': ('severity', None),
+            'LOCATION': ('location', None),
+            'UPTIME': ('uptime', None),
+        },
+    },
+}
+
+# Single lines that are a complete event on their own
+IMMEDIATE = {
+    'EMERGENCY:HELP_DETECTED': {
+        'type': 'emergency',
+        'emergency_type': 'HELP',
+        'subtype': 'help_detected_immediate',
+        'immediate': True,
+        'level': 999  # High priority
+    },
+}
+
+# STATUS:<FIELD>[:value] - every one is reported as {'type': 'status', 'field': ..., 'value': ...}
+STATUS_FIELDS = {
+    'STARTING': "boot started",
+    'DEVICE_TYPE': "board type (ESP32)",
+    'CPU_FREQ': "CPU clock in MHz",
+    'READY': "calibration finished, monitoring",
+    'UPDATE': "start of a periodic status block",
+    'UPTIME': "time since READY as <h>h:<m>m:<s>s",
+    'BASELINE': "ambient noise level (0-4095)",
+    'THRESHOLD': "alert threshold (0-4095)",
+    'ALERTS': "anomalies since boot",
+    'HELP_CALLS': "HELP detections since boot",
+    'CURRENT_LEVEL': "instant ADC reading (0-4095)",
+    'FREE_MEMORY': "free heap in bytes",
+}
+
+# Serial.print() calls with no newline - the next line is glued onto these
+NO_NEWLINE = ('STATUS:DEVICE_TYPE', 'EMERGENCY:TYPE')
+
+# Line kinds in the compiled table
+BLOCK_START = 'start'
+BLOCK_END = 'end'
+BLOCK_FIELD = 'field'
+STATUS = 'status'
+EVENT = 'event'
+
+def compile_line_table():
+    """Flatten the spec into {CATEGORY: {FIELD: (kind, category, keys, converter)}}
+
+    A parser splits a line once and needs one lookup for the category and
+    one for the field - no per-line lower()/startswith chains. keys is
+    always a tuple; for events converter holds the event template.
+    """
+    table = {}
+    for category, block in BLOCKS.items():
+        fields = table.setdefault(category, {})
+        fields['START'] = (BLOCK_START, category, (), None)
+        fields['END'] = (BLOCK_END, category, (), None)
+        for field, (keys, converter) in block['fields'].items():
+            if isinstance(keys, str):
+                keys = (keys,)
+            fields[field] = (BLOCK_FIELD, category, keys, converter)
+    status = table.setdefault('STATUS', {})
+    for field in STATUS_FIELDS:
+        status[field] = (STATUS, 'STATUS', (field.lower(),), None)
+    for line, event in IMMEDIATE.items():
+        category, field = line.split(':', 1)
+        table.setdefault(category, {})[field] = (EVENT, category, (), event)
+    return table
+
+def format_block(category, values):
+    """Firmware bytes for one block - values maps FIELD -> value, in any order
+
+    Fields follow the firmware's print order and keep its missing newlines,
+    so the result is byte-for-byte what sound_detector.ino sends.
+    """
+    parts = [f'{category}:START\r\n']
+    for field in BLOCKS[category]['fields']:
+        if field in values:
+            name = f'{category}:{field}'
+            parts.append(f'{name}:{values[field]}' + ('' if name in NO_NEWLINE else '\r\n'))
+    parts.append(f'{category}:END\r\n')
+    return ''.join(parts).encode('utf-8')
+
+def describe():
+    """Markdown reference generated from the spec"""
+    lines = ["# ESP32 serial protocol", ""]
+    for category, block in BLOCKS.items():
+        lines += [f"## {category}:START ... {category}:END -> type '{block['type']}'", "",
+                  "| Line | Result key | Type |", "|---|---|---|"]
+        for field, (keys, converter) in block['fields'].items():
+            keys = (keys,) if isinstance(keys, str) else keys
+            glued = " (no newline)" if f'{category}:{field}' in NO_NEWLINE else ""
+            lines.append(f"| `{category}:{field}:<value>`{glued} | {', '.join(keys) or '-'} | "
+                         f"{'int' if converter is to_int else 'str'} |")
+        lines.append("")
+    lines += ["## Immediate events", ""]
+    lines += [f"- `{line}` -> type '{event['type']}'" for line, event in IMMEDIATE.items()]
+    lines += ["", "## STATUS:<FIELD>[:value] -> type 'status'", ""]
+    for field, meaning in STATUS_FIELDS.items():
+        glued = " (no newline)" if f'STATUS:{field}' in NO_NEWLINE else ""
+        lines.append(f"- `STATUS:{field}`{glued} - {meaning}")
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    print(describe())
@@ -0,0 +1,126 @@
+"""
+Email rate limiting - a token bucket per (device, location, alert type)
+Each key may send `burst` emails back to back, then one more every
+`interval` seconds as its bucket refills, so one noisy sensor only uses up
+its own allowance and never holds back alerts from the others.
+
+Buckets refill lazily from the clock when they are checked - no timers and
+O(1) per check. They live in an OrderedDict in least recently used order;
+past max_keys the oldest is evicted, so memory stays bounded however many
+devices report. A bucket unused for that long has usually refilled anyway.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+class TokenBucket:
+    """Up to capacity tokens, one added every interval seconds"""
+
+    __slots__ = ('capacity', 'interval', 'tokens', 'updated')
+
+    def __init__(self, capacity, interval, now):
+        self.capacity = capacity
+        self.interval = interval
+        self.tokens = float(capacity)
+        self.updated = now
+
+    def refill(self, now):
+        if self.interval <= 0:
+            self.tokens = float(self.capacity)
+        elif now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) / self.interval)
+        self.updated = max(self.updated, now)
+
+    def wait(self, now):
+        """Seconds until a token is available, 0 if one is"""
+        self.refill(now)
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) * self.interval
+
+    def take(self, now):
+        """Use a token - 0 if one was available, else seconds until the next one"""
+        wait = self.wait(now)
+        if not wait:
+            self.tokens -= 1
+        return wait
+
+class RateLimiter:
+    """Token buckets per (device_id, location, kind), shared by the notifier workers"""
+
+    def __init__(self, limits, max_keys=1024, clock=time.monotonic):
+        self.limits = dict(limits)  # kind -> (burst, seconds per further email); other kinds are not limited
+        self.max_keys = max_keys
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.buckets = OrderedDict()
+
+        # Counters for the status printout
+        self.allowed = 0
+        self.limited = 0
+        self.evicted = 0
+
+    def acquire(self, key):
+        """Claim one email for key - 0 if it may go out now, else seconds until it may"""
+        kind = key[2]
+        if kind not in self.limits:
+            return 0
+        with self.lock:
+            wait = self._bucket(key).take(self.clock())
+            if wait:
+                self.limited += 1
+            else:
+                self.allowed += 1
+        return wait
+
+    def refund(self, key):
+        """Give back the token acquire() claimed for an email that then failed to send"""
+        kind = key[2]
+        if kind not in self.limits:
+            return
+        with self.lock:
+            bucket = self._bucket(key)
+            if bucket.tokens < bucket.capacity:
+                bucket.tokens = min(bucket.capacity, bucket.tokens + 1)
+                self.allowed -= 1
+
+    def wait(self, key):
+        """Seconds until key may send again, without claiming anything"""
+        with self.lock:
+            bucket = self.buckets.get(key)
+            return bucket.wait(self.clock()) if bucket is not None else 0
+
+    def interval(self, kind):
+        """Seconds per email once a key's burst is used up"""
+        return self.limits[kind][1] if kind in self.limits else 0
+
+    def _bucket(self, key):
+        bucket = self.buckets.get(key)
+        if bucket is not None:
+            self.buckets.move_to_end(key)
+            return bucket
+        burst, interval = self.limits[key[2]]
+        bucket = self.buckets[key] = TokenBucket(burst, interval, self.clock())
+        while len(self.buckets) > self.max_keys:
+            self.buckets.popitem(last=False)
+            self.evicted += 1
+        return bucket
+
+    def __len__(self):
+        with self.lock:
+            return len(self.buckets)
+
+    def stats(self):
+        with self.lock:
+            return {'keys': len(self.buckets), 'allowed': self.allowed,
+                    'limited': self.limited, 'evicted': self.evicted}
+
+    def format_line(self):
+        stats = self.stats()
+        return (f"limits   keys={stats['keys']} allowed={stats['allowed']} "
+                f"limited={stats['limited']} evicted={stats['evicted']}")
+
+def alert_key(kind, data):
+    """Rate-limit key of an alert: (device_id, location, kind)"""
+    return (data.get('device_id', 'SOUND_001'), data.get('location', 'Unknown Location'), kind)
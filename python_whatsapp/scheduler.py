@@ -0,0 +1,90 @@
+"""
+Scheduler for periodic and delayed tasks on a hashed timing wheel
+Reports, status printouts, rate-limit digests, the serial heartbeat and
+block deadlines are all timers on one wheel. The loop that owns it sleeps
+until next_deadline() (or a line) and calls advance(); nothing compares
+time.time() against a last-run stamp on every pass.
+
+Timers may be scheduled from any thread (notifier workers schedule digests).
+Callbacks always run on the thread that calls advance(), after it has
+released the lock - a callback that blocks (a full queue) never stops
+other threads from scheduling.
+"""
+
+import threading
+from timer_wheel import TimerWheel
+
+class Scheduler:
+    """Thread-safe TimerWheel front end - also usable as BlockAssembler's wheel"""
+
+    def __init__(self, wheel=None, wake=None):
+        self.wheel = wheel if wheel is not None else TimerWheel()
+        self.clock = self.wheel.clock
+        self.wake = wake                  # called when a new timer is due before the loop's wakeup
+        self.lock = threading.RLock()     # guards the wheel; callbacks run outside it
+        self.sleeping_until = None        # deadline the loop is waiting for, None while it runs
+
+    def schedule(self, delay, callback, *args):
+        """Call callback(*args) once, delay seconds from now - O(1)"""
+        with self.lock:
+            timer = self.wheel.schedule(delay, callback, *args)
+        self._wake_for(timer)
+        return timer
+
+    call_later = schedule
+
+    def every(self, interval, callback, *args):
+        """Call callback(*args) every interval seconds; cancel() the returned timer to stop"""
+        def tick():
+            with self.lock:
+                self.wheel.reschedule(timer, interval)
+            callback(*args)
+        timer = self.schedule(interval, tick)
+        return timer
+
+    def cancel(self, timer):
+        """Forget a timer - O(1), no-op if it already fired"""
+        with self.lock:
+            self.wheel.cancel(timer)
+
+    def reschedule(self, timer, delay):
+        """Move a timer to delay seconds from now - O(1)"""
+        with self.lock:
+            self.wheel.reschedule(timer, delay)
+        self._wake_for(timer)
+
+    def remaining(self, timer):
+        """Seconds until a pending timer is due, 0 once it is due or gone"""
+        if timer is None or not timer.active:
+            return 0
+        return max(timer.deadline - self.clock(), 0)
+
+    def advance(self, now=None):
+        """Run every callback that is due; returns how many ran"""
+        with self.lock:
+            self.sleeping_until = None
+            due = self.wheel.expire(now)
+        return self.wheel.fire(due)
+
+    def next_deadline(self):
+        with self.lock:
+            return self.wheel.next_deadline()
+
+    def wait_timeout(self):
+        """Seconds the owning loop may sleep before calling advance() (None: no timers)"""
+        with self.lock:
+            deadline = self.wheel.next_deadline()
+            self.sleeping_until = deadline if deadline is not None else float('inf')
+        if deadline is None:
+            return None
+        return max(deadline - self.clock(), 0)
+
+    def _wake_for(self, timer):
+        # A timer scheduled from another thread that is due before the loop wakes up
+        sleeping_until = self.sleeping_until
+        if self.wake and sleeping_until is not None and timer.deadline < sleeping_until:
+            self.wake()
+
+    def __len__(self):
+        with self.lock:
+            return len(self.wheel)
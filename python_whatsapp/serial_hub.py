@@ -0,0 +1,200 @@
+"""
+Multi-device serial hub for ESP32 sound detectors
+Monitors many serial ports from a single selectors-based loop (POSIX only)
+"""
+
+import os
+import selectors
+import serial
+import time
+from arduino_reader import LineBuffer
+from message_parser import ArduinoMessageParser
+
+class SerialDevice:
+    """One monitored port with its own line buffer and stats"""
+
+    def __init__(self, port, device_id=None, baudrate=115200):
+        self.port = port
+        self.device_id = device_id or port
+        self.baudrate = baudrate
+        self.serial_connection = None
+        self.line_buffer = LineBuffer()
+        self.stats = {
+            'messages_processed': 0,
+            'emergencies_detected': 0,
+            'anomalies_detected': 0,
+            'location': 'Unknown',
+            'device_id': self.device_id,
+            'baseline': 200,
+            'esp32_ready': False,
+            'last_seen': None
+        }
+
+    def __repr__(self):
+        return f"SerialDevice({self.device_id!r} on {self.port!r})"
+
+class SerialHub:
+    """Waits on every registered port with one selector instead of one thread each"""
+
+    def __init__(self, chunk_size=4096, raw_lines=False, parser=None):
+        self.selector = selectors.DefaultSelector()
+        self.devices = {}
+        # One parser for every port - its block assembler keys open blocks by device
+        self.parser = parser if parser is not None else ArduinoMessageParser()
+        self.chunk_size = chunk_size
+        self.raw_lines = raw_lines  # yield undecoded bytes for ArduinoMessageParser.parse_bytes
+        self.running = False
+        # Self-pipe so wake() can end a select() that has no timeout
+        self.wake_read, self.wake_write = os.pipe()
+        os.set_blocking(self.wake_read, False)
+        os.set_blocking(self.wake_write, False)
+        self.selector.register(self.wake_read, selectors.EVENT_READ, None)
+
+    def add_device(self, port, device_id=None, baudrate=115200):
+        """Open a port and register it with the selector"""
+        if port in self.devices:
+            return self.devices[port]
+
+        device = SerialDevice(port, device_id, baudrate)
+        try:
+            device.serial_connection = serial.Serial(port=port, baudrate=baudrate, timeout=0)
+            self.selector.register(device.serial_connection.fileno(), selectors.EVENT_READ, device)
+        except (serial.SerialException, OSError, ValueError) as e:
+            print(f"✗ Hub could not open {port}: {e}")
+            if device.serial_connection:
+                device.serial_connection.close()
+            return None
+
+        self.devices[port] = device
+        print(f"✓ Hub monitoring {device.device_id} on {port}")
+        return device
+
+    def attach_device(self, device, connection):
+        """Register an already open connection (e.g. a pty or a probed port)"""
+        device.serial_connection = connection
+        self.selector.register(connection.fileno(), selectors.EVENT_READ, device)
+        self.devices[device.port] = device
+        return device
+
+    def remove_device(self, port):
+        """Stop monitoring a port and close it"""
+        device = self.devices.pop(port, None)
+        if not device:
+            return
+        self.parser.assembler.discard_device(device)
+
+        try:
+            self.selector.unregister(device.serial_connection.fileno())
+        except (KeyError, ValueError, OSError):
+            pass
+        try:
+            device.serial_connection.close()
+        except Exception:
+            pass
+        print(f"✓ Hub stopped monitoring {device.device_id} on {port}")
+
+    def poll(self, timeout=None):
+        """Wait for data on any port and return every complete line as (device, line)"""
+        lines = []
+        for key, _ in self.selector.select(timeout):
+            device = key.data
+            if device is None:
+                try:
+                    os.read(self.wake_read, 512)
+                except BlockingIOError:
+                    pass
+                continue
+            try:
+                data = os.read(key.fd, self.chunk_size)
+            except BlockingIOError:
+                continue
+            except OSError as e:
+                print(f"✗ Serial read error on {device.port}: {e}")
+                self.remove_device(device.port)
+                continue
+
+            if not data:
+                # Readable with no data means the device went away
+                print(f"✗ {device.device_id} on {device.port} disconnected")
+                self.remove_device(device.port)
+                continue
+
+            device.stats['last_seen'] = time.time()
+            if self.raw_lines:
+                lines.extend((device, line) for line in device.line_buffer.feed(data))
+            else:
+                for line in device.line_buffer.feed(data):
+                    lines.append((device, line.decode('utf-8', errors='ignore')))
+
+        return lines
+
+    def run(self, handler, timeout=1.0):
+        """Loop until stop(); handler(device, line, parsed) is called for every line
+
+        Open blocks are keyed by device, so interleaved EMERGENCY/ALERT
+        blocks from different sensors never corrupt each other. Blocks cut
+        off before their END line reach the handler with line=None.
+        """
+        self.running = True
+        while self.running:
+            for device, line in self.poll(timeout):
+                device.stats['messages_processed'] += 1
+                if self.raw_lines:
+                    parsed = self.parser.parse_bytes(line, device)
+                else:
+                    parsed = self.parser.parse_message(line, device)
+                if parsed:
+                    parsed['device_id'] = device.device_id
+                    parsed['port'] = device.port
+                handler(device, line, parsed)
+            for device, parsed in self.parser.sweep():
+                parsed['device_id'] = device.device_id
+                parsed['port'] = device.port
+                handler(device, None, parsed)
+
+    def wake(self):
+        """Make a poll() that is waiting return now (safe from signal handlers and threads)"""
+        try:
+            os.write(self.wake_write, b'\0')
+        except BlockingIOError:
+            pass  # pipe already full - a wakeup is pending anyway
+
+    def stop(self):
+        """Ask run() to return after the current poll"""
+        self.running = False
+        self.wake()
+
+    def close(self):
+        """Close every port"""
+        self.stop()
+        for port in list(self.devices):
+            self.remove_device(port)
+        self.selector.close()
+        os.close(self.wake_read)
+        os.close(self.wake_write)
+
+def main():
+    """Print tagged detections from every port in config.DEVICE_PORTS"""
+    from config import DEVICE_PORTS, BAUDRATE
+
+    hub = SerialHub(raw_lines=True)
+    for port, device_id in DEVICE_PORTS.items():
+        hub.add_device(port, device_id, BAUDRATE)
+
+    if not hub.devices:
+        print("✗ No devices opened - set DEVICE_PORTS in config.py")
+        return
+
+    def show(device, line, parsed):
+        if parsed and parsed.get('type') in ('emergency', 'anomaly'):
+            print(f"[{device.device_id}] {parsed['type'].upper()}: {parsed}")
+
+    try:
+        hub.run(show)
+    except KeyboardInterrupt:
+        print("\n🛑 Hub stopped")
+    finally:
+        hub.close()
+
+if __name__ == "__main__":
+    main()
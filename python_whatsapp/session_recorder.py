@@ -0,0 +1,224 @@
+"""
+Serial session recorder and replay source
+Captures every raw line an ESP32 sends with monotonic timing, and plays a
+capture back through the normal ArduinoReader queue at 1x, Nx or max speed
+
+File layout (append-only, little-endian):
+    session header   MAGIC + float64 wall-clock start (epoch seconds)
+    record           uint32 microseconds since the previous record
+                     uint16 line length, then the raw line bytes
+A file may hold several sessions back to back - each recorder run appends
+a new header, and the first record of a session is timed from that header.
+MAGIC begins with an all-ones record header that real records never use.
+"""
+
+import os
+import struct
+import sys
+import threading
+import time
+from arduino_reader import ArduinoReader
+
+RECORD_HEADER = struct.Struct('<IH')
+SESSION_HEADER = struct.Struct('<d')
+MAGIC = RECORD_HEADER.pack(0xFFFFFFFF, 0xFFFF) + b'ESPREC1\n'
+MAX_DELTA_US = 0xFFFFFFFE   # gaps longer than ~71 minutes are clamped
+MAX_LINE_LENGTH = 0xFFFE
+
+class SessionRecorder:
+    """Appends every raw line a reader sees to a compact session file"""
+
+    def __init__(self, path, flush_interval=1.0):
+        self.path = path
+        self.flush_interval = flush_interval  # seconds of data at risk if the process dies
+        self.file = None
+        self.last_ns = 0
+        self.last_flush_ns = 0
+        self.lines_recorded = 0
+        self.lock = threading.Lock()
+
+    def open(self):
+        """Open the file for appending and start a new session"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(self.path, 'ab')
+        self.file.write(MAGIC + SESSION_HEADER.pack(time.time()))
+        self.last_ns = self.last_flush_ns = time.monotonic_ns()
+        print(f"✓ Recording serial session to {self.path}")
+        return self
+
+    def attach(self, reader):
+        """Record every line `reader` receives from now on"""
+        if self.file is None:
+            self.open()
+        reader.add_line_listener(self.record)
+        return self
+
+    def record(self, line):
+        """Append one raw (stripped) line - called from the reader thread"""
+        now = time.monotonic_ns()
+        with self.lock:
+            if self.file is None:
+                return
+            delta = min((now - self.last_ns) // 1000, MAX_DELTA_US)
+            self.last_ns = now
+            line = line[:MAX_LINE_LENGTH]
+            self.file.write(RECORD_HEADER.pack(delta, len(line)))
+            self.file.write(line)
+            self.lines_recorded += 1
+            if now - self.last_flush_ns >= self.flush_interval * 1e9:
+                self.file.flush()
+                self.last_flush_ns = now
+
+    def close(self):
+        """Flush and close the file"""
+        with self.lock:
+            if self.file is None:
+                return
+            self.file.close()
+            self.file = None
+        print(f"✓ Recorded {self.lines_recorded} lines to {self.path}")
+
+def iter_sessions(path):
+    """Yield (start_epoch, records) per session, records being (delta_us, line) pairs
+
+    A record cut short by a crash mid-write ends the file quietly.
+    """
+    with open(path, 'rb') as session_file:
+        data = session_file.read()
+
+    view = memoryview(data)
+    offset = 0
+    end = len(data)
+    header_size = len(MAGIC) + SESSION_HEADER.size
+
+    while offset + header_size <= end:
+        if data[offset:offset + len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a session recording (bad header at byte {offset})")
+        start_epoch, = SESSION_HEADER.unpack_from(data, offset + len(MAGIC))
+        offset += header_size
+
+        # Records run until the next session marker (never a valid record header)
+        records = []
+        while offset + RECORD_HEADER.size <= end and data[offset:offset + len(MAGIC)] != MAGIC:
+            delta, length = RECORD_HEADER.unpack_from(data, offset)
+            offset += RECORD_HEADER.size
+            if offset + length > end:
+                offset = end
+                break
+            records.append((delta, bytes(view[offset:offset + length])))
+            offset += length
+
+        yield start_epoch, records
+
+def iter_records(path):
+    """Yield (delta_us, line) for every recorded line across all sessions"""
+    for _, records in iter_sessions(path):
+        yield from records
+
+class ReplayReader(ArduinoReader):
+    """ArduinoReader that plays a session file instead of a serial port
+
+    Lines go through the same dispatch, priority lane and bounded queue as
+    live serial data, so the rest of the pipeline cannot tell the
+    difference. speed=1 keeps the recorded timing, speed=N plays N times
+    faster and speed=None (or 0) plays as fast as the consumer keeps up.
+    """
+
+    def __init__(self, path, speed=1.0, **kwargs):
+        super().__init__(path, **kwargs)
+        self.path = path
+        self.speed = speed
+        self.lines_replayed = 0
+        self.finished = threading.Event()
+        self.stopped = threading.Event()
+
+    def connect(self):
+        """Check the session file instead of opening a port"""
+        try:
+            with open(self.path, 'rb') as session_file:
+                if session_file.read(len(MAGIC)) != MAGIC:
+                    print(f"✗ {self.path} is not a session recording")
+                    return False
+        except OSError as e:
+            print(f"✗ Cannot open session file: {e}")
+            return False
+
+        self.is_connected = True
+        speed = f"{self.speed:g}x" if self.speed else "max speed"
+        print(f"✓ Replaying {self.path} at {speed}")
+        return True
+
+    def start_reading(self):
+        """Start playing the session in a background thread"""
+        if not self.is_connected:
+            print("✗ Cannot start replay - session file not opened")
+            return False
+
+        if self.is_reading:
+            return True
+
+        self.is_reading = True
+        self.finished.clear()
+        self.stopped.clear()
+        self.read_thread = threading.Thread(target=self._replay_loop, daemon=True)
+        self.read_thread.start()
+        return True
+
+    def _replay_loop(self):
+        """Dispatch each recorded line at its (scaled) original offset"""
+        start = time.perf_counter()
+        due = 0.0
+        try:
+            for delta, line in iter_records(self.path):
+                if self.stopped.is_set():
+                    break
+                if self.speed:
+                    due += delta / 1e6 / self.speed
+                    wait = start + due - time.perf_counter()
+                    if wait > 0 and self.stopped.wait(wait):
+                        break
+                else:
+                    # Max speed - wait for room rather than let the drop policy eat lines
+                    while self.message_queue.full() and not self.stopped.is_set():
+                        time.sleep(0.001)
+                self._dispatch_line(line)
+                self.lines_replayed += 1
+        except (OSError, ValueError) as e:
+            print(f"✗ Replay error: {e}")
+        finally:
+            self.is_reading = False
+            self.finished.set()
+            self.message_queue.wake()  # the consumer may be waiting with no timeout
+
+    def is_finished(self):
+        """True once every line has been replayed and consumed"""
+        return self.finished.is_set() and self.message_queue.empty()
+
+    def send_command(self, command):
+        """Recorded sessions cannot answer commands"""
+        print(f"Replay: ignoring command {command}")
+        return False
+
+    def stop_reading(self):
+        """Stop replaying"""
+        self.stopped.set()
+        super().stop_reading()
+
+def main():
+    """Summarise a session file: python session_recorder.py <file>"""
+    if len(sys.argv) < 2:
+        print("Usage: python session_recorder.py <session file>")
+        return
+
+    path = sys.argv[1]
+    for index, (start_epoch, records) in enumerate(iter_sessions(path), 1):
+        duration = sum(delta for delta, _ in records) / 1e6
+        started = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(start_epoch))
+        emergencies = sum(1 for _, line in records if line.startswith(b'EMERGENCY:HELP_DETECTED'))
+        print(f"Session {index}: started {started}, {len(records)} lines over {duration:.1f}s, "
+              f"{emergencies} HELP detection(s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+Pooled, persistent SMTP sessions for EmailSender
+Connecting, STARTTLS and login cost several round trips (hundreds of ms to
+seconds with Gmail) - far more than the message itself. Sessions here stay
+logged in between emails: a send checks out a warm session, idle sessions
+get a NOOP every SMTP_KEEPALIVE seconds, and a session the server has
+dropped is reopened and the send retried once. Up to `size` sessions exist,
+so the notifier workers can send in parallel.
+
+Every send is timed from checkout to acceptance, separately for reused and
+freshly connected sessions, for the status printout.
+"""
+
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+from latency import LatencyHistogram, format_us
+
+# The server closed the connection (idle timeout, restart) - reconnecting fixes it
+DISCONNECTED = (smtplib.SMTPServerDisconnected, ConnectionError)
+
+class SMTPSession:
+    """One SMTP connection that logs in on connect() and reconnects when dropped"""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.smtp = None
+        self.last_used = 0.0
+        self.reconnected = False  # set when a send had to reopen the connection
+
+    @property
+    def connected(self):
+        return self.smtp is not None
+
+    def connect(self):
+        """Open, STARTTLS and log in - replaces any previous connection"""
+        self.close()
+        pool = self.pool
+        smtp = pool.factory(pool.host, pool.port, timeout=pool.timeout)
+        try:
+            if pool.starttls:
+                smtp.starttls()
+            if pool.username:
+                smtp.login(pool.username, pool.password)
+        except BaseException:
+            smtp.close()
+            raise
+        self.smtp = smtp
+        self.last_used = time.monotonic()
+        pool._count('connects')
+
+    def sendmail(self, from_addr, to_addrs, text):
+        """Send on this session; a dropped connection is reopened and the send retried once"""
+        try:
+            self.smtp.sendmail(from_addr, to_addrs, text)
+        except DISCONNECTED:
+            self.connect()
+            self.reconnected = True
+            self.pool._count('reconnects')
+            self.smtp.sendmail(from_addr, to_addrs, text)
+        self.last_used = time.monotonic()
+
+    def noop(self):
+        """Keepalive - False (and closed) if the server had dropped the connection"""
+        try:
+            code, _ = self.smtp.noop()
+        except DISCONNECTED:
+            code = None
+        if code != 250:
+            self.close()
+            return False
+        self.last_used = time.monotonic()
+        return True
+
+    def close(self):
+        smtp, self.smtp = self.smtp, None
+        if smtp is None:
+            return
+        try:
+            smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            smtp.close()
+
+class SMTPPool:
+    """Up to `size` SMTP sessions, kept logged in between sends"""
+
+    def __init__(self, host, port, username=None, password=None, size=2,
+                 starttls=True, timeout=30, factory=smtplib.SMTP):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.size = size
+        self.starttls = starttls
+        self.timeout = timeout
+        self.factory = factory    # smtplib.SMTP or anything with its interface
+        self.idle = [SMTPSession(self) for _ in range(size)]  # most recently used last
+        self.condition = threading.Condition()
+        self.closed = False
+
+        # Counters for the status printout
+        self.connects = 0
+        self.reconnects = 0
+        self.keepalives = 0
+        self.sends = {'reused': LatencyHistogram(), 'new': LatencyHistogram()}
+
+    @contextmanager
+    def session(self):
+        """Check out a logged-in session, connecting only if none is warm
+
+        The session goes back to the pool after the with-block; one that
+        raised is closed first, since its connection state is unknown.
+        """
+        started = time.perf_counter()
+        session = self._checkout()
+        reused = session.connected
+        session.reconnected = False
+        try:
+            if not reused:
+                session.connect()
+            yield session
+        except BaseException:
+            session.close()
+            self._checkin(session)
+            raise
+        elapsed = (time.perf_counter() - started) * 1000000
+        with self.condition:
+            self.sends['reused' if reused and not session.reconnected else 'new'].record(elapsed)
+        self._checkin(session)
+
+    def _checkout(self):
+        with self.condition:
+            while not self.idle:
+                self.condition.wait()
+            # Prefer the most recently used warm session
+            for index in range(len(self.idle) - 1, -1, -1):
+                if self.idle[index].connected:
+                    return self.idle.pop(index)
+            return self.idle.pop()
+
+    def _checkin(self, session):
+        if self.closed:
+            session.close()
+        with self.condition:
+            self.idle.append(session)
+            self.condition.notify()
+
+    def _count(self, name):
+        with self.condition:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def keepalive(self):
+        """NOOP every idle warm session, reconnecting the ones the server dropped
+
+        Sessions in use are skipped - their send keeps them alive. Returns how
+        many idle sessions are warm afterwards.
+        """
+        with self.condition:
+            sessions = [session for session in self.idle if session.connected]
+            for session in sessions:
+                self.idle.remove(session)
+        warm = 0
+        for session in sessions:
+            try:
+                if not session.noop():
+                    session.connect()
+                    self._count('reconnects')
+                self._count('keepalives')
+                warm += 1
+            except (smtplib.SMTPException, OSError) as e:
+                print(f"✗ SMTP keepalive failed: {e}")
+            finally:
+                self._checkin(session)
+        return warm
+
+    def warm(self):
+        """Sessions currently connected and idle"""
+        with self.condition:
+            return sum(session.connected for session in self.idle)
+
+    def close(self):
+        """QUIT every idle session; sessions in use are closed when they come back"""
+        with self.condition:
+            self.closed = True
+            sessions = list(self.idle)
+        for session in sessions:
+            session.close()
+
+    def stats(self):
+        """Session counters and send latency (µs) with and without a reused session"""
+        with self.condition:
+            stats = {'size': self.size,
+                     'warm': sum(session.connected for session in self.idle),
+                     'connects': self.connects,
+                     'reconnects': self.reconnects,
+                     'keepalives': self.keepalives}
+            for name, histogram in self.sends.items():
+                stats[name] = {'count': histogram.count,
+                               'mean_us': histogram.mean(),
+                               'p50_us': histogram.percentile(50),
+                               'p99_us': histogram.percentile(99),
+                               'max_us': histogram.max}
+        return stats
+
+    def format_lines(self):
+        """Session summary plus one line per send kind that has samples"""
+        stats = self.stats()
+        lines = [f"SMTP sessions: {stats['warm']}/{stats['size']} warm, {stats['connects']} connects, "
+                 f"{stats['reconnects']} reconnects, {stats['keepalives']} keepalives"]
+        for name, label in (('reused', 'send on warm session'), ('new', 'send with new login')):
+            send = stats[name]
+            if send['count']:
+                lines.append(f"{label:<24} n={send['count']:<6} "
+                             f"p50={format_us(send['p50_us']):>8} p99={format_us(send['p99_us']):>8} "
+                             f"max={format_us(send['max_us']):>8}")
+        return lines
@@ -0,0 +1,122 @@
+"""
+Hashed timing wheel for block deadlines and other coarse timers
+Scheduling and cancelling are O(1); advancing visits one bucket per
+elapsed tick, so a sweep costs the same with ten timers or ten thousand.
+"""
+
+import time
+
+class Timer:
+    __slots__ = ('deadline', 'rounds', 'bucket', 'callback', 'args', 'cancelled')
+
+    def __init__(self, deadline, callback, args):
+        self.deadline = deadline
+        self.rounds = 0
+        self.bucket = None
+        self.callback = callback
+        self.args = args
+        self.cancelled = False  # set by cancel() - also stops a due timer expire() already returned
+
+    @property
+    def active(self):
+        return self.bucket is not None
+
+class TimerWheel:
+    def __init__(self, tick=0.1, slots=256, clock=time.monotonic):
+        self.tick = tick
+        self.clock = clock
+        self.buckets = [{} for _ in range(slots)]  # insertion-ordered: timers due together fire in order
+        self.current = int(clock() / tick)         # last tick already processed
+        self.count = 0
+
+    def schedule(self, delay, callback, *args):
+        """Call callback(*args) on the first advance() at least delay seconds from now"""
+        timer = Timer(self.clock() + delay, callback, args)
+        self._insert(timer)
+        return timer
+
+    def _insert(self, timer):
+        # Round up so a timer never fires early; the earliest bucket is the next tick
+        tick = max(-int(-timer.deadline // self.tick), self.current + 1)
+        timer.rounds = (tick - self.current - 1) // len(self.buckets)
+        timer.bucket = self.buckets[tick % len(self.buckets)]
+        timer.bucket[timer] = None
+        timer.cancelled = False
+        self.count += 1
+
+    def cancel(self, timer):
+        """Forget a pending timer, or a due one whose callback has not run yet"""
+        if timer.bucket is not None:
+            del timer.bucket[timer]
+            timer.bucket = None
+            self.count -= 1
+        timer.cancelled = True
+
+    def reschedule(self, timer, delay):
+        """Move a pending or fired timer to delay seconds from now"""
+        self.cancel(timer)
+        timer.deadline = self.clock() + delay
+        self._insert(timer)
+
+    def advance(self, now=None):
+        """Fire every timer due by now; returns how many fired"""
+        return self.fire(self.expire(now))
+
+    def expire(self, now=None):
+        """Remove and return every timer due by now, in order, without running them
+
+        Lets a caller that guards the wheel with a lock run the callbacks
+        after releasing it (see Scheduler.advance).
+        """
+        target = int((self.clock() if now is None else now) / self.tick)
+        due = []
+        while self.current < target:
+            if not self.count:
+                self.current = target  # nothing pending - skip the empty buckets
+                break
+            self.current += 1
+            bucket = self.buckets[self.current % len(self.buckets)]
+            if not bucket:
+                continue
+            for timer in list(bucket):
+                if timer.rounds:
+                    timer.rounds -= 1
+                    continue
+                del bucket[timer]
+                timer.bucket = None
+                self.count -= 1
+                due.append(timer)
+        return due
+
+    def fire(self, timers):
+        """Run the callbacks of timers from expire(); returns how many ran"""
+        fired = 0
+        for timer in timers:
+            # Skip timers an earlier callback cancelled or rescheduled
+            if timer.cancelled or timer.bucket is not None:
+                continue
+            fired += 1
+            timer.callback(*timer.args)
+        return fired
+
+    def next_deadline(self):
+        """Time of the next tick with a timer due, or None if nothing is pending
+
+        Callers sleep until then instead of polling; advance() at that time
+        fires the timer. Scans at most one turn of the wheel.
+        """
+        if not self.count:
+            return None
+        slots = len(self.buckets)
+        best = None
+        for offset in range(slots):
+            if best is not None and offset >= best:
+                break
+            for timer in self.buckets[(self.current + 1 + offset) % slots]:
+                ticks = offset + timer.rounds * slots
+                if best is None or ticks < best:
+                    best = ticks
+        return (self.current + 1 + best) * self.tick
+
+    def __len__(self):
+        return self.count
@@ -10,16 +10,18 @@ from datetime import datetime
 import sys
 import os
 from collections import deque
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 
 # Add python_whatsapp to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'python_whatsapp'))
 
 from arduino_reader import ArduinoReader
 from message_parser import ArduinoMessageParser
+from block_assembler import BlockAssembler
 from email_sender import EmailSender
+from digest import HELD_BACK
+from outbox import Outbox
+from alert_spool import AlertSpool
+from port_discovery import candidate_ports, discover_esp32
 from config import *
 
 class SoundDetectorApp:
@@ -44,30 +46,69 @@ class SoundDetectorApp:
         self.logs.append(f"[{timestamp}] [{log_type}] {message}")
         print(f"[{timestamp}] [{log_type}] {message}")  # Also print to console
         
+    def deliver(self, email_sender, kind, data, spool_id=None):
+        """Outbox worker: send one email - False has the outbox retry it"""
+        if kind == 'emergency':
+            sent = email_sender.send_emergency_email(data, spool_id)
+        elif kind == 'anomaly':
+            sent = email_sender.send_anomaly_email(data, spool_id)
+        elif kind == 'digest':
+            sent = email_sender.send_digest_email(*data)
+        else:
+            subject, message = data
+            sent = email_sender._send_email(subject, message)
+        if sent:
+            self.add_log(f"✓ {kind.capitalize()} email sent successfully!", "SUCCESS")
+        elif sent is False:
+            self.add_log(f"✗ Failed to send {kind} email", "ERROR")
+        elif sent is HELD_BACK:
+            self.add_log(f"⏱️ {kind.capitalize()} alert held back by the rate limit - added to the digest", "INFO")
+        return sent
+    
     def monitoring_loop(self):
         """Main monitoring loop running in background thread"""
         try:
             self.add_log("Initializing system...", "SYSTEM")
             
             # Initialize components
-            esp32 = ArduinoReader(ARDUINO_PORT, BAUDRATE, SERIAL_TIMEOUT)
-            parser = ArduinoMessageParser()
+            esp32 = ArduinoReader(ARDUINO_PORT, BAUDRATE, SERIAL_TIMEOUT,
+                                  queue_size=INGEST_QUEUE_SIZE,
+                                  never_drop_prefixes=INGEST_NEVER_DROP,
+                                  drop_policy=INGEST_DROP_POLICY,
+                                  priority_prefixes=INGEST_PRIORITY_PREFIXES)
             email_sender = EmailSender()
+            # Block deadlines run on the sender's scheduler, so a cut-off EMERGENCY block still alerts
+            parser = ArduinoMessageParser(BlockAssembler(BLOCK_TIMEOUT, BLOCK_MAX_FIELDS,
+                                                         wheel=email_sender.scheduler))
+            # Emails are queued and sent by outbox workers, most urgent first, with retries;
+            # alert emails are spooled to disk until the SMTP server accepts them
+            spool = AlertSpool(ALERT_SPOOL_FILE, SPOOL_BATCH_SIZE, retention=SPOOL_RETENTION) if ALERT_SPOOL_FILE else None
+            outbox = Outbox('notify', lambda kind, data: self.deliver(email_sender, kind, data,
+                                                                    outbox.current_spool_id()),
+                            NOTIFY_WORKERS, NOTIFY_QUEUE_SIZE, OUTBOX_RETRIES, OUTBOX_BACKOFF,
+                            OUTBOX_MAX_BACKOFF, OUTBOX_DEADLINES, spool)
+            # Alerts held back by a device's rate limit go out as one digest email once it may send again
+            email_sender.queue_digest = lambda kind, digests: outbox.put(('digest', (kind, digests)), block=False)
             
-            # Test email connection
-            self.add_log("Testing email configuration...", "SYSTEM")
-            if not email_sender.test_connection():
-                self.add_log("Email configuration failed! Check config.py", "ERROR")
-                self.stats['status'] = 'Error: Email Setup Failed'
-                self.running = False
-                return
-            
-            self.add_log("✓ Email configuration OK", "SUCCESS")
-            
-            # Send "Monitoring Started" email
-            self.add_log("📧 Sending monitoring started notification...", "SYSTEM")
             try:
-                start_message = f"""
+                # Test email connection
+                self.add_log("Testing email configuration...", "SYSTEM")
+                if not email_sender.test_connection():
+                    self.add_log("Email configuration failed! Check config.py", "ERROR")
+                    self.stats['status'] = 'Error: Email Setup Failed'
+                    self.running = False
+                    return
+                
+                self.add_log("✓ Email configuration OK", "SUCCESS")
+                outbox.start()
+                replayed = outbox.replay()
+                if replayed:
+                    self.add_log(f"📬 Resending {replayed} alert email(s) left undelivered by the last run", "SYSTEM")
+                
+                # Send "Monitoring Started" email
+                self.add_log("📧 Queueing monitoring started notification...", "SYSTEM")
+                try:
+                    start_message = f"""
 ═══════════════════════════════════════════════════════════
 🚀 MONITORING STARTED
 ═══════════════════════════════════════════════════════════
@@ -83,174 +124,122 @@ Emergency and anomaly alerts will be sent to this email address.
 Configuration:
 - Port: {ARDUINO_PORT}
 - Baudrate: {BAUDRATE}
-- Emergency Cooldown: {EMAIL_COOLDOWN}s
+- Emergency Cooldown: {EMERGENCY_COOLDOWN}s
 - Anomaly Cooldown: {ANOMALY_COOLDOWN}s
 
 ═══════════════════════════════════════════════════════════
 """
-                msg = MIMEMultipart()
-                msg['From'] = EMAIL_USERNAME
-                msg['To'] = EMERGENCY_EMAIL
-                msg['Subject'] = "🚀 Sound Detector Monitoring Started"
-                msg['X-Priority'] = '2'
-                msg.attach(MIMEText(start_message, 'plain'))
+                    outbox.put(('report', ("🚀 Sound Detector Monitoring Started", start_message)))
+                except Exception as e:
+                    self.add_log(f"⚠️ Could not send start email: {str(e)}", "WARNING")
                 
-                server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=5)
-                server.starttls()
-                server.login(EMAIL_USERNAME, EMAIL_PASSWORD)
-                server.sendmail(EMAIL_USERNAME, [EMERGENCY_EMAIL], msg.as_string())
-                server.quit()
+                # Find the ESP32 - every candidate port is probed at the same time
+                ports = candidate_ports(ARDUINO_PORT, ALTERNATIVE_PORTS)
+                self.add_log(f"Probing {len(ports)} port(s) for ESP32 (preferred: {ARDUINO_PORT})...", "SYSTEM")
+                found = discover_esp32(ports, BAUDRATE, DISCOVERY_BANNER_TIMEOUT)
                 
-                self.add_log("✓ Monitoring started email sent!", "SUCCESS")
-            except Exception as e:
-                self.add_log(f"⚠️ Could not send start email: {str(e)}", "WARNING")
-            
-            # Connect to ESP32
-            self.add_log(f"Connecting to ESP32 on {ARDUINO_PORT}...", "SYSTEM")
-            if not esp32.connect():
-                self.add_log(f"Failed to connect on {ARDUINO_PORT}, trying alternatives...", "WARNING")
+                if found:
+                    esp32.attach(found['connection'], found['banner'], found['line_buffer'])
+                    self.add_log(f"✓ ESP32 identified on {found['port']} in {found['elapsed']:.1f}s", "SUCCESS")
+                else:
+                    self.add_log(f"No ESP32 banner seen, connecting to {ARDUINO_PORT} directly...", "WARNING")
+                    if not esp32.connect():
+                        self.add_log("Failed to connect to ESP32!", "ERROR")
+                        self.stats['status'] = 'Error: ESP32 Connection Failed'
+                        self.running = False
+                        return
+                    self.add_log(f"✓ Connected to ESP32 on {ARDUINO_PORT}", "SUCCESS")
                 
-                alternative_ports = ['COM3', 'COM4', 'COM5', 'COM6', 'COM7', 'COM8']
-                connected = False
-                
-                for port in alternative_ports:
-                    if port != ARDUINO_PORT:
-                        self.add_log(f"  Trying {port}...", "INFO")
-                        esp32.port = port
-                        if esp32.connect():
-                            self.add_log(f"✓ Connected to ESP32 on {port}", "SUCCESS")
-                            connected = True
-                            break
-                        time.sleep(0.5)
-                
-                if not connected:
-                    self.add_log("Failed to connect to ESP32!", "ERROR")
-                    self.stats['status'] = 'Error: ESP32 Connection Failed'
+                # Start reading
+                if not esp32.start_reading():
+                    self.add_log("Failed to start reading from ESP32", "ERROR")
+                    self.stats['status'] = 'Error: Reading Failed'
                     self.running = False
                     return
-            else:
-                self.add_log(f"✓ Connected to ESP32 on {ARDUINO_PORT}", "SUCCESS")
-            
-            # Start reading
-            if not esp32.start_reading():
-                self.add_log("Failed to start reading from ESP32", "ERROR")
-                self.stats['status'] = 'Error: Reading Failed'
-                self.running = False
-                return
-            
-            self.add_log("✓ ESP32 communication started", "SUCCESS")
-            self.add_log(f"Waiting {ESP32_INIT_DELAY}s for ESP32 initialization...", "INFO")
-            time.sleep(ESP32_INIT_DELAY)
-            
-            # Main monitoring loop
-            self.add_log("✓ Monitoring started!", "SUCCESS")
-            self.stats['status'] = 'Monitoring'
-            self.stats['esp32_ready'] = True
-            
-            last_email_time = {}
-            message_count = 0
-            
-            while self.running:
-                msg = esp32.get_message(timeout=0.5)
                 
-                if msg:
-                    message_count += 1
-                    self.stats['messages_processed'] += 1
-                    self.add_log(f"[MSG #{message_count}] {msg[:70]}", "RAW")
-                    
-                    # Parse message
-                    parsed = parser.parse_message(msg)
-                    
-                    if parsed is None:
-                        continue
-                    
-                    msg_type = parsed.get('type', 'unknown')
-                    
-                    if msg_type == 'error':
-                        self.add_log(f"Error: {msg}", "ERROR")
+                self.add_log("✓ ESP32 communication started", "SUCCESS")
+                self.add_log(f"Waiting {ESP32_INIT_DELAY}s for ESP32 initialization...", "INFO")
+                time.sleep(ESP32_INIT_DELAY)
+                
+                # Main monitoring loop
+                self.add_log("✓ Monitoring started!", "SUCCESS")
+                self.stats['status'] = 'Monitoring'
+                self.stats['esp32_ready'] = True
+                
+                message_count = 0
+                
+                while self.running:
+                    # Drain every buffered line per wakeup - no fixed sleep between lines
+                    # Digest emails of rate-limited devices and block deadlines become due on this thread
+                    for _, event in parser.sweep():
+                        if event.type == 'emergency':
+                            self.add_log("⚠️ Incomplete EMERGENCY block - queueing emergency email", "EMERGENCY")
+                            outbox.put(('emergency', event))
+                    for msg in esp32.get_messages(INGEST_BATCH_SIZE, timeout=0.5):
+                        message_count += 1
+                        self.stats['messages_processed'] += 1
+                        self.add_log(f"[MSG #{message_count}] {msg[:70]}", "RAW")
                         
-                    elif msg_type == 'status':
-                        # Extract status info
-                        if 'BASELINE' in msg:
-                            try:
-                                self.stats['baseline'] = int(msg.split(':')[1].strip())
-                                self.add_log(f"Baseline: {self.stats['baseline']}", "INFO")
-                            except:
-                                pass
-                        elif 'LOCATION' in msg:
-                            try:
-                                self.stats['location'] = msg.split(':')[-1].strip()
-                                self.add_log(f"Location: {self.stats['location']}", "INFO")
-                            except:
-                                pass
-                        else:
-                            self.add_log(f"Status: {msg}", "INFO")
-                    
-                    elif msg_type == 'emergency':
-                        self.stats['emergencies_detected'] += 1
-                        self.add_log(f"🚨 EMERGENCY DETECTED!", "EMERGENCY")
-                        self.add_log(f"Emergency data: {parsed}", "EMERGENCY")
+                        # Parse message
+                        parsed = parser.parse_message(msg)
+                        
+                        if parsed is None:
+                            continue
                         
-                        # Send email if cooldown period passed
-                        alert_type = 'emergency'
-                        current_time = time.time()
+                        msg_type = parsed.get('type', 'unknown')
                         
-                        if alert_type not in last_email_time or \
-                           (current_time - last_email_time[alert_type]) > EMAIL_COOLDOWN:
+                        if msg_type == 'error':
+                            self.add_log(f"Error: {msg}", "ERROR")
                             
-                            self.add_log("📧 Sending emergency email...", "SYSTEM")
-                            try:
-                                if email_sender.send_emergency_email(parsed):
-                                    self.add_log("✓ Emergency email sent successfully!", "SUCCESS")
-                                    last_email_time[alert_type] = current_time
-                                else:
-                                    self.add_log("✗ Failed to send emergency email", "ERROR")
-                            except Exception as e:
-                                self.add_log(f"✗ Emergency email error: {str(e)}", "ERROR")
-                        else:
-                            cooldown_remaining = EMAIL_COOLDOWN - (current_time - last_email_time[alert_type])
-                            self.add_log(f"⏱️ Emergency cooldown: {cooldown_remaining:.0f}s remaining", "INFO")
-                    
-                    elif msg_type == 'anomaly':
-                        self.stats['anomalies_detected'] += 1
-                        self.add_log(f"⚠️ ANOMALY DETECTED!", "WARNING")
-                        self.add_log(f"Anomaly data: {parsed}", "WARNING")
+                        elif msg_type == 'status':
+                            # Extract status info
+                            if 'BASELINE' in msg:
+                                try:
+                                    self.stats['baseline'] = int(msg.split(':')[1].strip())
+                                    self.add_log(f"Baseline: {self.stats['baseline']}", "INFO")
+                                except:
+                                    pass
+                            elif 'LOCATION' in msg:
+                                try:
+                                    self.stats['location'] = msg.split(':')[-1].strip()
+                                    self.add_log(f"Location: {self.stats['location']}", "INFO")
+                                except:
+                                    pass
+                            else:
+                                self.add_log(f"Status: {msg}", "INFO")
                         
-                        alert_type = 'anomaly'
-                        current_time = time.time()
+                        elif msg_type == 'emergency':
+                            self.stats['emergencies_detected'] += 1
+                            self.add_log(f"🚨 EMERGENCY DETECTED!", "EMERGENCY")
+                            self.add_log(f"Emergency data: {parsed}", "EMERGENCY")
+                            
+                            # The sender's per-device rate limit decides between an email and the digest
+                            self.add_log("📧 Queueing emergency email...", "SYSTEM")
+                            outbox.put(('emergency', parsed))
                         
-                        if alert_type not in last_email_time or \
-                           (current_time - last_email_time[alert_type]) > ANOMALY_COOLDOWN:
+                        elif msg_type == 'anomaly':
+                            self.stats['anomalies_detected'] += 1
+                            self.add_log(f"⚠️ ANOMALY DETECTED!", "WARNING")
+                            self.add_log(f"Anomaly data: {parsed}", "WARNING")
                             
-                            self.add_log("📧 Sending anomaly email...", "SYSTEM")
-                            try:
-                                if email_sender.send_anomaly_email(parsed):
-                                    self.add_log("✓ Anomaly email sent successfully!", "SUCCESS")
-                                    last_email_time[alert_type] = current_time
-                                else:
-                                    self.add_log("✗ Failed to send anomaly email", "ERROR")
-                            except Exception as e:
-                                self.add_log(f"✗ Anomaly email error: {str(e)}", "ERROR")
-                        else:
-                            cooldown_remaining = ANOMALY_COOLDOWN - (current_time - last_email_time[alert_type])
-                            self.add_log(f"⏱️ Anomaly cooldown: {cooldown_remaining:.0f}s remaining", "INFO")
+                            self.add_log("📧 Queueing anomaly email...", "SYSTEM")
+                            if not outbox.put(('anomaly', parsed), block=False):
+                                self.add_log("✗ Email queue full - anomaly email skipped", "ERROR")
                 
-                time.sleep(0.1)  # Small delay to prevent CPU spinning
-            
-            # Cleanup
-            self.add_log("Stopping monitoring...", "SYSTEM")
-            esp32.stop_reading()
-            esp32.disconnect()
-            self.add_log("✓ Monitoring stopped", "SUCCESS")
-            self.stats['status'] = 'Stopped'
-            
-            # Send "Monitoring Stopped" email
-            self.add_log("📧 Sending monitoring stopped notification...", "SYSTEM")
-            try:
-                uptime = datetime.now() - self.stats['start_time'] if self.stats['start_time'] else None
-                uptime_str = f"{uptime.seconds // 3600}h {(uptime.seconds % 3600) // 60}m {uptime.seconds % 60}s" if uptime else "Unknown"
+                # Cleanup
+                self.add_log("Stopping monitoring...", "SYSTEM")
+                esp32.stop_reading()
+                esp32.disconnect()
+                self.add_log("✓ Monitoring stopped", "SUCCESS")
+                self.stats['status'] = 'Stopped'
                 
-                stop_message = f"""
+                # Send "Monitoring Stopped" email
+                self.add_log("📧 Queueing monitoring stopped notification...", "SYSTEM")
+                try:
+                    uptime = datetime.now() - self.stats['start_time'] if self.stats['start_time'] else None
+                    uptime_str = f"{uptime.seconds // 3600}h {(uptime.seconds % 3600) // 60}m {uptime.seconds % 60}s" if uptime else "Unknown"
+                    
+                    stop_message = f"""
 ═══════════════════════════════════════════════════════════
 ⏹️ MONITORING STOPPED
 ═══════════════════════════════════════════════════════════
@@ -271,22 +260,16 @@ Restart the monitoring to resume detection.
 
 ═══════════════════════════════════════════════════════════
 """
-                msg = MIMEMultipart()
-                msg['From'] = EMAIL_USERNAME
-                msg['To'] = EMERGENCY_EMAIL
-                msg['Subject'] = "⏹️ Sound Detector Monitoring Stopped"
-                msg['X-Priority'] = '2'
-                msg.attach(MIMEText(stop_message, 'plain'))
-                
-                server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=5)
-                server.starttls()
-                server.login(EMAIL_USERNAME, EMAIL_PASSWORD)
-                server.sendmail(EMAIL_USERNAME, [EMERGENCY_EMAIL], msg.as_string())
-                server.quit()
-                
-                self.add_log("✓ Monitoring stopped email sent!", "SUCCESS")
-            except Exception as e:
-                self.add_log(f"⚠️ Could not send stop email: {str(e)}", "WARNING")
+                    outbox.put(('report', ("⏹️ Sound Detector Monitoring Stopped", stop_message)))
+                except Exception as e:
+                    self.add_log(f"⚠️ Could not send stop email: {str(e)}", "WARNING")
+            finally:
+                # Whatever is still queued goes out before the thread ends - also after a failed start
+                outbox.stop()
+                email_sender.flush_digests()  # sent inline by the stopped outbox
+                email_sender.close()
+                if spool:
+                    spool.close()
             
         except Exception as e:
             self.add_log(f"Error in monitoring loop: {str(e)}", "ERROR")
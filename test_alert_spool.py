@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Alert spool checks - batched commits, replay after a crash and outbox integration
+"""
+
+import sys
+import os
+import contextlib
+import io
+import sqlite3
+import tempfile
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'python_whatsapp'))
+
+import main as integration_module
+from alert_spool import AlertSpool
+from digest import DigestBuffer, HELD_BACK
+from events import EmergencyEvent, AnomalyEvent
+from outbox import Outbox
+from scheduler import Scheduler
+from testkit import FakeClock, run_tests, temporary_log_file
+from timer_wheel import TimerWheel
+
+def committed_rows(path):
+    """What a crash would leave: rows visible to another connection"""
+    db = sqlite3.connect(path)
+    try:
+        return db.execute('SELECT id, delivered FROM alerts ORDER BY id').fetchall()
+    finally:
+        db.close()
+
+def test_pending_alerts_survive_a_restart():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'spool.db')
+        spool = AlertSpool(path)
+        help_event = EmergencyEvent(emergency_type='VOICE_HELP', level=2875, location='Ward 3', device_id='ESP32_2')
+        first = spool.add('emergency', help_event)
+        second = spool.add('anomaly', AnomalyEvent(severity='HIGH', level=2400, baseline=210))
+        spool.delivered(second)
+        spool.close()
+
+        spool = AlertSpool(path)
+        pending = spool.pending()
+        spool.close()
+    assert [(spool_id, kind) for spool_id, kind, _ in pending] == [(first, 'emergency')]
+    event = pending[0][2]
+    assert isinstance(event, EmergencyEvent) and event.to_dict() == help_event.to_dict()
+    assert event.time_ns == help_event.time_ns
+
+def test_writes_are_batched_until_a_commit():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'spool.db')
+        spool = AlertSpool(path, batch_size=10)
+        ids = [spool.add('anomaly', AnomalyEvent(level=index)) for index in range(5)]
+        assert committed_rows(path) == []
+        spool.commit(ids[2])
+        assert len(committed_rows(path)) == 5 and spool.commits == 1
+        spool.commit(ids[2])  # already on disk - no second commit
+        for index in range(10):
+            spool.add('anomaly', AnomalyEvent(level=index))
+        assert len(committed_rows(path)) == 15 and spool.commits == 2
+        spool.close()
+
+def test_open_batches_are_flushed_by_the_scheduler():
+    clock = FakeClock()
+    scheduler = Scheduler(TimerWheel(tick=0.1, slots=64, clock=clock))
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'spool.db')
+        spool = AlertSpool(path, scheduler=scheduler, flush_interval=1.0)
+        spool.add('emergency', EmergencyEvent(emergency_type='HELP'))
+        spool.add('emergency', EmergencyEvent(emergency_type='HELP'))
+        assert len(scheduler) == 1 and committed_rows(path) == []
+        clock.now += 1.2
+        scheduler.advance()
+        assert len(committed_rows(path)) == 2
+        spool.close()
+
+def test_outbox_spools_before_sending_and_replays_after_a_crash():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'spool.db')
+        seen_on_disk = []
+
+        def deliver(kind, data):
+            seen_on_disk.append(len(committed_rows(path)))
+            return data.get('level') != 'unreachable'
+        spool = AlertSpool(path, batch_size=100)
+        outbox = Outbox('notify', deliver, retries=0, spool=spool).start()
+        with contextlib.redirect_stdout(io.StringIO()):
+            outbox.put(('emergency', EmergencyEvent(level=2875)))
+            outbox.put(('emergency', EmergencyEvent(level='unreachable')))
+            outbox.put(('report', ('Daily report', 'body', 'sent')))
+            outbox.stop()
+        spool.close()
+        assert seen_on_disk[0] >= 1  # committed before the first send
+
+        # Next start: only the undelivered emergency comes back
+        sent = []
+        spool = AlertSpool(path)
+        outbox = Outbox('notify', lambda kind, data: sent.append((kind, data.get('level'))), spool=spool).start()
+        assert outbox.replay() == 1
+        outbox.stop()
+        assert spool.pending() == []
+        spool.close()
+    assert sent == [('emergency', 'unreachable')]
+
+def test_integration_resends_what_the_last_run_left():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'spool.db')
+        spool = AlertSpool(path)
+        spool.add('emergency', EmergencyEvent(emergency_type='HELP', location='Ward 3'))
+        spool.close()
+
+        spool_file = integration_module.ALERT_SPOOL_FILE
+        integration_module.ALERT_SPOOL_FILE = path
+        try:
+            with temporary_log_file():
+                integration = integration_module.ESP32EmailIntegration()
+                integration.email_sender.dry_run = True
+                with contextlib.redirect_stdout(io.StringIO()) as output:
+                    integration._start_pipeline()
+                    integration.pipeline.stop()
+                assert integration.spool.pending() == []
+                integration.spool.close()
+        finally:
+            integration_module.ALERT_SPOOL_FILE = spool_file
+    assert "Resending 1 alert email(s)" in output.getvalue()
+    assert "[dry run] Would email" in output.getvalue()
+
+def test_a_spooled_digest_takes_over_its_alerts_rows():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'spool.db')
+        buffer = DigestBuffer()
+
+        def deliver(kind, data):
+            if kind == 'anomaly':
+                buffer.add('anomaly', data, outbox.current_spool_id())
+                return HELD_BACK
+            return False  # the SMTP server is down when the digest is due
+        spool = AlertSpool(path)
+        outbox = Outbox('notify', deliver, retries=0, spool=spool).start()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for level in (2400, 3900):
+                outbox.put(('anomaly', AnomalyEvent(severity='HIGH', level=level, device_id='ESP32_1')))
+            deadline = time.monotonic() + 2
+            while buffer.held() < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            # Held back: still pending, the digest has not taken them over yet
+            assert [kind for _, kind, _ in spool.pending()] == ['anomaly', 'anomaly']
+            outbox.put(('digest', ('anomaly', buffer.take('anomaly'))))
+            outbox.stop()
+        spool.close()
+
+        # Next start: the digest comes back in place of the two anomalies
+        sent = []
+        spool = AlertSpool(path)
+        outbox = Outbox('notify', lambda kind, data: sent.append((kind, data)) or True, spool=spool).start()
+        assert outbox.replay() == 1
+        outbox.stop()
+        assert spool.pending() == []
+        spool.close()
+    [(kind, (digest_kind, digests))] = sent
+    assert (kind, digest_kind, len(digests)) == ('digest', 'anomaly', 1)
+    assert (digests[0].device_id, digests[0].count, digests[0].peak_level) == ('ESP32_1', 2, 3900)
+    assert digests[0].breakdown_text() == 'HIGH x2' and digests[0].first <= digests[0].last
+
+def test_integration_keeps_held_back_alerts_across_a_crash():
+    with tempfile.TemporaryDirectory() as directory, temporary_log_file():
+        path = os.path.join(directory, 'spool.db')
+        integration = integration_module.ESP32EmailIntegration()
+        integration.email_sender.dry_run = True
+        integration.spool = integration.pipeline['notify'].spool = AlertSpool(path)
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            integration.pipeline.start()
+            for _ in range(2):
+                integration._handle_emergency(EmergencyEvent(emergency_type='HELP', location='Ward 3'))
+            deadline = time.monotonic() + 2
+            while integration.email_sender.digests.held() < 1 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            integration.pipeline.stop()
+        # Crash during the cooldown: the digest only existed in memory
+        integration.spool.close()
+        assert "added to the digest" in output.getvalue()
+
+        spool = AlertSpool(path)
+        pending = spool.pending()
+        spool.close()
+    assert [(kind, data.get('emergency_type')) for _, kind, data in pending] == [('emergency', 'HELP')]
+
+if __name__ == "__main__":
+    sys.exit(run_tests(globals()))
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Serial reader checks - line splitting, the chunked read thread and the asyncio iterator
+"""
+
+import sys
+import os
+import asyncio
+import contextlib
+import io
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'python_whatsapp'))
+
+import serial
+import main as integration_module
+from arduino_reader import ArduinoReader, LineBuffer
+from testkit import pty_port, run_tests, temporary_log_file
+
+LINES = [b"STATUS:READY", b"STATUS:BASELINE:210", b"STATUS:LOCATION:Ward 3"] + \
+        [b"STATUS:CURRENT_LEVEL:%d" % level for level in range(200)]
+
+@contextlib.contextmanager
+def attached_reader(device, **options):
+    """ArduinoReader on an open pty connection, disconnected afterwards"""
+    reader = ArduinoReader(device, 115200, echo=False, **options)
+    with contextlib.redirect_stdout(io.StringIO()):
+        reader.attach(serial.Serial(device, 115200, timeout=0.1))
+        try:
+            yield reader
+        finally:
+            reader.disconnect()
+
+def collect(reader, count, timeout=2.0):
+    """Lines from the reader's queue until count arrived or timeout passed"""
+    lines = []
+    deadline = time.monotonic() + timeout
+    while len(lines) < count and time.monotonic() < deadline:
+        lines += reader.get_messages(timeout=0.1)
+    return lines
+
+def test_lines_split_across_chunks_are_joined():
+    buffer = LineBuffer()
+    assert buffer.feed(b"STATUS:REA") == []
+    assert buffer.feed(b"DY\nSTATUS:BASE") == [b"STATUS:READY"]
+    assert buffer.feed(b"LINE:210\nALERT:START\n") == [b"STATUS:BASELINE:210", b"ALERT:START"]
+    assert buffer.pending == bytearray()
+
+def test_crlf_split_at_a_chunk_boundary():
+    buffer = LineBuffer()
+    assert buffer.feed(b"EMERGENCY:HELP_DETECTED\r") == []
+    assert buffer.feed(b"\nEMERGENCY:START\r\n\r\n") == [b"EMERGENCY:HELP_DETECTED", b"EMERGENCY:START"]
+
+def test_runaway_line_is_discarded():
+    buffer = LineBuffer(max_line_length=64)
+    assert buffer.feed(b"\xff" * 50) == []
+    assert buffer.feed(b"\xfe" * 50) == []  # over the limit without a newline - dropped
+    assert len(buffer.pending) == 0
+    assert buffer.feed(b"STATUS:READY\n") == [b"STATUS:READY"]
+
+def test_trailing_partial_line_waits_for_its_newline():
+    buffer = LineBuffer()
+    assert buffer.feed(b"STATUS:CURRENT_LEVEL:412\nSTATUS:CURRENT_LE") == [b"STATUS:CURRENT_LEVEL:412"]
+    assert buffer.pending == bytearray(b"STATUS:CURRENT_LE")
+    assert buffer.feed(b"VEL:415\n") == [b"STATUS:CURRENT_LEVEL:415"]
+    buffer.feed(b"STATUS:CURR")
+    buffer.clear()  # reconnect: the partial line belonged to the old session
+    assert buffer.feed(b"STATUS:READY\n") == [b"STATUS:READY"]
+
+def test_chunked_read_thread_splits_and_queues_lines():
+    with pty_port() as (master, device):
+        with attached_reader(device) as reader:
+            assert reader.start_reading()
+            for chunk in (b"STATUS:READY\r", b"\nSTATUS:BASELINE:2", b"10\r\nSTATUS:CURRENT_LEVEL:412\r\n",
+                          b"EMERGENCY:HELP_DETECTED\r\n"):
+                os.write(master, chunk)
+                time.sleep(0.02)
+            lines = collect(reader, 4)
+            thread = reader.read_thread
+        assert not thread.is_alive()
+    assert sorted(lines) == sorted(["STATUS:READY", "STATUS:BASELINE:210",
+                                    "STATUS:CURRENT_LEVEL:412", "EMERGENCY:HELP_DETECTED"])
+    assert lines.index("STATUS:READY") < lines.index("STATUS:BASELINE:210") < lines.index("STATUS:CURRENT_LEVEL:412")
+
+def test_chunked_read_thread_drains_a_burst():
+    with pty_port() as (master, device):
+        with attached_reader(device, raw_lines=True, queue_size=5000) as reader:
+            reader.start_reading()
+            os.write(master, b"".join(b"STATUS:CURRENT_LEVEL:%d\r\n" % level for level in range(2000)))
+            lines = collect(reader, 2000)
+    assert lines == [b"STATUS:CURRENT_LEVEL:%d" % level for level in range(2000)]
+
+class NoDescriptor:
+    """A connection without a pollable file descriptor, like a Windows COM port"""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def fileno(self):
+        raise OSError("no file descriptor")
+
+    def __getattr__(self, name):
+        return getattr(self.connection, name)
+
+async def read_lines(reader, master, count):
+    """Write LINES in small chunks and collect count lines with `async for`"""
+    loop = asyncio.get_running_loop()
+    data = b"".join(line + b"\r\n" for line in LINES)
+    loop.call_soon(lambda: [os.write(master, data[start:start + 37]) for start in range(0, len(data), 37)])
+    lines = []
+    async for line in reader:
+        lines.append(line)
+        if len(lines) == count:
+            reader.stop_reading()  # ends the iteration like Ctrl+C does
+    return lines
+
+def test_async_lines_arrive_in_order_and_stop_cleanly():
+    expected = [line.decode() for line in LINES]
+    with pty_port() as (master, device):
+        with attached_reader(device) as reader:
+            lines = asyncio.run(asyncio.wait_for(read_lines(reader, master, len(LINES)), 5))
+            assert reader.async_lines is None and reader.async_loop is None
+    assert lines == expected
+
+def test_async_lines_start_with_the_banner_read_while_probing():
+    with pty_port() as (master, device):
+        reader = ArduinoReader(device, 115200, echo=False)
+        with contextlib.redirect_stdout(io.StringIO()):
+            reader.attach(serial.Serial(device, 115200, timeout=0.1), ["STATUS:DEVICE_TYPE:ESP32", "STATUS:READY"])
+            try:
+                lines = asyncio.run(asyncio.wait_for(read_lines(reader, master, len(LINES) + 2), 5))
+            finally:
+                reader.disconnect()
+    assert lines == ["STATUS:DEVICE_TYPE:ESP32", "STATUS:READY"] + [line.decode() for line in LINES]
+    assert reader.message_queue.empty()
+
+def test_async_executor_fallback_for_ports_without_a_descriptor():
+    expected = [line.decode() for line in LINES]
+    with pty_port() as (master, device):
+        with attached_reader(device) as reader:
+            reader.serial_connection = NoDescriptor(reader.serial_connection)
+            lines = asyncio.run(asyncio.wait_for(read_lines(reader, master, len(LINES)), 5))
+            assert reader.async_lines is None
+    assert lines == expected
+
+def test_run_async_processes_lines_and_shuts_down():
+    with pty_port() as (master, device), temporary_log_file():
+        spool_file = integration_module.ALERT_SPOOL_FILE
+        integration_module.ALERT_SPOOL_FILE = None
+        try:
+            integration = integration_module.ESP32EmailIntegration()
+            integration.email_sender.dry_run = True
+            integration.esp32.echo = False
+            integration._input_handler = lambda: None
+            seen = []
+            integration.esp32.add_line_listener(seen.append)
+
+            def setup(start_reading=True):
+                integration.esp32.attach(serial.Serial(device, 115200, timeout=0.1), ["STATUS:BASELINE:205"])
+                return True
+            integration.setup = setup
+
+            async def monitor():
+                task = asyncio.ensure_future(integration.run_async())
+                await asyncio.sleep(0.05)
+                os.write(master, b"".join(line + b"\r\n" for line in LINES))
+                while integration.stats['messages_processed'] < len(LINES) + 1:
+                    await asyncio.sleep(0.01)
+                integration.esp32.stop_reading()
+                return await task
+            with contextlib.redirect_stdout(io.StringIO()) as output:
+                assert asyncio.run(asyncio.wait_for(monitor(), 10))
+        finally:
+            integration_module.ALERT_SPOOL_FILE = spool_file
+    assert seen == LINES and integration.stats['messages_processed'] == len(LINES) + 1
+    assert integration.scheduler.wake is None and integration.esp32.async_lines is None
+    assert "Shutting down" in output.getvalue()
+
+if __name__ == "__main__":
+    sys.exit(run_tests(globals()))
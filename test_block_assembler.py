@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Block assembler checks - per-device blocks, deadlines and the timer wheel
+"""
+
+import sys
+import os
+import contextlib
+import io
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'python_whatsapp'))
+
+from block_assembler import BlockAssembler
+from main_no_arduino_test import ArduinoEmailIntegration
+from message_parser import ArduinoMessageParser
+from testkit import FakeClock, run_tests
+from timer_wheel import TimerWheel
+
+def make_parser(timeout=2.0, max_fields=32):
+    clock = FakeClock()
+    wheel = TimerWheel(tick=0.1, slots=16, clock=clock)
+    return ArduinoMessageParser(BlockAssembler(timeout, max_fields, wheel=wheel)), clock
+
+def test_wheel_fires_in_order_and_never_early():
+    clock = FakeClock()
+    wheel = TimerWheel(tick=0.1, slots=8, clock=clock)
+    fired = []
+    wheel.schedule(0.25, fired.append, 'a')
+    late = wheel.schedule(5.0, fired.append, 'c')  # several turns of an 8-slot wheel
+    wheel.schedule(0.25, fired.append, 'b')
+    cancelled = wheel.schedule(0.3, fired.append, 'x')
+    wheel.cancel(cancelled)
+
+    clock.now += 0.2
+    assert wheel.advance() == 0
+    clock.now += 0.1
+    assert wheel.advance() == 2 and fired == ['a', 'b']
+    clock.now += 4.6
+    wheel.advance()
+    assert fired == ['a', 'b'] and late.active
+    clock.now += 0.2
+    wheel.advance()
+    assert fired == ['a', 'b', 'c'] and len(wheel) == 0
+
+def test_interleaved_devices_do_not_mix():
+    parser, _ = make_parser()
+    parser.parse_line("ALERT:START", 'dev1')
+    parser.parse_line("ALERT:START", 'dev2')
+    parser.parse_line("ALERT:LEVEL:900", 'dev1')
+    parser.parse_line("ALERT:LEVEL:2500", 'dev2')
+    first = parser.parse_line("ALERT:END", 'dev1')
+    second = parser.parse_line("ALERT:END", 'dev2')
+    assert first['level'] == 900 and second['level'] == 2500
+
+def test_block_without_end_times_out():
+    parser, clock = make_parser()
+    parser.parse_line("EMERGENCY:START")
+    parser.parse_line("EMERGENCY:ID:3")
+    parser.parse_line("ALERT:START")
+    parser.parse_line("ALERT:LEVEL:900")
+    clock.now += 1.0
+    assert parser.sweep() == []
+    clock.now += 1.1
+    [(device, emergency)] = parser.sweep()  # partial emergencies are flushed, alerts dropped
+    assert device is None and emergency['emergency_id'] == '3' and emergency['incomplete']
+    assert parser.parse_line("ALERT:LEVEL:901") is None and len(parser.assembler) == 0
+    assert parser.assembler.stats['timed_out'] == 2
+
+def test_restart_and_overflow_close_the_open_block():
+    parser, _ = make_parser(max_fields=3)
+    parser.parse_line("EMERGENCY:START")
+    parser.parse_line("EMERGENCY:ID:1")
+    parser.parse_line("EMERGENCY:START")  # board reset mid-block
+    for field in range(5):
+        parser.parse_line(f"EMERGENCY:ID:{field}")
+    assert parser.parse_line("EMERGENCY:END") is None
+    flushed = [event['emergency_id'] for _, event in parser.sweep()]
+    assert flushed == ['1', '2']
+    stats = parser.assembler.stats
+    assert stats['restarted'] == 1 and stats['overflowed'] == 1 and stats['completed'] == 0
+
+def test_no_arduino_entry_point_flushes_a_cut_off_emergency():
+    integration = ArduinoEmailIntegration()
+    handled = []
+    integration._handle_emergency = handled.append
+    sweep = integration.parser.sweep
+    integration.parser.sweep = lambda: sweep(time.monotonic() + 2.5)  # the END line never came
+    integration.parser.parse_message("EMERGENCY:START")
+    integration.parser.parse_message("EMERGENCY:ID:7")
+    assert integration.scheduler.wait_timeout() <= 2.1
+    with contextlib.redirect_stdout(io.StringIO()):
+        integration._sweep_blocks()
+    assert [event['emergency_id'] for event in handled] == ['7'] and handled[0]['incomplete']
+
+if __name__ == "__main__":
+    sys.exit(run_tests(globals()))
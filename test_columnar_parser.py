@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Columnar parser checks - vectorized columns agree with the line-by-line parser
+"""
+
+import sys
+import os
+import tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'python_whatsapp'))
+
+import numpy as np
+from columnar_parser import (ALERT_LEVEL, CURRENT, CURRENT_LEVEL, LEVEL, SOUND_LEVEL,
+                             parse_buffer, parse_file, parse_recording)
+from message_parser import ArduinoMessageParser
+from protocol_spec import format_block
+from session_recorder import SessionRecorder, iter_sessions
+from testkit import run_tests
+
+CAPTURE = (b"STATUS:BASELINE:210\r\n"
+           b"STATUS:CURRENT_LEVEL:412\r\n"
+           + format_block('ALERT', {'ID': 1, 'LEVEL': 2100, 'BASELINE': 205, 'DIFFERENCE': 1895,
+                                    'SEVERITY': 'CRITICAL'})
+           + format_block('EMERGENCY', {'ID': 1, 'TYPE': 'VOICE_HELP', 'SOUND_LEVEL': 2875})
+           + b"LEVEL:99\nCURRENT:7\nSTATUS:CURRENT_LEVEL:x\nCALIBRATION:PROGRESS:40\nSTATUS:CURRENT_LEVEL:5")
+
+def test_buffer_columns():
+    columns = parse_buffer(CAPTURE)
+    assert list(columns['kind']) == [CURRENT_LEVEL, ALERT_LEVEL, SOUND_LEVEL, LEVEL, CURRENT, CURRENT_LEVEL]
+    assert list(columns['level']) == [412, 2100, 2875, 99, 7, 5]
+    # Alerts use their own baseline/difference, other rows the last baseline seen
+    assert list(columns['baseline']) == [210, 205, 205, 205, 205, 205]
+    assert list(columns['difference']) == [202, 1895, 2670, -106, -198, -200]
+    assert np.isnan(columns['timestamp']).all()
+
+def test_recording_matches_line_parser():
+    lines = [line.encode() for line in CAPTURE.decode().replace('\r\n', '\n').split('\n')] * 50
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'session.rec')
+        recorder = SessionRecorder(path).open()
+        for line in lines:
+            recorder.record(line)
+        recorder.close()
+        columns = parse_recording(path, device=3)
+        (start_epoch, records), = iter_sessions(path)
+
+    parser = ArduinoMessageParser()
+    expected_levels = []
+    for line in lines:
+        event = parser.parse_bytes(line)
+        if event is not None and event.get('field') == 'current_level' and line[21:].isdigit():
+            expected_levels.append(int(event['value']))
+        elif event is not None and event.type == 'anomaly':
+            expected_levels.append(event['level'])
+    assert list(columns['level'][columns['kind'] <= ALERT_LEVEL]) == expected_levels
+
+    times = start_epoch + np.cumsum([delta for delta, _ in records]) / 1e6
+    assert np.allclose(columns['timestamp'][:2], times[1:3])  # rows 0-1 are lines 1-2
+    assert (columns['device'] == 3).all()
+
+def test_empty_capture_gives_empty_columns():
+    with tempfile.TemporaryDirectory() as directory:
+        capture = os.path.join(directory, 'capture.txt')
+        open(capture, 'wb').close()
+        recording = os.path.join(directory, 'session.rec')
+        SessionRecorder(recording).open().close()  # started, then stopped before any line
+        results = [parse_buffer(b''), parse_buffer(b'\r\n\n'), parse_file(capture), parse_recording(recording)]
+    for columns in results:
+        assert set(columns) == set(parse_buffer(CAPTURE))
+        assert all(len(column) == 0 for column in columns.values())
+
+if __name__ == "__main__":
+    sys.exit(run_tests(globals()))
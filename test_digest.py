@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Digest checks - alerts held back by the rate limit are summarised, not dropped
+"""
+
+import sys
+import os
+import contextlib
+import io
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'python_whatsapp'))
+
+from config import ANOMALY_COOLDOWN, EMERGENCY_COOLDOWN
+from digest import DigestBuffer, HELD_BACK
+from email_sender import EmailSender
+from events import AnomalyEvent, EmergencyEvent
+from main import ESP32EmailIntegration
+from scheduler import Scheduler
+from testkit import FakeClock, run_tests, temporary_log_file
+from timer_wheel import TimerWheel
+
+def anomaly(device, severity, level, at_ns=0):
+    event = AnomalyEvent(severity=severity, level=level, baseline=210, location='Ward 3')
+    event.device_id = device
+    event.time_ns += at_ns
+    return event
+
+@contextlib.contextmanager
+def recording_sender(**options):
+    """EmailSender on a fake clock whose emails are collected instead of sent"""
+    clock = FakeClock()
+    scheduler = Scheduler(TimerWheel(tick=0.1, slots=64, clock=clock))
+    with temporary_log_file():
+        sender = EmailSender(scheduler=scheduler, **options)
+        sender.sent = []
+        sender._send_email = lambda subject, message, is_emergency=False, trace=None: \
+            sender.sent.append((subject, message)) or True
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield sender, scheduler, clock
+
+def test_digest_summarises_per_device_and_kind():
+    buffer = DigestBuffer()
+    for index, (severity, level) in enumerate([('HIGH', 2400), ('CRITICAL', 3900), ('HIGH', 2600)]):
+        buffer.add('anomaly', anomaly('ESP32_1', severity, level, at_ns=index * 10**9))
+    buffer.add('anomaly', anomaly('ESP32_2', 'HIGH', '2500'))
+    buffer.add('emergency', EmergencyEvent(emergency_type='VOICE_HELP', level=2875))
+    assert buffer.held() == 5 and buffer.held('anomaly') == 4
+
+    first, second = buffer.take('anomaly')
+    assert (first.device_id, first.count, first.peak_level) == ('ESP32_1', 3, 3900)
+    assert round((first.last - first.first).total_seconds()) == 2
+    assert first.breakdown_text() == 'HIGH x2, CRITICAL x1'
+    assert (second.device_id, second.peak_level) == ('ESP32_2', 2500)
+    assert buffer.kinds() == ['emergency'] and buffer.take('anomaly') == []
+
+def test_rate_limit_collects_a_devices_alerts_into_one_digest_email():
+    with recording_sender() as (sender, scheduler, clock):
+        assert sender.send_anomaly_email(anomaly('ESP32_1', 'HIGH', 2400))
+        for severity, level in [('CRITICAL', 3900), ('HIGH', 2450)]:
+            assert sender.send_anomaly_email(anomaly('ESP32_1', severity, level)) is HELD_BACK
+        # A noisy ESP32_1 does not hold back ESP32_2
+        assert sender.send_anomaly_email(anomaly('ESP32_2', 'HIGH', 2500))
+        assert len(sender.sent) == 2
+        clock.now += ANOMALY_COOLDOWN + 0.2
+        scheduler.advance()
+    assert len(sender.sent) == 3 and sender.digest_count == 1
+    subject, message = sender.sent[2]
+    assert subject.startswith('📋 Anomaly Digest - 2 alert(s) during cooldown - Ward 3')
+    assert 'Device: ESP32_1 (ESP32) - Ward 3\n- Alerts: 2\n- Peak Sound Level: 3900/4095' in message
+    assert '- Severity: CRITICAL x1, HIGH x1' in message
+    assert 'Device: ESP32_2' not in message
+
+def test_steady_alerts_cost_one_email_per_cooldown():
+    with recording_sender() as (sender, scheduler, clock):
+        for _ in range(90):  # one HIGH anomaly every 10s for 15 minutes
+            sender.send_anomaly_email(anomaly('ESP32_1', 'HIGH', 2400))
+            clock.now += 10
+            scheduler.advance()
+        clock.now += 2 * ANOMALY_COOLDOWN
+        scheduler.advance()
+    assert sender.anomaly_count == 1 and len(sender.sent) <= 900 // ANOMALY_COOLDOWN + 2
+    digested = sum(int(message.split(' anomaly alert(s)')[0].split()[-1]) for _, message in sender.sent[1:])
+    assert digested == 89
+    assert sender.digests.held() == 0 and not sender.digests_due
+
+def test_emergency_digests_are_sent_with_high_priority():
+    flagged = []
+    with recording_sender() as (sender, scheduler, clock):
+        sender._send_email = lambda subject, message, is_emergency=False, trace=None: flagged.append(is_emergency) or True
+        sender.send_emergency_email(EmergencyEvent(emergency_type='HELP'))
+        sender.send_emergency_email(EmergencyEvent(emergency_type='VOICE_HELP'))
+        clock.now += EMERGENCY_COOLDOWN + 0.2
+        scheduler.advance()
+    assert flagged == [True, True] and sender.digest_count == 1
+
+def test_shutdown_sends_digests_still_collecting():
+    queued = []
+    with recording_sender(queue_digest=lambda kind, digests: queued.append((kind, digests))) as (sender, _, _):
+        for device in ('ESP32_1', 'ESP32_1', 'ESP32_2', 'ESP32_2'):
+            sender.send_anomaly_email(anomaly(device, 'HIGH', 2400))
+        assert sender.flush_digests() == 2
+        assert not sender.digests_due and sender.digests.held() == 0
+    assert [(kind, len(digests)) for kind, digests in queued] == [('anomaly', 2)]
+
+def test_integration_sends_digests_through_the_outbox():
+    integration = ESP32EmailIntegration()
+    sent = []
+    integration.email_sender.send_digest_email = lambda kind, digests: sent.append((kind, len(digests))) or True
+    buffer = DigestBuffer()
+    buffer.add('anomaly', anomaly('ESP32_1', 'HIGH', 2400))
+    with contextlib.redirect_stdout(io.StringIO()):
+        integration.pipeline.start()
+        integration._queue_digest('anomaly', buffer.take('anomaly'))
+        integration.pipeline.stop()
+    assert sent == [('anomaly', 1)]
+    assert integration.pipeline.metrics()['notify']['processed'] == 1
+
+if __name__ == "__main__":
+    sys.exit(run_tests(globals()))
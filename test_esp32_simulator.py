@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+ESP32 simulator checks - firmware protocol, commands and multi-device hub
+"""
+
+import sys
+import os
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'python_whatsapp'))
+
+import serial
+from arduino_reader import ArduinoReader
+from esp32_simulator import ESP32Simulator, SimulatedESP32
+from message_parser import ArduinoMessageParser
+from serial_hub import SerialHub
+from testkit import run_tests
+
+def collect(reader, until, timeout=3.0):
+    """Read lines until `until(lines)` is true or the timeout expires"""
+    lines = []
+    deadline = time.time() + timeout
+    while time.time() < deadline and not until(lines):
+        message = reader.get_message(timeout=0.05)
+        if message is not None:
+            lines.append(message)
+    return lines
+
+def open_reader(port):
+    reader = ArduinoReader(port, 115200, echo=False)
+    reader.attach(serial.Serial(port, 115200, timeout=0.1))
+    reader.start_reading()
+    return reader
+
+def test_firmware_output_keeps_missing_newlines():
+    firmware = SimulatedESP32()
+    banner = b''.join(data for _, data in firmware.setup())
+    assert b"STATUS:DEVICE_TYPE:ESP32STATUS:CPU_FREQ:240\r\n" in banner
+    assert banner.count(b"CALIBRATION:PROGRESS:") == 8
+    assert b"\r\nSTATUS:READY\r\nBASELINE:" in banner
+
+    emergency = b''.join(data for _, data in firmware.handle_help_command(2875))
+    assert b"EMERGENCY:TYPE:VOICE_HELPEMERGENCY:SOUND_LEVEL:2875\r\n" in emergency
+    assert emergency.endswith(b"HELP command detected - Emergency alert sent!\r\n")
+
+def test_reader_sees_banner_alerts_and_emergencies():
+    simulator = ESP32Simulator(devices=1, alert_rate=50, help_rate=5, seed=3).start()
+    reader = open_reader(simulator.ports[0])
+    try:
+        lines = collect(reader, lambda lines: lines.count("EMERGENCY:END") >= 2)
+    finally:
+        reader.disconnect()
+        simulator.stop()
+
+    assert "STATUS:READY" in lines
+    parser = ArduinoMessageParser()
+    parsed = [data for data in map(parser.parse_message, lines) if data]
+    alerts = [data for data in parsed if data['type'] == 'anomaly']
+    emergencies = [data for data in parsed if data['type'] == 'emergency' and 'emergency_id' in data]
+    assert alerts and all(isinstance(alert['level'], int) for alert in alerts)
+    assert emergencies and emergencies[0]['location'] == "Home Office"
+
+def test_commands_are_answered():
+    simulator = ESP32Simulator(devices=1, alert_rate=0, help_rate=0, seed=4).start()
+    reader = open_reader(simulator.ports[0])
+    try:
+        collect(reader, lambda lines: "Say 'HELP' for emergency assistance" in lines)
+        reader.send_command("STATUS")
+        status = collect(reader, lambda lines: any(line.startswith("STATUS:FREE_MEMORY:") for line in lines))
+        reader.send_command("SENSITIVITY:90")
+        sensitivity = collect(reader, lambda lines: lines)
+    finally:
+        reader.disconnect()
+        simulator.stop()
+
+    assert status[0] == "STATUS:UPDATE"
+    assert sensitivity == ["COMMAND:SENSITIVITY:SET:90"]
+
+def test_hub_reads_every_simulated_device():
+    simulator = ESP32Simulator(devices=3, alert_rate=20, help_rate=0, seed=5).start()
+    hub = SerialHub()
+    try:
+        for index, port in enumerate(simulator.ports):
+            hub.add_device(port, f"SIM_{index}", 115200)
+        seen = set()
+        deadline = time.time() + 3
+        while len(seen) < 3 and time.time() < deadline:
+            seen.update(device.device_id for device, line in hub.poll(0.1) if line == "ALERT:END")
+    finally:
+        hub.close()
+        simulator.stop()
+    assert seen == {"SIM_0", "SIM_1", "SIM_2"}
+
+if __name__ == "__main__":
+    sys.exit(run_tests(globals()))
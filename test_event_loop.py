@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Event loop checks - timer deadlines and wakeups replace the polling timeouts
+"""
+
+import sys
+import os
+import contextlib
+import io
+import random
+import tempfile
+import threading
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'python_whatsapp'))
+
+from arduino_reader import ArduinoReader
+from ingest_queue import BoundedMessageQueue
+from main import ESP32EmailIntegration
+from serial_hub import SerialHub
+from session_recorder import SessionRecorder
+from testkit import FakeClock, run_tests
+from timer_wheel import TimerWheel
+
+def wake_later(wake, delay=0.05):
+    threading.Timer(delay, wake).start()
+
+def test_next_deadline_is_the_first_tick_with_a_due_timer():
+    clock = FakeClock()
+    wheel = TimerWheel(tick=0.1, slots=8, clock=clock)
+    assert wheel.next_deadline() is None
+    rng = random.Random(5)
+    timers = [wheel.schedule(rng.uniform(0, 5), lambda: None) for _ in range(40)]
+    for _ in range(60):
+        pending = [timer.deadline for timer in timers if timer.active]
+        deadline = wheel.next_deadline()
+        if not pending:
+            assert deadline is None
+            break
+        # Never before the earliest deadline and at most one tick after it
+        assert min(pending) <= deadline + 1e-9 < min(pending) + 0.1 + 1e-9
+        clock.now = deadline
+        assert wheel.advance() >= 1, "advance() at next_deadline() fired nothing"
+
+def test_queue_wake_ends_a_wait_without_timeout():
+    queue = BoundedMessageQueue()
+    wake_later(queue.wake)
+    start = time.perf_counter()
+    assert queue.get_many(timeout=None) == []
+    assert time.perf_counter() - start < 1.0
+    # The wakeup is used up - the next wait blocks again until a line arrives
+    assert queue.get_many(timeout=0.05) == []
+    wake_later(lambda: queue.put(b"STATUS:READY"))
+    assert queue.get_many(timeout=None) == [b"STATUS:READY"]
+
+def test_wake_before_the_wait_is_not_lost():
+    queue = BoundedMessageQueue()
+    queue.wake()
+    assert queue.get_many(timeout=None) == []
+
+def test_hub_wake_ends_a_poll_without_timeout():
+    hub = SerialHub()
+    try:
+        wake_later(hub.wake)
+        start = time.perf_counter()
+        assert hub.poll(None) == []
+        assert time.perf_counter() - start < 1.0
+    finally:
+        hub.close()
+
+def test_replay_loop_ends_without_polling():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'session.rec')
+        reader = ArduinoReader('SIM', 115200, echo=False)
+        recorder = SessionRecorder(path).attach(reader)
+        for level in range(2000):
+            reader._dispatch_line(b"STATUS:CURRENT_LEVEL:%d" % level)
+        recorder.close()
+
+        integration = ESP32EmailIntegration()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            assert integration.run_replay(path, speed=None)
+        assert integration.stats['messages_processed'] == 2000
+        assert time.perf_counter() - start < 5.0
+
+if __name__ == "__main__":
+    sys.exit(run_tests(globals()))
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Event footprint checks - tracemalloc measures what each parsed event keeps alive
+"""
+
+import sys
+import os
+import tracemalloc
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'python_whatsapp'))
+
+from events import AnomalyEvent, StatusEvent
+from message_parser import ArduinoMessageParser
+from protocol_spec import format_block
+from testkit import run_tests
+
+EVENTS = 2000
+
+def retained_per_item(build):
+    """Bytes still allocated per item after build() returns its list"""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        items = build()
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return (after - before) / len(items)
+
+def alert_lines(count):
+    lines = []
+    for alert_id in range(count):
+        block = format_block('ALERT', {'ID': alert_id, 'TIMESTAMP': 1000 + alert_id, 'LEVEL': 2100,
+                                       'BASELINE': 200, 'DIFFERENCE': 1900, 'SEVERITY': 'CRITICAL',
+                                       'LOCATION': 'Home Office', 'UPTIME': '0h:1m:2s'})
+        lines.extend(block.decode().split('\r\n')[:-1])
+    return lines
+
+def test_anomaly_event_is_smaller_than_the_old_dict():
+    values = dict(alert_id='7', arduino_timestamp='1234', level=2100, baseline=200, difference=1900,
+                  severity='CRITICAL', location='Home Office', uptime='0h:1m:2s')
+    event_bytes = retained_per_item(lambda: [AnomalyEvent(**values) for _ in range(EVENTS)])
+    # What the parser used to keep per alert: a dict with an ISO timestamp string
+    dict_bytes = retained_per_item(lambda: [dict(values, type='anomaly', timestamp=AnomalyEvent().timestamp)
+                                            for _ in range(EVENTS)])
+    print(f"  anomaly event {event_bytes:.0f} B vs dict {dict_bytes:.0f} B")
+    # 136 B object + its time_ns int + the list slot; the dict also carried a 26-char string
+    assert event_bytes <= 200
+    assert event_bytes * 1.8 < dict_bytes
+
+def test_status_event_footprint():
+    status_bytes = retained_per_item(lambda: [StatusEvent('current_level', '412') for _ in range(EVENTS)])
+    print(f"  status event {status_bytes:.0f} B")
+    assert status_bytes <= 128
+
+def test_parsed_alerts_keep_only_the_event():
+    lines = alert_lines(EVENTS)
+    parser = ArduinoMessageParser()
+    # Includes the parsed field values themselves (ID/TIMESTAMP strings, ints)
+    per_alert = retained_per_item(lambda: [event for event in map(parser.parse_line, lines) if event])
+    print(f"  parsed alert {per_alert:.0f} B")
+    assert per_alert <= 600
+
+if __name__ == "__main__":
+    sys.exit(run_tests(globals()))
@@ -13,10 +13,15 @@ sys.path.append('python_whatsapp')
 
 from arduino_reader import ArduinoReader
 from message_parser import ArduinoMessageParser
+from session_recorder import ReplayReader
 
 class HelpDetectionTester:
-    def __init__(self):
-        self.arduino = ArduinoReader('COM5', 9600, 1)  # Using your Arduino port
+    def __init__(self, replay_file=None, speed=1.0):
+        if replay_file:
+            # Replay a recorded session instead of screaming into the sensor
+            self.arduino = ReplayReader(replay_file, speed)
+        else:
+            self.arduino = ArduinoReader('COM5', 9600, 1)  # Using your Arduino port
         self.parser = ArduinoMessageParser()
         self.running = False
         self.help_detected_count = 0
@@ -71,9 +76,8 @@ class HelpDetectionTester:
         
         try:
             while self.running:
-                # Check for new messages
-                while not self.arduino.message_queue.empty():
-                    message = self.arduino.message_queue.get()
+                # Drain every new message (waits up to 0.1s when idle)
+                for message in self.arduino.get_messages(timeout=0.1):
                     parsed = self.parser.parse_message(message)
                     
                     # Print all Arduino messages for debugging
@@ -95,10 +99,10 @@ class HelpDetectionTester:
                         print("🎤 HELP voice detection is ENABLED")
                     
                     # Check for HELP detection
-                    elif parsed and parsed.get('type') == 'EMERGENCY':
+                    elif parsed and parsed.get('type') == 'emergency':
                         self.help_detected_count += 1
                         print(f"\n🚨 HELP DETECTED! (Detection #{self.help_detected_count})")
-                        print(f"   Sound Level: {parsed.get('sound_level', 'N/A')}")
+                        print(f"   Sound Level: {parsed.get('level', 'N/A')}")
                         print(f"   Location: {parsed.get('location', 'N/A')}")
                         print("   ✅ EXCELLENT! Your HELP command was detected!")
                         print("   💡 This would trigger an emergency email in full mode")
@@ -115,12 +119,16 @@ class HelpDetectionTester:
                             self.running = False
                             break
                     
-                    elif parsed and parsed.get('type') == 'ANOMALY':
+                    elif parsed and parsed.get('type') == 'anomaly':
                         severity = parsed.get('severity', 'UNKNOWN')
-                        sound_level = parsed.get('sound_level', 'N/A')
+                        sound_level = parsed.get('level', 'N/A')
                         print(f"🔊 Sound anomaly detected: {severity} (Level: {sound_level})")
                         print("   This is normal background noise detection")
                 
+                if isinstance(self.arduino, ReplayReader) and self.arduino.is_finished():
+                    print("\n📼 End of recorded session")
+                    break
+                
                 # Give testing instructions at appropriate times
                 current_time = time.time()
                 if ready_for_test and (current_time - last_instruction_time) > 10:
@@ -140,8 +148,6 @@ class HelpDetectionTester:
                         test_phase += 1
                         last_instruction_time = current_time
                 
-                time.sleep(0.1)  # Small delay
-                
         except KeyboardInterrupt:
             print("\n\n🛑 Testing stopped by user")
         finally:
@@ -157,7 +163,10 @@ class HelpDetectionTester:
                 print("   💡 Make sure sound sensor is properly connected to pin A0")
 
 def main():
-    tester = HelpDetectionTester()
+    # python test_help_detection.py [session file] [speed]
+    replay_file = sys.argv[1] if len(sys.argv) > 1 else None
+    speed = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+    tester = HelpDetectionTester(replay_file, speed)
     tester.test_help_detection()
 
 if __name__ == "__main__":
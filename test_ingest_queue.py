@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Ingestion queue checks - drop policy, protected lines and counters
+"""
+
+import sys
+import os
+import threading
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'python_whatsapp'))
+
+from queue import Empty
+from ingest_queue import BoundedMessageQueue, DROP_NEWEST
+from testkit import run_tests
+
+def drain(queue):
+    lines = []
+    while not queue.empty():
+        lines.append(queue.get_nowait())
+    return lines
+
+def test_drop_oldest_keeps_newest_levels():
+    queue = BoundedMessageQueue(3)
+    for level in range(6):
+        queue.put(f"LEVEL:{level}")
+
+    assert drain(queue) == ["LEVEL:3", "LEVEL:4", "LEVEL:5"]
+    stats = queue.stats()
+    assert stats['dropped'] == 3
+    assert stats['high_water'] == 3
+
+def test_emergency_and_alert_lines_never_dropped():
+    queue = BoundedMessageQueue(2)
+    lines = ["EMERGENCY:START", "LEVEL:1", "EMERGENCY:ID:3", "STATUS:UPDATE",
+             "EMERGENCY:END", "ALERT:START", "ALERT:END", "LEVEL:2"]
+    for line in lines:
+        queue.put(line)
+
+    kept = drain(queue)
+    assert [line for line in kept if line.startswith(('EMERGENCY:', 'ALERT:'))] == [
+        "EMERGENCY:START", "EMERGENCY:ID:3", "EMERGENCY:END", "ALERT:START", "ALERT:END"]
+    assert "LEVEL:2" not in kept  # queue full of protected lines - newest droppable refused
+    assert queue.stats()['overflow'] == 3
+
+def test_fifo_order_across_lanes():
+    queue = BoundedMessageQueue(100)
+    lines = ["STATUS:READY", "ALERT:START", "LEVEL:9", "ALERT:END", "BASELINE:200"]
+    for line in lines:
+        queue.put(line)
+    assert drain(queue) == lines
+
+def test_drop_newest_policy():
+    queue = BoundedMessageQueue(2, policy=DROP_NEWEST)
+    for line in ["LEVEL:1", "LEVEL:2", "LEVEL:3"]:
+        queue.put(line)
+    assert drain(queue) == ["LEVEL:1", "LEVEL:2"]
+
+def test_priority_lane_drains_first():
+    queue = BoundedMessageQueue(10000)
+    for level in range(5000):
+        queue.put(f"LEVEL:{level}")
+    queue.put("EMERGENCY:HELP_DETECTED", priority=True)
+    queue.put("EMERGENCY:START", priority=True)
+
+    assert queue.get_nowait() == "EMERGENCY:HELP_DETECTED"
+    assert queue.get_nowait() == "EMERGENCY:START"
+    assert queue.get_nowait() == "LEVEL:0"
+    assert queue.stats()['priority_enqueued'] == 2
+
+def test_get_timeout_raises_empty():
+    queue = BoundedMessageQueue(2)
+    try:
+        queue.get(timeout=0.01)
+    except Empty:
+        return
+    assert False, "expected queue.Empty"
+
+def test_get_many_drains_priority_then_fifo():
+    queue = BoundedMessageQueue(100)
+    for level in range(5):
+        queue.put(f"LEVEL:{level}")
+    queue.put("EMERGENCY:HELP_DETECTED", priority=True)
+
+    assert queue.get_many(3) == ["EMERGENCY:HELP_DETECTED", "LEVEL:0", "LEVEL:1"]
+    assert queue.get_many(100) == ["LEVEL:2", "LEVEL:3", "LEVEL:4"]
+    assert queue.stats()['dequeued'] == 6
+
+def test_get_many_timeout_returns_empty_list():
+    queue = BoundedMessageQueue(2)
+    assert queue.get_many(10, timeout=0.01) == []
+    assert queue.get_many(10, block=False) == []
+
+def test_full_queue_makes_room_for_emergency_lines_without_dropping_any():
+    queue = BoundedMessageQueue(100)
+    for index in range(100):
+        queue.put(f"LEVEL:{index}")
+    for index in range(250):
+        queue.put(f"EMERGENCY:HELP_DETECTED:{index}", priority=True)
+    stats = queue.stats()
+    # LEVEL lines go first, then emergencies are admitted over capacity
+    assert stats['dropped'] == 100 and stats['overflow'] == 150
+    assert stats['priority_depth'] == 250 and stats['depth'] == 250
+    assert queue.get_many(300) == [f"EMERGENCY:HELP_DETECTED:{index}" for index in range(250)]
+
+def test_wake_racing_a_line_does_not_cut_the_next_wait_short():
+    queue = BoundedMessageQueue(100)
+    batches = []
+    consumer = threading.Thread(target=lambda: batches.append(queue.get_many(10, timeout=2)))
+    consumer.start()
+    time.sleep(0.05)  # the consumer is waiting
+    with queue.not_empty:
+        queue.wake()  # lock busy: only the flag is set
+    queue.put("LEVEL:1")
+    consumer.join()
+    assert batches == [["LEVEL:1"]]
+    threading.Timer(0.05, queue.put, ("LEVEL:2",)).start()
+    assert queue.get_many(10, timeout=2) == ["LEVEL:2"]
+
+if __name__ == "__main__":
+    sys.exit(run_tests(globals()))
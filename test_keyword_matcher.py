@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Keyword matcher checks - overlapping hits, groups and case handling
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'python_whatsapp'))
+
+from config import HELP_KEYWORDS, ANOMALY_KEYWORDS
+from keyword_matcher import KeywordMatcher
+from testkit import run_tests
+
+def test_every_overlapping_keyword_is_reported():
+    matcher = KeywordMatcher({'help': ['HELP', 'HELP COMMAND', 'COMMAND', 'EMERGENCY:HELP']})
+    hits = matcher.scan("EMERGENCY:HELP command received")
+    assert hits == {'help': ['EMERGENCY:HELP', 'HELP', 'HELP COMMAND', 'COMMAND']}
+
+def test_groups_and_case():
+    matcher = KeywordMatcher({'help': HELP_KEYWORDS, 'anomaly': ANOMALY_KEYWORDS})
+    assert matcher.scan("HELP command detected - Emergency alert sent!") == {'help': ['HELP COMMAND']}
+    assert matcher.scan("alert:level:2100") == {'anomaly': ['ALERT:']}
+    assert matcher.scan("STATUS:CURRENT_LEVEL:412") == {}
+    assert matcher.search("Person needs help at location") == 'PERSON NEEDS HELP'
+
+def test_keyword_in_two_groups_and_special_characters():
+    matcher = KeywordMatcher({'help': ['AU SECOURS', 'S.O.S'], 'anomaly': ['S.O.S']})
+    assert matcher.scan("s.o.s au secours") == {'help': ['S.O.S', 'AU SECOURS'], 'anomaly': ['S.O.S']}
+    assert matcher.scan("SxOxS") == {}
+
+def test_detect_patterns_uses_config_keywords():
+    from main import ESP32EmailIntegration
+    integration = ESP32EmailIntegration.__new__(ESP32EmailIntegration)
+    integration.stats = {'baseline': 200}
+    result = integration._detect_esp32_patterns("EMERGENCY:MESSAGE:Person needs help at location")
+    assert result['type'] == 'emergency' and result['triggers'] == ['PERSON NEEDS HELP']
+    assert integration._detect_esp32_patterns("CALIBRATION:PROGRESS:40") is None
+
+if __name__ == "__main__":
+    sys.exit(run_tests(globals()))
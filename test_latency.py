@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Latency tracing checks - HDR-style histograms and serial-to-email stamps
+"""
+
+import sys
+import os
+import contextlib
+import io
+import random
+import tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'python_whatsapp'))
+
+from arduino_reader import ArduinoReader
+from latency import LatencyHistogram, LatencyTracker, RECEIVED, PARSED, HANDLED, SMTP_CONNECT, SMTP_ACCEPTED
+from main import ESP32EmailIntegration
+from protocol_spec import format_block
+from session_recorder import SessionRecorder
+from testkit import run_tests, temporary_log_file
+
+def test_histogram_percentiles_within_three_percent():
+    rng = random.Random(4)
+    values = [int(rng.lognormvariate(8, 2)) for _ in range(20000)]
+    histogram = LatencyHistogram()
+    for value in values:
+        histogram.record(value)
+    ordered = sorted(values)
+    for percent in (50, 90, 99, 99.9):
+        exact = ordered[-int(-percent * len(ordered) // 100) - 1]
+        estimate = histogram.percentile(percent)
+        assert exact <= estimate <= exact * 1.032 + 1, (percent, exact, estimate)
+    assert histogram.percentile(100) == max(values) and histogram.min == min(values)
+    assert len(histogram.counts) < 1000  # fixed memory whatever the sample count
+
+def test_merge_adds_counts():
+    first, second = LatencyHistogram(), LatencyHistogram()
+    for value in range(100):
+        first.record(value)
+        second.record(value * 1000)
+    first.merge(second)
+    assert first.count == 200 and first.max == 99000 and first.min == 0
+
+def test_each_stamp_records_the_spans_it_ends():
+    tracker = LatencyTracker()
+    trace = {RECEIVED: 0}
+    for name, now in ((PARSED, 50000), (HANDLED, 80000), (SMTP_CONNECT, 2080000), (SMTP_ACCEPTED, 2380000)):
+        tracker.stamp(trace, name, now)
+    tracker.stamp(None, HANDLED)  # untraced events are ignored
+    summary = tracker.summary()
+    assert summary['serial → parsed']['max_us'] == 50
+    assert summary['parsed → handler']['max_us'] == 30
+    assert summary['handler → SMTP connect']['max_us'] == 2000
+    assert summary['SMTP connect → accepted']['max_us'] == 300
+    assert summary['serial → email accepted']['max_us'] == 2380
+    assert all(span['count'] == 1 for span in summary.values())
+
+def test_replayed_emergency_is_traced_to_the_email():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'session.rec')
+        reader = ArduinoReader('SIM', 115200, echo=False)
+        recorder = SessionRecorder(path).attach(reader)
+        for line in (b"STATUS:READY", b"EMERGENCY:HELP_DETECTED") + tuple(
+                format_block('EMERGENCY', {'ID': 1, 'TYPE': 'VOICE_HELP', 'SOUND_LEVEL': 2875}).split(b'\r\n')[:-1]):
+            reader._dispatch_line(line)
+        recorder.close()
+
+        with temporary_log_file():
+            integration = ESP32EmailIntegration()
+            with contextlib.redirect_stdout(io.StringIO()) as output:
+                assert integration.run_replay(path, speed=None)
+                integration._show_current_status()
+
+    summary = integration.latency.summary()
+    # HELP_DETECTED plus the EMERGENCY block (and its glued TYPE line) - every event traced
+    assert summary['serial → parsed']['count'] >= 2
+    assert summary['parsed → handler']['count'] == summary['serial → parsed']['count']
+    # One email leaves, the rest hit the cooldown
+    assert summary['serial → email accepted']['count'] == 1
+    assert "serial → email accepted" in output.getvalue()
+
+if __name__ == "__main__":
+    sys.exit(run_tests(globals()))
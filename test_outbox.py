@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Outbox checks - priority order, retries with backoff, deadlines and a full outbox
+"""
+
+import sys
+import os
+import contextlib
+import io
+import threading
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'python_whatsapp'))
+
+from events import EmergencyEvent
+from main import ESP32EmailIntegration
+from outbox import Outbox
+from testkit import run_tests
+
+def blocked_outbox(delivered, results=None, **options):
+    """One-worker outbox whose first delivery waits for the returned event"""
+    release = threading.Event()
+
+    def deliver(kind, data):
+        if data == 'first':
+            release.wait()
+        delivered.append((kind, data))
+        return results.pop(0) if results else True
+    outbox = Outbox('notify', deliver, **options).start()
+    outbox.put(('report', 'first'))
+    time.sleep(0.05)  # the worker now holds 'first'
+    return outbox, release
+
+def test_most_urgent_alert_goes_first():
+    delivered = []
+    outbox, release = blocked_outbox(delivered)
+    for kind in ('keepalive', 'report', 'anomaly', 'emergency', 'anomaly'):
+        outbox.put((kind, len(delivered)))
+    release.set()
+    outbox.stop()
+    assert [kind for kind, _ in delivered] == ['report', 'emergency', 'anomaly', 'anomaly', 'report', 'keepalive']
+
+def test_failed_sends_are_retried_with_backoff():
+    attempts = []
+
+    def deliver(kind, data):
+        attempts.append(time.monotonic())
+        if len(attempts) == 2:
+            raise ConnectionError("server went away")
+        return len(attempts) >= 3
+    outbox = Outbox('notify', deliver, backoff=0.02).start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        outbox.put(('emergency', 'help'))
+        while len(attempts) < 3:
+            time.sleep(0.01)
+        outbox.stop()
+    assert attempts[1] - attempts[0] >= 0.02 and attempts[2] - attempts[1] >= 0.04
+    metrics = outbox.metrics()
+    assert metrics['retried'] == 2 and metrics['errors'] == 1 and metrics['failed'] == 0
+
+def test_declined_alerts_are_not_retried():
+    delivered = []
+    outbox = Outbox('notify', lambda kind, data: delivered.append(kind), backoff=0.01).start()
+    outbox.put(('anomaly', 'cooldown'))
+    outbox.stop()
+    assert delivered == ['anomaly'] and outbox.metrics()['retried'] == 0
+
+def test_alerts_are_given_up_at_their_deadline():
+    attempts = []
+
+    def deliver(kind, data):
+        attempts.append(kind)
+        return False
+    outbox = Outbox('notify', deliver, backoff=0.02, deadlines={'anomaly': 0.1}).start()
+    with contextlib.redirect_stdout(io.StringIO()) as output:
+        outbox.put(('anomaly', 'spike'))
+        time.sleep(0.3)
+        outbox.stop()
+    assert 2 <= len(attempts) <= 4
+    assert outbox.metrics()['failed'] == 1
+    assert "anomaly alert undelivered" in output.getvalue()
+
+def test_full_outbox_drops_the_least_urgent_alert():
+    delivered = []
+    outbox, release = blocked_outbox(delivered, maxsize=2)
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert outbox.put(('report', 'daily'))
+        assert outbox.put(('anomaly', 'spike'))
+        assert outbox.put(('emergency', 'help'), block=False)
+        assert not outbox.put(('anomaly', 'late'), block=False)
+    release.set()
+    outbox.stop()
+    assert delivered == [('report', 'first'), ('emergency', 'help'), ('anomaly', 'spike')]
+    assert outbox.metrics()['dropped'] == 2
+
+def test_stop_gives_backed_off_alerts_a_last_attempt():
+    delivered = []
+    outbox, release = blocked_outbox(delivered, results=[True, False, True], backoff=30)
+    with contextlib.redirect_stdout(io.StringIO()):
+        outbox.put(('emergency', 'help'))
+        release.set()
+        time.sleep(0.05)
+        started = time.perf_counter()
+        outbox.stop()
+    assert time.perf_counter() - started < 1
+    assert delivered == [('report', 'first'), ('emergency', 'help'), ('emergency', 'help')]
+
+class FlakyEmailSender:
+    """First emergency send fails like a dropped SMTP connection, the rest succeed"""
+
+    def __init__(self):
+        self.calls = 0
+        self.emergency_count = 0
+        self.anomaly_count = 0
+
+    def send_emergency_email(self, data, spool_id=None):
+        self.calls += 1
+        if self.calls == 1:
+            return False
+        self.emergency_count += 1
+        return True
+
+def test_integration_retries_a_failed_emergency_email():
+    integration = ESP32EmailIntegration()
+    integration.email_sender = FlakyEmailSender()
+    outbox = integration.pipeline['notify']
+    outbox.backoff = 0.01
+    with contextlib.redirect_stdout(io.StringIO()) as output:
+        integration.pipeline.start()
+        integration._handle_emergency(EmergencyEvent(emergency_type='HELP'))
+        while integration.email_sender.calls < 2:
+            time.sleep(0.01)
+        integration.pipeline.stop()
+    assert integration.email_sender.emergency_count == 1 and integration.email_sender.calls == 2
+    assert "✓ Emergency email sent successfully!" in output.getvalue()
+    assert 'retried=1' in integration.pipeline.format_metrics()[-1]
+
+def test_daily_report_never_blocks_the_scheduler_on_a_full_outbox():
+    integration = ESP32EmailIntegration()
+    release = threading.Event()
+    integration.email_sender.send_emergency_email = lambda data, spool_id=None: release.wait() or True
+    outbox = integration.pipeline['notify']
+    outbox.queue.maxsize = 2
+    with contextlib.redirect_stdout(io.StringIO()) as output:
+        integration.pipeline.start()
+        for _ in range(2 + outbox.workers):  # workers busy, queue full of emergencies
+            integration._handle_emergency(EmergencyEvent(emergency_type='HELP'))
+        reporter = threading.Thread(target=integration._send_daily_report)
+        reporter.start()
+        reporter.join(2)
+        release.set()
+        integration.pipeline.stop()
+    assert not reporter.is_alive()
+    assert "daily status report skipped" in output.getvalue()
+
+if __name__ == "__main__":
+    sys.exit(run_tests(globals()))
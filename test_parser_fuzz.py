@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Parser fuzz checks - damaged serial lines never raise or leak open blocks
+Damaged lines come from the benchmark corpora
+"""
+
+import sys
+import os
+import contextlib
+import io
+import random
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'python_whatsapp'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'benchmarks'))
+
+from corpus import MUTATIONS, firmware_corpus, malformed_corpus
+from events import Event
+from main import ESP32EmailIntegration
+from message_parser import ArduinoMessageParser
+from testkit import run_tests
+
+LINES = firmware_corpus(20000)
+
+def make_integration():
+    integration = ESP32EmailIntegration.__new__(ESP32EmailIntegration)
+    integration.stats = {'baseline': 200}
+    return integration
+
+def run_corpus(lines):
+    parser = ArduinoMessageParser()
+    detect = make_integration()._detect_esp32_patterns
+    results = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for raw in lines:
+            message = parser.parse_bytes(raw)
+            results.append(message or detect(raw.decode('utf-8', errors='ignore')))
+    return parser, results
+
+def test_firmware_corpus_parses_every_block():
+    parser, results = run_corpus(LINES)
+    stats = parser.assembler.stats
+    assert stats['completed'] > 0
+    assert stats['restarted'] == stats['overflowed'] == 0
+    assert len(parser.assembler) <= 2  # only a block cut off by the end of the corpus
+    assert not any(isinstance(event, Event) and event.get('incomplete') for event in results)
+
+def test_malformed_corpus_never_raises():
+    for seed in (11, 12, 13):
+        parser, results = run_corpus(malformed_corpus(LINES, share=0.5, seed=seed))
+        assert all(result is None or isinstance(result, (Event, dict)) for result in results)
+        assert len(parser.assembler) <= 2, f"{len(parser.assembler)} blocks left open"
+        assert all(count <= parser.assembler.max_fields for _, count, _ in parser.assembler.blocks.values())
+
+def test_every_mutation_alone():
+    rng = random.Random(3)
+    for mutation in MUTATIONS:
+        damaged = [mutation(rng, line) for line in LINES[:2000]]
+        run_corpus(damaged)
+
+if __name__ == "__main__":
+    sys.exit(run_tests(globals()))
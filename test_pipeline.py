@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Pipeline checks - bounded stages, per-stage metrics and a slow notifier
+"""
+
+import sys
+import os
+import contextlib
+import io
+import threading
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'python_whatsapp'))
+
+from email_sender import EmailSender
+from events import EmergencyEvent
+from main import ESP32EmailIntegration
+from pipeline import Pipeline, Stage
+from protocol_spec import format_block
+from testkit import run_tests, temporary_log_file
+
+class SlowEmailSender:
+    """Stands in for EmailSender with an SMTP login that takes `delay` seconds"""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.sent = []
+        self.emergency_count = 0
+        self.anomaly_count = 0
+
+    def send_emergency_email(self, data, spool_id=None):
+        time.sleep(self.delay)
+        self.sent.append(data.type)
+        return True
+
+    send_anomaly_email = send_emergency_email
+
+    def _send_email(self, subject, message, is_emergency=False):
+        time.sleep(self.delay)
+        self.sent.append(subject)
+        return True
+
+def test_stage_runs_items_on_workers_and_drains_on_stop():
+    done = []
+    stage = Stage('work', lambda value: done.append((value, threading.current_thread().name)),
+                  workers=2, maxsize=8).start()
+    for value in range(100):
+        stage.put((value,))
+    stage.stop()
+    assert sorted(value for value, _ in done) == list(range(100))
+    assert all(name.startswith('work-') for _, name in done)
+    metrics = stage.metrics()
+    assert metrics['processed'] == 100 and metrics['depth'] == 0 and metrics['high_water'] <= 8
+
+def test_full_stage_drops_only_non_blocking_puts():
+    release = threading.Event()
+    stage = Stage('slow', lambda value: release.wait(), workers=1, maxsize=2).start()
+    assert stage.put((0,))
+    time.sleep(0.05)  # worker is now blocked on item 0
+    assert stage.put((1,)) and stage.put((2,))
+    assert not stage.put((3,), block=False)
+    release.set()
+    stage.stop()
+    assert stage.metrics()['dropped'] == 1 and stage.metrics()['processed'] == 3
+
+def test_errors_are_counted_and_unstarted_stages_run_inline():
+    stage = Stage('fragile', lambda value: 1 / value)
+    with contextlib.redirect_stdout(io.StringIO()):
+        stage.put((0,))
+        stage.put((1,))
+    metrics = stage.metrics()
+    assert metrics['errors'] == 1 and metrics['processed'] == 2
+
+def test_slow_notifier_never_stalls_parsing_and_detection():
+    integration = ESP32EmailIntegration()
+    integration.email_sender = SlowEmailSender(delay=0.2)
+    lines = [format_block('EMERGENCY', {'ID': index, 'TYPE': 'VOICE_HELP'}) for index in range(5)]
+    lines = [line for block in lines for line in block.split(b'\r\n') if line]
+    lines += [b"STATUS:CURRENT_LEVEL:%d" % level for level in range(2000)]
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        integration.pipeline.start()
+        started = time.perf_counter()
+        with integration.parse_stage.timed(len(lines)):
+            for line in lines:
+                integration._process_message(line)
+        while integration.pipeline['detect'].queue.qsize():
+            time.sleep(0.01)
+        detected_in = time.perf_counter() - started
+        # Five emails at 0.2s on two workers are still going out
+        assert integration.email_sender.sent != ['emergency'] * 5
+        integration.pipeline.stop()
+
+    assert detected_in < 0.5, f"detection took {detected_in:.2f}s behind a slow notifier"
+    assert integration.stats['emergencies_detected'] == 5
+    assert integration.email_sender.sent == ['emergency'] * 5
+    metrics = integration.pipeline.metrics()
+    assert metrics['parse']['processed'] == len(lines)
+    assert metrics['notify']['processed'] == 5 and metrics['notify']['mean_ms'] >= 190
+
+def test_emergencies_from_different_devices_are_sent_in_parallel():
+    with temporary_log_file():
+        sender = EmailSender(dry_run=True)
+        both_sending = threading.Barrier(2, timeout=2)  # breaks if the sends run one at a time
+
+        def send_email(subject, message, is_emergency=False, trace=None):
+            both_sending.wait()
+            return True
+        sender._send_email = send_email
+        results = []
+        threads = [threading.Thread(target=lambda device=device: results.append(sender.send_emergency_email(
+            EmergencyEvent(emergency_type='HELP', device_id=device)))) for device in ('ESP32_1', 'ESP32_2')]
+        with contextlib.redirect_stdout(io.StringIO()):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+    assert results == [True, True] and sender.emergency_count == 2
+
+def test_status_shows_every_stage():
+    pipeline = Pipeline()
+    pipeline.add('parse', workers=0)
+    pipeline.add('notify', lambda: None, workers=2, maxsize=16)
+    lines = pipeline.format_metrics()
+    assert len(lines) == 2
+    assert lines[0].startswith('parse') and 'workers=inline' in lines[0]
+    assert 'depth=0/16' in lines[1]
+
+if __name__ == "__main__":
+    sys.exit(run_tests(globals()))
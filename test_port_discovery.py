@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Port discovery checks - banner probes on pseudo-terminals, timeouts and the parallel race
+"""
+
+import sys
+import os
+import contextlib
+import threading
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'python_whatsapp'))
+
+import serial
+import port_discovery
+from port_discovery import discover_esp32, probe_port
+from testkit import pty_port, run_tests
+
+BANNER = b"STATUS:DEVICE_TYPE:ESP32\r\n"
+
+@contextlib.contextmanager
+def recorded_connections():
+    """Every serial.Serial the probes open, so a test can check which were closed"""
+    opened = []
+    original = serial.Serial
+
+    class RecordingSerial(serial.Serial):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            opened.append(self)
+    port_discovery.serial.Serial = RecordingSerial
+    try:
+        yield opened
+    finally:
+        port_discovery.serial.Serial = original
+
+def answer_later(master, data, delay):
+    """Write data to the pty after delay, like a board finishing its reset"""
+    timer = threading.Timer(delay, os.write, (master, data))
+    timer.start()
+    return timer
+
+def test_answering_port_is_found_with_its_banner():
+    with pty_port() as (master, device):
+        answer_later(master, b"boot noise\r\n" + BANNER + b"STATUS:BASE", 0.1)
+        result = probe_port(device, 115200, banner_timeout=2.0)
+        assert result is not None and result['port'] == device
+        result['connection'].close()
+    assert result['banner'] == ["boot noise", "STATUS:DEVICE_TYPE:ESP32"]
+    # The half-read line after the banner is kept for the reader
+    assert result['line_buffer'].pending == bytearray(b"STATUS:BASE")
+    assert 0.1 <= result['elapsed'] < 1.0
+
+def test_lines_in_the_same_read_as_the_banner_are_kept():
+    with pty_port() as (master, device):
+        answer_later(master, BANNER + b"STATUS:READY\r\nSTATUS:BASELINE:210\r\n", 0.1)
+        result = probe_port(device, 115200, banner_timeout=2.0)
+        assert result is not None
+        result['connection'].close()
+    assert result['banner'] == ["STATUS:DEVICE_TYPE:ESP32", "STATUS:READY", "STATUS:BASELINE:210"]
+
+def test_silent_port_times_out():
+    with pty_port() as (master, device), recorded_connections() as opened:
+        started = time.monotonic()
+        assert probe_port(device, 115200, banner_timeout=0.3) is None
+        elapsed = time.monotonic() - started
+    assert 0.3 <= elapsed < 1.0
+    assert len(opened) == 1 and not opened[0].is_open
+
+def test_missing_port_is_skipped():
+    assert probe_port('/dev/no-such-esp32', 115200, banner_timeout=0.3) is None
+
+def test_ports_are_probed_in_parallel_and_the_answering_one_wins():
+    with pty_port() as (quiet_master, quiet), pty_port() as (master, esp32), \
+            pty_port() as (late_master, late), recorded_connections() as opened:
+        timers = [answer_later(master, BANNER, 0.2), answer_later(late_master, BANNER, 0.6)]
+        started = time.monotonic()
+        result = discover_esp32([quiet, '/dev/no-such-esp32', esp32, late], banner_timeout=1.0)
+        elapsed = time.monotonic() - started
+        for timer in timers:
+            timer.cancel()
+        assert result is not None and result['port'] == esp32
+        assert result['connection'].is_open
+        result['connection'].close()
+    # Well inside one banner timeout, however many ports were tried
+    assert elapsed < 1.0
+    losers = [connection for connection in opened if connection is not result['connection']]
+    assert len(losers) == 2 and not any(connection.is_open for connection in losers)
+
+def test_no_answer_returns_none_after_one_timeout():
+    with pty_port() as (_, first), pty_port() as (_, second):
+        started = time.monotonic()
+        assert discover_esp32([first, second], banner_timeout=0.3) is None
+        assert time.monotonic() - started < 0.9
+    assert discover_esp32([]) is None
+
+if __name__ == "__main__":
+    sys.exit(run_tests(globals()))
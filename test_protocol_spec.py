@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Protocol spec checks - the table-driven parser reads what format_block writes
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'python_whatsapp'))
+
+from message_parser import ArduinoMessageParser
+from protocol_spec import format_block, describe
+from testkit import run_tests
+
+def parse_all(data):
+    parser = ArduinoMessageParser()
+    lines = data.decode('utf-8').split('\r\n')
+    return [result for result in map(parser.parse_message, lines) if result]
+
+def test_alert_block_round_trip():
+    data = format_block('ALERT', {'ID': 7, 'TIMESTAMP': 1234, 'LEVEL': 2100, 'BASELINE': 200,
+                                  'DIFFERENCE': 1900, 'SEVERITY': 'CRITICAL',
+                                  'LOCATION': 'Home Office', 'UPTIME': '0h:1m:2s'})
+    [alert] = parse_all(data)
+    assert alert['type'] == 'anomaly'
+    assert alert['alert_id'] == '7' and alert['level'] == 2100 and alert['difference'] == 1900
+    assert alert['location'] == 'Home Office' and alert['uptime'] == '0h:1m:2s'
+
+def test_emergency_block_keeps_glued_type_line():
+    data = format_block('EMERGENCY', {'ID': 1, 'TYPE': 'VOICE_HELP', 'SOUND_LEVEL': 2875,
+                                      'ACTION_REQUIRED': 'SEND_WHATSAPP', 'CONTACT': '+91 0000000000'})
+    assert b"EMERGENCY:TYPE:VOICE_HELPEMERGENCY:SOUND_LEVEL:2875\r\n" in data
+    [emergency] = parse_all(data)
+    assert emergency['type'] == 'emergency' and emergency['emergency_contact'] == '+91 0000000000'
+    # Firmware quirk: the glued SOUND_LEVEL line lands in the TYPE value
+    assert emergency['emergency_type'] == 'VOICE_HELPEMERGENCY:SOUND_LEVEL:2875'
+    assert 'level' not in emergency
+
+def test_status_and_immediate_lines():
+    parser = ArduinoMessageParser()
+    assert parser.parse_line("STATUS:UPTIME:1h:2m:3s")['value'] == "1h:2m:3s"
+    assert parser.parse_line("STATUS:SOMETHING_NEW:1")['field'] == "something_new"
+    assert parser.parse_line("EMERGENCY:HELP_DETECTED")['level'] == 999
+    assert parser.parse_line("ALERT:START:junk") is None
+    assert parser.parse_line("ALERT:LEVEL:900") is None  # outside a block
+
+def test_describe_lists_every_block():
+    text = describe()
+    assert "## ALERT:START ... ALERT:END" in text and "`EMERGENCY:HELP_DETECTED`" in text
+
+if __name__ == "__main__":
+    sys.exit(run_tests(globals()))
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Rate limiter checks - token buckets per (device, location, type), burst, refill and LRU eviction
+"""
+
+import sys
+import os
+import contextlib
+import io
+import tempfile
+import threading
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'python_whatsapp'))
+
+from alert_spool import AlertSpool
+from digest import HELD_BACK
+from email_sender import EmailSender
+from events import EmergencyEvent
+from main import ESP32EmailIntegration
+from rate_limiter import RateLimiter, alert_key
+from testkit import FakeClock, run_tests, temporary_log_file
+
+def test_burst_then_one_per_interval():
+    clock = FakeClock()
+    limiter = RateLimiter({'anomaly': (3, 10)}, clock=clock)
+    key = ('ESP32_1', 'Ward 3', 'anomaly')
+    assert [limiter.acquire(key) for _ in range(3)] == [0, 0, 0]
+    assert limiter.acquire(key) == 10
+    clock.now += 4
+    assert limiter.wait(key) == 6
+    clock.now += 6
+    assert limiter.acquire(key) == 0 and limiter.acquire(key) == 10
+    # A long quiet spell refills the burst, never more
+    clock.now += 3600
+    assert [limiter.acquire(key) for _ in range(4)] == [0, 0, 0, 10]
+    assert limiter.stats() == {'keys': 1, 'allowed': 7, 'limited': 3, 'evicted': 0}
+
+def test_keys_are_independent():
+    clock = FakeClock()
+    limiter = RateLimiter({'emergency': (1, 20), 'anomaly': (1, 180)}, clock=clock)
+    noisy = EmergencyEvent(emergency_type='HELP', device_id='ESP32_1', location='Ward 3')
+    assert alert_key('emergency', noisy) == ('ESP32_1', 'Ward 3', 'emergency')
+    assert limiter.acquire(alert_key('emergency', noisy)) == 0
+    assert limiter.acquire(alert_key('emergency', noisy)) == 20
+    assert limiter.acquire(('ESP32_2', 'Ward 3', 'emergency')) == 0
+    assert limiter.acquire(('ESP32_1', 'Ward 4', 'emergency')) == 0
+    assert limiter.acquire(('ESP32_1', 'Ward 3', 'anomaly')) == 0
+    # Kinds without a limit are never held back
+    assert limiter.acquire(('ESP32_1', 'Ward 3', 'report')) == 0
+    assert limiter.acquire(('ESP32_1', 'Ward 3', 'report')) == 0
+    assert len(limiter) == 4
+
+def test_refund_gives_back_an_unused_token():
+    clock = FakeClock()
+    limiter = RateLimiter({'emergency': (1, 20)}, clock=clock)
+    key = ('ESP32_1', 'Ward 3', 'emergency')
+    assert limiter.acquire(key) == 0
+    limiter.refund(key)
+    limiter.refund(key)  # never more than the burst
+    assert limiter.acquire(key) == 0 and limiter.acquire(key) == 20
+    limiter.refund(('ESP32_1', 'Ward 3', 'report'))  # unlimited kinds have no bucket
+    assert len(limiter) == 1 and limiter.stats()['allowed'] == 1
+
+def test_least_recently_used_keys_are_evicted():
+    clock = FakeClock()
+    limiter = RateLimiter({'anomaly': (1, 180)}, max_keys=2, clock=clock)
+    first, second, third = [(f'ESP32_{index}', 'Ward 3', 'anomaly') for index in range(3)]
+    limiter.acquire(first)
+    limiter.acquire(second)
+    limiter.acquire(first)  # first is now the most recently used
+    limiter.acquire(third)
+    assert list(limiter.buckets) == [first, third] and limiter.evicted == 1
+    for index in range(1000):
+        limiter.acquire((f'SENSOR_{index}', 'Ward 9', 'anomaly'))
+    assert len(limiter) == 2 and limiter.evicted == 1001
+
+def test_concurrent_workers_never_exceed_the_burst():
+    limiter = RateLimiter({'emergency': (50, 3600)})
+    key = ('ESP32_1', 'Ward 3', 'emergency')
+    allowed = []
+
+    def worker():
+        allowed.append(sum(1 for _ in range(500) if not limiter.acquire(key)))
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sum(allowed) == 50
+
+def test_a_noisy_device_does_not_silence_the_others():
+    with temporary_log_file():
+        sender = EmailSender(dry_run=True)
+        with contextlib.redirect_stdout(io.StringIO()):
+            noisy = [sender.send_emergency_email(EmergencyEvent(emergency_type='HELP', device_id='ESP32_1'))
+                     for _ in range(20)]
+            quiet = sender.send_emergency_email(EmergencyEvent(emergency_type='HELP', device_id='ESP32_2'))
+    assert noisy.count(True) == 1 and noisy.count(HELD_BACK) == 19
+    assert quiet is True and sender.digests.held() == 19
+
+def test_failed_emergency_is_retried_not_held_back():
+    with tempfile.TemporaryDirectory() as directory, temporary_log_file():
+        integration = ESP32EmailIntegration()
+        sender = integration.email_sender
+        sender.dry_run = True
+        attempts = []
+        send_email = sender._send_email
+
+        def first_send_fails(*args, **kwargs):
+            attempts.append(1)
+            return len(attempts) > 1 and send_email(*args, **kwargs)
+        sender._send_email = first_send_fails
+        outbox = integration.pipeline['notify']
+        outbox.backoff = 0.01
+        outbox.spool = spool = AlertSpool(os.path.join(directory, 'spool.db'))
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            integration.pipeline.start()
+            integration._handle_emergency(EmergencyEvent(emergency_type='HELP'))
+            deadline = time.monotonic() + 2
+            while len(attempts) < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            integration.pipeline.stop()
+        pending = spool.pending()
+        spool.close()
+    # The failed first send did not use up the key's token, so the retry went out
+    assert sender.emergency_count == 1 and sender.digests.held() == 0
+    assert "added to the digest" not in output.getvalue()
+    assert pending == []
+
+def test_integration_shows_the_limiter_in_the_pipeline_status():
+    integration = ESP32EmailIntegration()
+    integration.email_sender.limiter.acquire(('ESP32_1', 'Ward 3', 'anomaly'))
+    with contextlib.redirect_stdout(io.StringIO()) as output:
+        integration._show_pipeline_status()
+    assert "limits   keys=1 allowed=1 limited=0 evicted=0" in output.getvalue()
+
+if __name__ == "__main__":
+    sys.exit(run_tests(globals()))
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Scheduler checks - periodic tasks, cross-thread wakeups and rate-limit digests
+"""
+
+import sys
+import os
+import contextlib
+import io
+import threading
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'python_whatsapp'))
+
+from config import ANOMALY_COOLDOWN, EMERGENCY_COOLDOWN
+from email_sender import EmailSender
+from events import EmergencyEvent
+from scheduler import Scheduler
+from testkit import FakeClock, run_tests, temporary_log_file
+from timer_wheel import TimerWheel
+
+def make_scheduler(wake=None):
+    clock = FakeClock()
+    return Scheduler(TimerWheel(tick=0.1, slots=64, clock=clock), wake), clock
+
+def test_every_repeats_until_cancelled():
+    scheduler, clock = make_scheduler()
+    ticks = []
+    timer = scheduler.every(30, ticks.append, 'status')
+    once = scheduler.call_later(45, ticks.append, 'report')
+    for _ in range(4):
+        clock.now += 30
+        scheduler.advance()
+    assert ticks == ['status', 'report', 'status', 'status', 'status']
+    assert not once.active
+    scheduler.cancel(timer)
+    clock.now += 300
+    assert scheduler.advance() == 0 and len(scheduler) == 0
+
+def test_callbacks_run_without_holding_the_lock():
+    scheduler, clock = make_scheduler()
+    scheduled = threading.Event()
+
+    def blocking_callback():
+        # A notifier worker schedules while the loop is stuck in a callback
+        worker = threading.Thread(target=lambda: scheduler.call_later(5, lambda: None) and scheduled.set())
+        worker.start()
+        worker.join(2)
+    scheduler.call_later(1, blocking_callback)
+    clock.now += 1.2
+    assert scheduler.advance() == 1
+    assert scheduled.is_set() and len(scheduler) == 1
+
+def test_due_timer_cancelled_by_an_earlier_callback_does_not_run():
+    scheduler, clock = make_scheduler()
+    fired = []
+    scheduler.call_later(1, lambda: scheduler.cancel(second))
+    second = scheduler.call_later(1, fired.append, 'second')
+    clock.now += 1.2
+    assert scheduler.advance() == 1 and fired == []
+
+def test_wait_timeout_follows_the_next_timer():
+    scheduler, clock = make_scheduler()
+    assert scheduler.wait_timeout() is None
+    scheduler.every(30, lambda: None)
+    timer = scheduler.call_later(2.0, lambda: None)
+    assert abs(scheduler.wait_timeout() - 2.0) < 0.11
+    scheduler.reschedule(timer, 400)
+    assert abs(scheduler.wait_timeout() - 30) < 0.11
+
+def test_other_threads_wake_the_loop_only_for_earlier_timers():
+    wakes = []
+    scheduler, _ = make_scheduler(wake=lambda: wakes.append(1))
+    scheduler.every(30, lambda: None)
+    scheduler.wait_timeout()  # the loop goes to sleep for 30s
+
+    worker = threading.Thread(target=scheduler.call_later, args=(300, lambda: None))
+    worker.start()
+    worker.join()
+    assert wakes == []
+    worker = threading.Thread(target=scheduler.call_later, args=(5, lambda: None))
+    worker.start()
+    worker.join()
+    assert wakes == [1]
+
+def test_rate_limit_digests_are_due_on_the_scheduler():
+    scheduler, clock = make_scheduler()
+    with temporary_log_file():
+        sender = EmailSender(dry_run=True, scheduler=scheduler)
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            assert sender.send_emergency_email(EmergencyEvent(emergency_type='HELP'))
+            assert not sender.send_emergency_email(EmergencyEvent(emergency_type='HELP'))
+            # The held-back HELP goes out as a digest, which uses up the next token
+            clock.now += EMERGENCY_COOLDOWN + 0.2
+            scheduler.advance()
+            assert sender.digest_count == 1 and not sender.digests_due
+            assert not sender.send_emergency_email(EmergencyEvent(emergency_type='HELP'))
+            clock.now += EMERGENCY_COOLDOWN + 0.2
+            scheduler.advance()
+            assert sender.digest_count == 2
+            clock.now += EMERGENCY_COOLDOWN + 0.2
+            scheduler.advance()
+            assert sender.send_emergency_email(EmergencyEvent(emergency_type='HELP'))
+    assert "added to the digest" in output.getvalue()
+    assert sender.emergency_count == 2
+
+def test_rate_limit_refills_even_if_nobody_advances_the_scheduler():
+    scheduler, clock = make_scheduler()
+    sender = EmailSender(dry_run=True, scheduler=scheduler)
+    key = ('ESP32_1', 'Ward 3', 'anomaly')
+    assert sender.limiter.acquire(key) == 0
+    assert sender.limiter.wait(key) == ANOMALY_COOLDOWN
+    clock.now += ANOMALY_COOLDOWN + 1
+    assert sender.limiter.wait(key) == 0
+
+if __name__ == "__main__":
+    sys.exit(run_tests(globals()))
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Session recorder / replay checks - file format, timing and queue delivery
+"""
+
+import sys
+import os
+import tempfile
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'python_whatsapp'))
+
+from arduino_reader import ArduinoReader
+from session_recorder import SessionRecorder, ReplayReader, iter_records, iter_sessions
+from testkit import run_tests
+
+LINES = [b"STATUS:READY", b"BASELINE:205", b"EMERGENCY:HELP_DETECTED", b"EMERGENCY:START",
+         b"EMERGENCY:TYPE:VOICE_HELP", b"EMERGENCY:END", b"STATUS:CURRENT_LEVEL:412"]
+
+def record_session(path, lines, gap=0.0):
+    """Record lines through a reader's dispatch path, like the read thread does"""
+    reader = ArduinoReader('SIM', 115200, echo=False)
+    recorder = SessionRecorder(path).attach(reader)
+    for line in lines:
+        reader._dispatch_line(line)
+        if gap:
+            time.sleep(gap)
+    recorder.close()
+    return reader
+
+def drain(reader, timeout=2.0):
+    lines = []
+    deadline = time.time() + timeout
+    while not reader.is_finished() and time.time() < deadline:
+        message = reader.get_message(timeout=0.05)
+        if message is not None:
+            lines.append(message)
+    return lines
+
+def test_recorded_lines_round_trip():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'session.rec')
+        record_session(path, LINES)
+        assert [line for _, line in iter_records(path)] == LINES
+        # 22-byte session header, then a 6-byte header per line
+        assert os.path.getsize(path) == 22 + sum(len(line) + 6 for line in LINES)
+
+def test_sessions_append_and_truncated_tail_is_ignored():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'session.rec')
+        record_session(path, LINES[:2])
+        record_session(path, LINES[2:])
+        with open(path, 'ab') as session_file:
+            session_file.write(b'\x10\x00\x00\x00\x40\x00STATUS:')  # crash mid-record
+
+        sessions = list(iter_sessions(path))
+        assert len(sessions) == 2
+        assert [line for _, line in sessions[0][1]] == LINES[:2]
+        assert [line for _, line in sessions[1][1]] == LINES[2:]
+
+def test_max_speed_replay_delivers_every_line():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'session.rec')
+        lines = [b"STATUS:CURRENT_LEVEL:%d" % level for level in range(5000)]
+        record_session(path, lines)
+
+        # Queue far smaller than the session - max speed must wait, not drop
+        reader = ReplayReader(path, None, echo=False, queue_size=64, raw_lines=True)
+        assert reader.connect() and reader.start_reading()
+        assert drain(reader, timeout=10) == lines
+        assert reader.get_queue_stats()['dropped'] == 0
+
+def test_replay_keeps_recorded_timing():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'session.rec')
+        record_session(path, LINES, gap=0.02)
+
+        started = time.perf_counter()
+        reader = ReplayReader(path, 1.0, echo=False)
+        assert reader.connect() and reader.start_reading()
+        replayed = drain(reader)
+        elapsed = time.perf_counter() - started
+
+        assert sorted(replayed) == sorted(line.decode() for line in LINES)
+        assert elapsed >= 0.02 * (len(LINES) - 1) * 0.9
+
+        started = time.perf_counter()
+        fast = ReplayReader(path, 10.0, echo=False)
+        assert fast.connect() and fast.start_reading()
+        drain(fast)
+        assert time.perf_counter() - started < elapsed
+
+def test_replay_rejects_other_files():
+    with tempfile.NamedTemporaryFile(suffix='.txt', delete=False) as other:
+        other.write(b"STATUS:READY\n")
+    try:
+        assert not ReplayReader(other.name, echo=False).connect()
+    finally:
+        os.unlink(other.name)
+
+if __name__ == "__main__":
+    sys.exit(run_tests(globals()))
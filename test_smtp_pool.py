@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+SMTP pool checks - session reuse, reconnects, keepalives and parallel sends
+"""
+
+import sys
+import os
+import contextlib
+import io
+import threading
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'python_whatsapp'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'benchmarks'))
+
+from email_sender import EmailSender
+from fake_smtp import FakeSMTPServer
+from latency import LatencyTracker, RECEIVED, HANDLED
+from smtp_pool import SMTPPool
+from testkit import run_tests
+
+@contextlib.contextmanager
+def fake_server(rtt=0.0):
+    server = FakeSMTPServer(rtt).start()
+    try:
+        yield server
+    finally:
+        server.stop()
+
+def make_pool(server, size=1):
+    return SMTPPool('127.0.0.1', server.port, 'user', 'password', size=size, starttls=False, timeout=5)
+
+def send(pool, text="Subject: test\r\n\r\nbody\r\n"):
+    with pool.session() as session:
+        session.sendmail('esp32@example.com', ['help@example.com'], text)
+
+def test_sends_reuse_one_logged_in_session():
+    with fake_server() as server:
+        pool = make_pool(server)
+        for _ in range(3):
+            send(pool)
+        pool.close()
+    assert server.connections == 1 and server.commands['AUTH'] == 1
+    assert len(server.messages) == 3
+    stats = pool.stats()
+    assert stats['new']['count'] == 1 and stats['reused']['count'] == 2
+    assert server.commands['QUIT'] == 1
+
+def test_dropped_session_reconnects_and_the_send_goes_through():
+    with fake_server() as server:
+        pool = make_pool(server)
+        send(pool)
+        server.drop_all()
+        time.sleep(0.05)
+        send(pool)
+        pool.close()
+    assert len(server.messages) == 2
+    assert server.connections == 2 and pool.reconnects == 1
+    assert pool.stats()['new']['count'] == 2
+
+def test_keepalive_noops_idle_sessions_and_revives_dropped_ones():
+    with fake_server() as server:
+        pool = make_pool(server)
+        send(pool)
+        assert pool.keepalive() == 1 and server.commands['NOOP'] == 1
+        server.drop_all()
+        time.sleep(0.05)
+        assert pool.keepalive() == 1
+        assert pool.warm() == 1 and server.connections == 2
+        send(pool)
+        pool.close()
+    assert pool.stats()['reused']['count'] == 1
+
+def test_parallel_sends_never_open_more_than_the_pool_size():
+    with fake_server(rtt=0.005) as server:
+        pool = make_pool(server, size=2)
+        threads = [threading.Thread(target=lambda: [send(pool) for _ in range(5)]) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        pool.close()
+    assert len(server.messages) == 20
+    assert server.connections <= 2 and pool.connects == server.connections
+
+def test_email_sender_keeps_the_session_warm_and_stamps_smtp_latency():
+    latency = LatencyTracker()
+    with fake_server() as server:
+        sender = EmailSender(latency=latency, smtp_pool=make_pool(server))
+        with contextlib.redirect_stdout(io.StringIO()):
+            assert sender.test_connection()
+            for _ in range(2):
+                now = time.monotonic_ns()
+                assert sender._send_email("test", "body", trace={RECEIVED: now, HANDLED: now})
+        sender.close()
+    assert server.connections == 1 and len(server.messages) == 2
+    assert latency.summary()['serial → email accepted']['count'] == 2
+    assert latency.summary()['handler → SMTP connect']['count'] == 2
+    lines = sender.smtp_pool.format_lines()
+    assert lines[0].startswith('SMTP sessions: 0/1 warm, 1 connects')
+    assert any(line.startswith('send on warm session') for line in lines)
+
+if __name__ == "__main__":
+    sys.exit(run_tests(globals()))
@@ -0,0 +1,59 @@
+"""
+Shared helpers for the test_*.py checks
+Every check runs standalone (python test_x.py) or under pytest and needs
+no hardware or email account; the pty-based ones need Linux/Mac.
+"""
+
+import contextlib
+import os
+import tempfile
+
+class FakeClock:
+    """Clock for TimerWheel, Scheduler and RateLimiter that only moves when a test sets now"""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+@contextlib.contextmanager
+def temporary_log_file():
+    """Send EmailSender's detection log to a temporary directory - yields the directory"""
+    import email_sender
+    with tempfile.TemporaryDirectory() as directory:
+        log_file = email_sender.LOG_FILE
+        email_sender.LOG_FILE = os.path.join(directory, 'detections.log')
+        try:
+            yield directory
+        finally:
+            email_sender.LOG_FILE = log_file
+
+@contextlib.contextmanager
+def pty_port():
+    """A pseudo-terminal standing in for a serial port - yields (master fd, device path)
+
+    Whatever the test writes to the master fd arrives on the device, as
+    if an ESP32 had printed it.
+    """
+    import tty
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    try:
+        yield master, os.ttyname(slave)
+    finally:
+        os.close(master)
+        os.close(slave)
+
+def run_tests(namespace):
+    """Standalone runner: every test_* function in namespace; returns the exit status"""
+    tests = [value for name, value in sorted(namespace.items()) if name.startswith('test_')]
+    failures = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✓ PASS {test.__name__}")
+        except AssertionError as e:
+            failures += 1
+            print(f"✗ FAIL {test.__name__}: {e}")
+    return 1 if failures else 0